@@ -1,13 +1,31 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, make_response
 from flask_cors import CORS
-from functools import wraps
+from functools import wraps, partial
 import re
 import os
-import zipfile
+import json
+import hashlib
+import queue
+import io
+import shutil
 import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
-from datastore import datastore
-from csv_parser import csv_parser
+from datastore import datastore, date_to_range_ms, STATS_PERIODS, DAY_MS
+from obd_schema import obd_row_from_entry, OBD_DATA_COLUMNS
+from csv_parser import csv_parser, timestamp_to_epoch_ms, datetime_to_epoch_ms
+from block_parser import iter_csv_rows
+from downsample import lttb, bucket_stats, bucket_rollups, present_values, DOWNSAMPLE_METHODS
+from live_writer import live_writer
+from live_stream import live_broker
+from compression import compress_response
+from upload_pool import iter_csv_chunks, upload_pool
+from upload_jobs import UploadJobQueue
 
 app = Flask(__name__)
 # Secret key from environment for production
@@ -23,18 +41,26 @@ cors = CORS(
     app,
     resources={r"/*": {"origins": allowed_origins}},
     supports_credentials=False,
-    allow_headers=["Authorization", "Content-Type"],
+    allow_headers=["Authorization", "Content-Type", "If-None-Match"],
+    expose_headers=["ETag"],
 )
 app.secret_key = 'your-secret-key-change-this-in-production'
 
-# Upload configuration (allow override for persistent disks)
-UPLOAD_FOLDER = os.environ.get('UPLOAD_DIR', 'uploads')
+# Upload configuration
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB per file
 MAX_FILES_PER_UPLOAD = 20  # Maximum number of files per upload
+# Queued uploads are copied to temporary files; each stays in memory only up to this size
+UPLOAD_SPOOL_MEMORY_BYTES = int(os.environ.get('UPLOAD_SPOOL_MEMORY_BYTES', 1024 * 1024))
 ALLOWED_EXTENSIONS = {'csv', 'zip'}
-
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+DEFAULT_SERIES_POINTS = 500  # Roughly one point per chart pixel
+MAX_SERIES_POINTS = 5000
+# Raw rows read for one /data/series window; windows holding more are answered from the daily rollups
+SERIES_MAX_ROWS = int(os.environ.get('SERIES_MAX_ROWS', 250000))
+LIVE_MAX_SAMPLES = 1000  # Samples per /data/live request
+LIVE_MAX_CLOCK_SKEW = 300  # Seconds a device timestamp may run ahead of server time
+STREAM_HEARTBEAT_SECONDS = 15  # Keep-alive comment interval on idle /data/stream connections
+MAX_REPORTED_ERRORS = 100  # Parse errors returned per file
+DATA_FORMATS = ('rows', 'columnar', 'ndjson')  # /data response layouts; ndjson is streamed
 
 # ✅ List of supported data request types
 SUPPORTED_DATA = [
@@ -77,6 +103,15 @@ def require_auth(f):
     
     return decorated_function
 
+def compressed(f):
+    """Decorator to gzip/brotli-compress a bulk data response as negotiated by Accept-Encoding"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = make_response(f(*args, **kwargs))
+        return compress_response(response, request.accept_encodings)
+    
+    return decorated_function
+
 def validate_email(email):
     """Basic email validation"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -99,143 +134,244 @@ def extract_date_from_filename(filename):
     except ValueError:
         return None
 
-def process_uploaded_files(files, user_id):
-    """Process uploaded CSV files and return results"""
+def parse_time_bound(value):
+    """Parse a start/end query value (epoch milliseconds or ISO 8601 timestamp) into epoch milliseconds"""
+    if not value:
+        return None
+    if value.lstrip('-').isdigit():
+        return int(value)
+    if 'T' in value and ' ' in value:
+        # An unencoded '+' in a UTC offset arrives as a space
+        value = value.replace(' ', '+')
+    return timestamp_to_epoch_ms(value)
+
+def data_etag(user_id, version):
+    """ETag for a /data response: the user's data version plus the query string that shaped the body
+    
+    Sent as a weak validator, since compressed and uncompressed bodies share it.
+    """
+    latest_id, data_version = version
+    args = sorted(request.args.items(multi=True))
+    digest = hashlib.sha1(f'{user_id}:{latest_id}:{data_version}:{args}'.encode()).hexdigest()
+    return digest[:32]
+
+def process_uploaded_files(files, user_id, progress=None):
+    """
+    Process uploaded CSV and ZIP files and return results
+    
+    Every CSV, including each CSV inside a ZIP, is one unit of work. Units are parsed in
+    parallel by the upload pool and their rows are written by this thread alone. Files
+    are read straight from the request stream and ZIP members from the archive; nothing
+    is written to scratch disk. An UploadJob passed as progress is updated as files finish.
+    """
     results = {
         'success': [],
         'errors': [],
         'total_rows_processed': 0,
+        'total_duplicates_skipped': 0,
         'total_files_processed': 0
     }
     
-    for file in files:
-        if file and allowed_file(file.filename):
-            try:
-                # Save file temporarily
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(UPLOAD_FOLDER, filename)
-                file.save(file_path)
-                
-                # Check if it's a ZIP file
-                if filename.lower().endswith('.zip'):
-                    # Process ZIP file
-                    zip_results = process_zip_file(file_path, user_id)
-                    results['success'].extend(zip_results['success'])
-                    results['errors'].extend(zip_results['errors'])
-                    results['total_rows_processed'] += zip_results['total_rows_processed']
-                    results['total_files_processed'] += zip_results['total_files_processed']
-                else:
-                    # Process single CSV file
-                    csv_results = process_single_csv(file_path, filename, user_id)
-                    if csv_results:
-                        if 'success' in csv_results:
-                            results['success'].append(csv_results['success'])
-                            results['total_rows_processed'] += csv_results['success']['rows_processed']
-                            results['total_files_processed'] += 1
-                        if 'error' in csv_results:
-                            results['errors'].append(csv_results['error'])
-                
-                # Clean up temporary file
-                os.remove(file_path)
-                
-            except Exception as e:
+    # Archives stay open until their members have been read
+    with ExitStack() as open_archives:
+        units = []  # (filename, opener returning a binary stream) in upload order
+        for file in files:
+            if file and allowed_file(file.filename):
+                try:
+                    filename = secure_filename(file.filename)
+                    
+                    # Check if it's a ZIP file
+                    if filename.lower().endswith('.zip'):
+                        zip_units, zip_errors = open_zip_members(file.stream, filename, open_archives)
+                        units.extend(zip_units)
+                        results['errors'].extend(zip_errors)
+                    else:
+                        # Read straight from the request stream
+                        units.append((filename, partial(getattr, file, 'stream')))
+                    
+                except Exception as e:
+                    results['errors'].append({
+                        'file': file.filename,
+                        'errors': [f'Processing error: {str(e)}']
+                    })
+            else:
                 results['errors'].append({
                     'file': file.filename,
-                    'errors': [f'Processing error: {str(e)}']
+                    'errors': ['Invalid file type. Only CSV and ZIP files are allowed.']
                 })
-        else:
-            results['errors'].append({
-                'file': file.filename,
-                'errors': ['Invalid file type. Only CSV and ZIP files are allowed.']
-            })
+        
+        if progress is not None:
+            progress.files_found(len(units) + len(results['errors']))
+        
+        for csv_results in process_csv_units(units, user_id, progress):
+            if csv_results:
+                if 'success' in csv_results:
+                    results['success'].append(csv_results['success'])
+                    results['total_rows_processed'] += csv_results['success']['rows_processed']
+                    results['total_duplicates_skipped'] += csv_results['success']['duplicates_skipped']
+                    results['total_files_processed'] += 1
+                if 'error' in csv_results:
+                    results['errors'].append(csv_results['error'])
+            if progress is not None:
+                progress.file_finished(results)
     
     return results
 
-def process_single_csv(file_path, filename, user_id):
-    """Process a single CSV file"""
+def process_csv_units(units, user_id, progress=None):
+    """
+    Parse and store (filename, opener) units, yielding each file's result in order
+    
+    With more than one unit the files are split into chunks of whole lines that are parsed
+    concurrently in the upload pool, while this thread inserts each chunk's rows in file
+    order. At most two chunks per worker (each about UPLOAD_CHUNK_BYTES) are read and parsed
+    ahead of the writer, so memory does not grow with file size. A single file is streamed
+    in-process.
+    """
+    if len(units) < 2 or not upload_pool.enabled:
+        for filename, opener in units:
+            try:
+                stream = opener()
+            except Exception as e:
+                yield {'error': {'file': filename, 'errors': [f'Processing error: {str(e)}']}}
+                continue
+            yield process_single_csv(stream, filename, user_id, progress)
+        return
+    
+    def submit_chunks():
+        # Every unit yields at least one (unit index, future), the first being a read error if any
+        for index, (_, opener) in enumerate(units):
+            try:
+                with opener() as stream:
+                    for first_line_num, content in iter_csv_chunks(stream):
+                        yield index, upload_pool.submit(content, first_line_num, validate=first_line_num == 1)
+            except Exception as e:
+                failed = Future()
+                failed.set_exception(e)
+                yield index, failed
+    
+    chunks = submit_chunks()
+    pending = deque()
+    
+    def next_chunk(index):
+        """The future for the unit's next chunk, or None once the unit is done"""
+        while len(pending) < upload_pool.workers * 2:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            pending.append(chunk)
+        if not pending or pending[0][0] != index:
+            return None
+        return pending.popleft()[1]
+    
+    def chunk_rows(index, rows, report):
+        yield from rows
+        # Later chunks are only parsed into the file if its first lines passed validation
+        while report['is_valid']:
+            future = next_chunk(index)
+            if future is None:
+                return
+            try:
+                parsed = future.result()
+            except Exception as e:
+                report['parse_errors'].append(f"File error: {str(e)}")
+                return
+            csv_parser.merge_analysis_report(report, parsed['report'])
+            yield from parsed['rows']
+    
+    for index, (filename, _) in enumerate(units):
+        try:
+            parsed = next_chunk(index).result()
+            result = store_csv_rows(filename, chunk_rows(index, parsed['rows'], parsed['report']),
+                                    parsed['report'], user_id, progress)
+        except Exception as e:
+            result = {'error': {'file': filename, 'errors': [f'Processing error: {str(e)}']}}
+        # Drop chunks of a file that was rejected or failed part way
+        future = next_chunk(index)
+        while future is not None:
+            future.cancel()
+            future = next_chunk(index)
+        yield result
+
+def process_single_csv(stream, filename, user_id, progress=None):
+    """Process a single CSV file from a binary stream, streaming parsed batches into the datastore"""
     try:
-        # Validate file format
-        is_valid, validation_errors = csv_parser.validate_file_format(file_path)
-        if not is_valid:
-            return {'error': {'file': filename, 'errors': validation_errors}}
-        
-        # Parse CSV file
-        parsed_data, parse_errors, unsupported_fields = csv_parser.parse_csv_file(file_path)
-        
-        if parse_errors:
-            return {'error': {'file': filename, 'errors': parse_errors}}
-        
-        if parsed_data:
-            # Insert data into database
-            success = datastore.insert_obd_data(user_id, parsed_data)
-            if success:
-                return {
-                    'success': {
-                        'file': filename,
-                        'rows_processed': len(parsed_data),
-                        'date': extract_date_from_filename(filename),
-                        'unsupported_fields': unsupported_fields
-                    }
-                }
-            else:
-                return {'error': {'file': filename, 'errors': ['Failed to insert data into database']}}
-        
-        return None
+        # Validate, count and parse in a single read; rows stream straight into the
+        # bulk writer so only one batch is held in memory
+        report = csv_parser.new_analysis_report()
+        rows = iter_csv_rows(csv_parser, io.TextIOWrapper(stream, encoding='utf-8'), OBD_DATA_COLUMNS, report=report)
+        return store_csv_rows(filename, rows, report, user_id, progress)
         
     except Exception as e:
         return {'error': {'file': filename, 'errors': [f'Processing error: {str(e)}']}}
 
-def process_zip_file(zip_path, user_id):
-    """Process a ZIP file containing CSV files"""
-    results = {
-        'success': [],
-        'errors': [],
-        'total_rows_processed': 0,
-        'total_files_processed': 0
+def store_csv_rows(filename, rows, report, user_id, progress=None):
+    """Insert a file's parsed rows and build its success/error entry from the analysis report"""
+    if progress is not None:
+        rows = progress.count_rows(rows)
+    try:
+        ingest_stats = datastore.insert_obd_rows(user_id, rows)
+    except Exception as e:
+        print(f"Error inserting OBD data: {e}")
+        return {'error': {'file': filename, 'errors': ['Failed to insert data into database']}}
+    
+    # The report is complete once the rows have been consumed
+    if not report['is_valid']:
+        return {'error': {'file': filename, 'errors': report['validation_errors']}}
+    
+    parse_errors = report['parse_errors']
+    unsupported_fields = report['unsupported_fields']
+    if ingest_stats['rows_inserted'] == 0 and ingest_stats['duplicates_skipped'] == 0:
+        if parse_errors:
+            return {'error': {'file': filename, 'errors': parse_errors[:MAX_REPORTED_ERRORS]}}
+        return None
+    
+    success = {
+        'file': filename,
+        'rows_processed': ingest_stats['rows_inserted'],
+        # Rows already stored for the same timestamp, e.g. from an earlier upload of the file
+        'duplicates_skipped': ingest_stats['duplicates_skipped'],
+        'rows_per_second': ingest_stats['rows_per_second'],
+        'date': extract_date_from_filename(filename),
+        'unsupported_fields': list(unsupported_fields)
     }
+    if parse_errors:
+        # Rows were already committed while streaming; report the lines that were skipped
+        success['rows_skipped'] = len(parse_errors)
+        success['parse_errors'] = parse_errors[:MAX_REPORTED_ERRORS]
+    return {'success': success}
+
+def open_zip_members(stream, zip_name, open_archives):
+    """
+    Open an uploaded ZIP archive and list its CSV members
     
+    The archive is registered with the open_archives ExitStack; members are read
+    through ZipFile.open() by the returned openers.
+    
+    Returns:
+        Tuple of ((filename, opener) units, error entries)
+    """
+    units, errors = [], []
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_file:
-            csv_files = [f for f in zip_file.namelist() if f.lower().endswith('.csv')]
-            
-            if not csv_files:
-                results['errors'].append({
-                    'file': os.path.basename(zip_path),
-                    'errors': ['No CSV files found in ZIP archive']
-                })
-                return results
-            
-            # Extract and process each CSV file
-            with tempfile.TemporaryDirectory() as temp_dir:
-                for csv_filename in csv_files:
-                    try:
-                        # Extract CSV file
-                        zip_file.extract(csv_filename, temp_dir)
-                        csv_path = os.path.join(temp_dir, csv_filename)
-                        
-                        # Process the CSV file
-                        csv_results = process_single_csv(csv_path, csv_filename, user_id)
-                        if csv_results:
-                            if 'success' in csv_results:
-                                results['success'].append(csv_results['success'])
-                                results['total_rows_processed'] += csv_results['success']['rows_processed']
-                                results['total_files_processed'] += 1
-                            if 'error' in csv_results:
-                                results['errors'].append(csv_results['error'])
-                        
-                    except Exception as e:
-                        results['errors'].append({
-                            'file': csv_filename,
-                            'errors': [f'Error processing file in ZIP: {str(e)}']
-                        })
+        zip_file = open_archives.enter_context(zipfile.ZipFile(stream, 'r'))
+        csv_files = [f for f in zip_file.namelist() if f.lower().endswith('.csv')]
+        
+        if not csv_files:
+            errors.append({
+                'file': zip_name,
+                'errors': ['No CSV files found in ZIP archive']
+            })
+            return units, errors
+        
+        for csv_filename in csv_files:
+            units.append((csv_filename, partial(zip_file.open, csv_filename)))
     
     except Exception as e:
-        results['errors'].append({
-            'file': os.path.basename(zip_path),
+        errors.append({
+            'file': zip_name,
             'errors': [f'ZIP file processing error: {str(e)}']
         })
     
-    return results
+    return units, errors
 
 @app.route("/register", methods=['POST'])
 def register():
@@ -315,6 +451,7 @@ def logout():
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route("/data", methods=['GET'])
+@compressed
 @require_auth
 def get_data():
     """Retrieve OBD data for authenticated user"""
@@ -330,6 +467,29 @@ def get_data():
         if limit < 1:
             limit = 100
         
+        try:
+            start_ms = parse_time_bound(request.args.get('start'))
+            end_ms = parse_time_bound(request.args.get('end'))
+            since_ms = parse_time_bound(request.args.get('since'))
+        except ValueError:
+            return jsonify({'error': 'start, end and since must be epoch milliseconds or ISO 8601 timestamps'}), 400
+        response_format = request.args.get('format', 'rows')
+        if response_format not in DATA_FORMATS:
+            return jsonify({'error': f'format must be one of {list(DATA_FORMATS)}'}), 400
+        if response_format == 'ndjson':
+            # Streamed exports are not capped; without a limit every matching row is sent
+            limit = request.args.get('limit', type=int)
+            if limit is not None and limit < 1:
+                limit = None
+        since_id = request.args.get('since_id')
+        if since_id is not None:
+            if not since_id.isdigit():
+                return jsonify({'error': 'since_id must be a row id'}), 400
+            since_id = int(since_id)
+        if since_ms is not None:
+            # Delta fetch by time: strictly newer than `since`
+            start_ms = since_ms + 1 if start_ms is None else max(start_ms, since_ms + 1)
+        
         if data_types:
             invalid_types = [dt for dt in data_types if dt not in SUPPORTED_DATA]
             if invalid_types:
@@ -338,29 +498,257 @@ def get_data():
                     'supported_types': SUPPORTED_DATA
                 }), 400
         
-        # Get data from datastore
-        data = datastore.get_obd_data(
+        # Unchanged data answers a conditional request before the main query runs
+        version = datastore.get_data_version(request.user_id)
+        etag = data_etag(request.user_id, version)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        
+        if response_format == 'ndjson':
+            return stream_data_ndjson(date, data_types, limit, start_ms, end_ms, since_id, etag)
+        
+        # Get data from datastore; `cursor` continues from a previous page's next_cursor
+        try:
+            data, next_cursor = datastore.get_obd_data_page(
+                user_id=request.user_id,
+                date=date,
+                data_types=data_types if data_types else None,
+                limit=limit,
+                start_ms=start_ms,
+                end_ms=end_ms,
+                cursor=request.args.get('cursor'),
+                since_id=since_id,
+                columnar=response_format == 'columnar'
+            )
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        
+        response = jsonify({
+            'data': data,
+            'count': len(data['ids']) if response_format == 'columnar' else len(data),
+            'format': response_format,
+            'limit': limit,
+            'next_cursor': next_cursor,
+            'latest_id': version[0],
+            'date_filter': date,
+            'start_filter': start_ms,
+            'end_filter': end_ms,
+            'since_id_filter': since_id,
+            'data_types_filter': data_types if data_types else 'all'
+        })
+        response.set_etag(etag, weak=True)
+        # Clients may cache but must revalidate; the ETag makes that a single indexed lookup
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response, 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Internal server error'}), 500
+
+def stream_data_ndjson(date, data_types, limit, start_ms, end_ms, since_id, etag):
+    """Stream /data rows as newline-delimited JSON, one fetchmany() batch per chunk"""
+    try:
+        batches = datastore.iter_obd_data(
             user_id=request.user_id,
             date=date,
             data_types=data_types if data_types else None,
-            limit=limit
+            limit=limit,
+            start_ms=start_ms,
+            end_ms=end_ms,
+            cursor=request.args.get('cursor'),
+            since_id=since_id
         )
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    def generate():
+        try:
+            for batch in batches:
+                yield ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in batch)
+        except Exception as e:
+            # Headers are already sent; a truncated body is all that can signal the failure
+            print(f"Error streaming OBD data: {e}")
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route("/data/series", methods=['GET'])
+@compressed
+@require_auth
+def get_data_series():
+    """Downsampled per-PID time series for charting"""
+    try:
+        data_types = request.args.getlist('data_types') or SUPPORTED_DATA
+        points = request.args.get('points', DEFAULT_SERIES_POINTS, type=int)
+        method = request.args.get('method', 'lttb')
+        date = request.args.get('date')  # Format: dd-mm-yyyy
+        
+        invalid_types = [dt for dt in data_types if dt not in SUPPORTED_DATA]
+        if invalid_types:
+            return jsonify({
+                'error': f'Invalid data types: {invalid_types}',
+                'supported_types': SUPPORTED_DATA
+            }), 400
+        if method not in DOWNSAMPLE_METHODS:
+            return jsonify({'error': f'Invalid method: {method}', 'supported_methods': list(DOWNSAMPLE_METHODS)}), 400
+        points = min(max(points, 3), MAX_SERIES_POINTS)
+        
+        try:
+            start_ms = parse_time_bound(request.args.get('start'))
+            end_ms = parse_time_bound(request.args.get('end'))
+        except ValueError:
+            return jsonify({'error': 'start and end must be epoch milliseconds or ISO 8601 timestamps'}), 400
+        if date:
+            day_range = date_to_range_ms(date)
+            if not day_range:
+                return jsonify({'error': 'date must be in dd-mm-yyyy format'}), 400
+            start_ms, end_ms = day_range
+        if start_ms is None:
+            return jsonify({'error': 'A time window is required: start (and optionally end) or date'}), 400
+        
+        if datastore.count_obd_rows(request.user_id, start_ms, end_ms, limit=SERIES_MAX_ROWS + 1) > SERIES_MAX_ROWS:
+            return series_from_rollups(data_types, points, method, start_ms, end_ms)
+        
+        timestamps, columns = datastore.get_obd_columns(request.user_id, data_types, start_ms, end_ms)
+        window_end = end_ms if end_ms is not None else (int(timestamps[-1]) + 1 if len(timestamps) else start_ms + 1)
+        
+        series = {}
+        for data_type, values in columns.items():
+            # Each PID is sampled independently, so drop rows where it was not reported
+            pid_ts, pid_values = present_values(timestamps, values)
+            if method == 'lttb':
+                ts, vals = lttb(pid_ts, pid_values, points)
+                series[data_type] = {'timestamps': ts, 'values': vals}
+            else:
+                series[data_type] = bucket_stats(pid_ts, pid_values, points, start_ms, window_end)
         
         return jsonify({
-            'data': data,
-            'count': len(data),
-            'limit': limit,
-            'date_filter': date,
-            'data_types_filter': data_types if data_types else 'all'
+            'method': method,
+            'points': points,
+            'start': start_ms,
+            'end': window_end,
+            'source': 'rows',
+            'source_rows': len(timestamps),
+            'series': series
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': 'Internal server error'}), 500
+
+def series_from_rollups(data_types, points, method, start_ms, end_ms):
+    """/data/series response for a long window, with one point per UTC day from the daily rollups"""
+    start_day = datetime.fromtimestamp(start_ms / 1000, timezone.utc).strftime('%Y-%m-%d')
+    # end is exclusive, so a window ending at midnight does not include that day
+    end_day = datetime.fromtimestamp((end_ms - 1) / 1000, timezone.utc).strftime('%Y-%m-%d') if end_ms is not None else None
+    rollups = datastore.get_obd_daily_rollups(request.user_id, data_types, start_day, end_day)
+    window_end = end_ms
+    if window_end is None:
+        last_days = [pid_rollups['timestamps'][-1] for pid_rollups in rollups.values() if pid_rollups['timestamps']]
+        window_end = max(last_days) + DAY_MS if last_days else start_ms + 1
+    
+    series = {}
+    for data_type, days in rollups.items():
+        if method == 'lttb':
+            averages = [total / count for total, count in zip(days['sum'], days['count'])]
+            ts, vals = lttb(days['timestamps'], averages, points)
+            series[data_type] = {'timestamps': ts, 'values': vals}
+        else:
+            series[data_type] = bucket_rollups(days['timestamps'], days['count'], days['sum'], days['min'],
+                                               days['max'], points, start_ms, window_end)
+    
+    return jsonify({
+        'method': method,
+        'points': points,
+        'start': start_ms,
+        'end': window_end,
+        'source': 'daily_rollups',
+        'source_rows': sum(len(days['timestamps']) for days in rollups.values()),
+        'series': series
+    }), 200
+
+@app.route("/data/stats", methods=['GET'])
+@require_auth
+def get_data_stats():
+    """Per-PID count/min/max/avg/stddev per day, week or month, answered from the daily rollups"""
+    try:
+        period = request.args.get('period', 'day')
+        data_types = request.args.getlist('data_types')
+        
+        if period not in STATS_PERIODS:
+            return jsonify({'error': f'Invalid period: {period}', 'supported_periods': list(STATS_PERIODS)}), 400
+        invalid_types = [dt for dt in data_types if dt not in SUPPORTED_DATA]
+        if invalid_types:
+            return jsonify({
+                'error': f'Invalid data types: {invalid_types}',
+                'supported_types': SUPPORTED_DATA
+            }), 400
+        
+        try:
+            start_ms = parse_time_bound(request.args.get('start'))
+            end_ms = parse_time_bound(request.args.get('end'))
+        except ValueError:
+            return jsonify({'error': 'start and end must be epoch milliseconds or ISO 8601 timestamps'}), 400
+        
+        # Rollups are per UTC day, so bounds select whole days
+        start_day = datetime.fromtimestamp(start_ms / 1000, timezone.utc).strftime('%Y-%m-%d') if start_ms is not None else None
+        end_day = datetime.fromtimestamp(end_ms / 1000, timezone.utc).strftime('%Y-%m-%d') if end_ms is not None else None
+        
+        stats = datastore.get_obd_stats(
+            request.user_id,
+            period=period,
+            start_day=start_day,
+            end_day=end_day,
+            data_types=data_types if data_types else None
+        )
+        
+        return jsonify({
+            'period': period,
+            'start_day': start_day,
+            'end_day': end_day,
+            'data_types_filter': data_types if data_types else 'all',
+            'stats': stats
         }), 200
     
     except Exception as e:
         return jsonify({'error': 'Internal server error'}), 500
 
+def run_upload_job(job):
+    """Parse and store a queued upload; returns the result stored on the job"""
+    results = process_uploaded_files(job.files, job.user_id, progress=job)
+    return {
+        'message': 'File upload completed',
+        'summary': {
+            'total_files_processed': results['total_files_processed'],
+            'total_rows_processed': results['total_rows_processed'],
+            'total_duplicates_skipped': results['total_duplicates_skipped'],
+            'successful_files': len(results['success']),
+            'failed_files': len(results['errors'])
+        },
+        'success': results['success'],
+        'errors': results['errors']
+    }
+
+upload_job_queue = UploadJobQueue(datastore, run_upload_job)
+
+def spool_upload(file: FileStorage) -> FileStorage:
+    """Copy an uploaded file into a temporary file, kept in memory only up to UPLOAD_SPOOL_MEMORY_BYTES"""
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES)
+    try:
+        shutil.copyfileobj(file.stream, spooled)
+        spooled.seek(0)
+    except Exception:
+        spooled.close()
+        raise
+    return FileStorage(stream=spooled, filename=file.filename)
+
 @app.route("/data/upload", methods=['POST'])
 @require_auth
 def upload_data():
-    """Upload OBD data CSV files"""
+    """Upload OBD data CSV files; processing continues in the background (see /data/upload/jobs/<id>)"""
     try:
         # Check if files are present
         if 'files' not in request.files:
@@ -387,35 +775,58 @@ def upload_data():
                         'error': f'File {file.filename} is too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB.'
                     }), 400
         
-        # Process files
-        results = process_uploaded_files(files, request.user_id)
-        
-        # Prepare response
-        response_data = {
-            'message': 'File upload completed',
-            'summary': {
-                'total_files_processed': results['total_files_processed'],
-                'total_rows_processed': results['total_rows_processed'],
-                'successful_files': len(results['success']),
-                'failed_files': len(results['errors'])
-            },
-            'success': results['success'],
-            'errors': results['errors']
-        }
-        
-        # Determine response status
-        if results['errors'] and not results['success']:
-            status_code = 400  # All files failed
-        elif results['errors']:
-            status_code = 207  # Partial success
-        else:
-            status_code = 200  # All files successful
+        # The request stream is gone once we respond, so the job reads copies of the files
+        job_files = []
+        try:
+            for file in files:
+                job_files.append(spool_upload(file))
+        except Exception:
+            for file in job_files:
+                file.close()
+            raise
+        job_id = upload_job_queue.submit(request.user_id, job_files)
+        if job_id is None:
+            response = jsonify({'error': 'Too many uploads in progress, retry shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
         
-        return jsonify(response_data), status_code
+        return jsonify({
+            'message': 'Upload accepted',
+            'job_id': job_id,
+            'status_url': f'/data/upload/jobs/{job_id}',
+            'files': len(job_files)
+        }), 202
     
     except Exception as e:
         return jsonify({'error': f'Upload processing error: {str(e)}'}), 500
 
+@app.route("/data/upload/jobs/<job_id>", methods=['GET'])
+@require_auth
+def get_upload_job(job_id):
+    """Progress and, once finished, the result of a background upload"""
+    job = datastore.get_upload_job(request.user_id, job_id)
+    if not job:
+        return jsonify({'error': 'Upload job not found'}), 404
+    
+    result = job['result'] or {}
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'files_total': job['files_total'],
+        'files_processed': job['files_processed'],
+        'rows_parsed': job['rows_parsed'],
+        'rows_inserted': job['rows_inserted'],
+        'success': result.get('success', []),
+        'errors': result.get('errors', []),
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+    if 'summary' in result:
+        response['summary'] = result['summary']
+    if 'error' in result:
+        response['error'] = result['error']
+    return jsonify(response), 200
+
 @app.route("/data/delete", methods=['POST'])
 @require_auth
 def delete_data_for_date():
@@ -432,9 +843,19 @@ def delete_data_for_date():
 @app.route("/health", methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    warnings = []
+    if datastore.duplicates_pending:
+        warnings.append('obd_data may hold duplicate rows and re-uploads are not skipped; run dedup_obd_data.py')
     return jsonify({
         'status': 'healthy',
-        'message': 'OBD Dashboard API is running'
+        'message': 'OBD Dashboard API is running',
+        'warnings': warnings,
+        'session_cache': datastore.session_cache.stats(),
+        'device_cache': datastore.device_cache.stats(),
+        'live_writer': live_writer.stats(),
+        'live_stream': live_broker.stats(),
+        'upload_pool': upload_pool.stats(),
+        'upload_jobs': upload_job_queue.stats()
     }), 200
 
 @app.route("/supported-data", methods=['GET'])
@@ -456,6 +877,36 @@ def create_device_token():
     except Exception:
         return jsonify({'error': 'Failed to create device token'}), 500
 
+def live_sample_to_entry(data_items, timestamp):
+    """Map one live sample's list of {data_type, data_val} onto our schema; None if nothing is supported"""
+    # Accepts names as per device agent (human names) using csv_parser mapping
+    name_to_db = csv_parser.all_field_mapping
+    row = {'timestamp': timestamp.isoformat(), 'timestamp_ms': datetime_to_epoch_ms(timestamp)}
+    for item in data_items:
+        if not isinstance(item, dict):
+            continue
+        key = item.get('data_type')
+        val = item.get('data_val')
+        if key in name_to_db:
+            dbk = name_to_db[key]
+            try:
+                v = float(val)
+            except Exception:
+                continue
+            row[dbk] = v
+    return row if len(row) > 2 else None
+
+def parse_sample_timestamp(value):
+    """Parse a device-side sample timestamp (ISO 8601 string or epoch milliseconds) into an aware datetime"""
+    if isinstance(value, bool):
+        raise ValueError('Invalid timestamp')
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, timezone.utc)
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    raise ValueError('Invalid timestamp')
+
 @app.route("/data/live", methods=['POST'])
 def ingest_live_data():
     try:
@@ -463,47 +914,82 @@ def ingest_live_data():
         if not payload:
             return jsonify({'error': 'No JSON data provided'}), 400
         device_token = payload.get('key') or payload.get('device_token')
+        # Either a batch of device-timestamped `samples`, or a single `data` sample stamped with server time
+        samples = payload.get('samples')
         data_items = payload.get('data')
-        if not device_token or not isinstance(data_items, list):
+        if not device_token or not (isinstance(samples, list) or isinstance(data_items, list)):
             return jsonify({'error': 'Invalid payload'}), 400
+        if isinstance(samples, list) and len(samples) > LIVE_MAX_SAMPLES:
+            return jsonify({'error': f'Too many samples. Maximum {LIVE_MAX_SAMPLES} per request.'}), 413
 
         user_id = datastore.validate_device(device_token)
         if not user_id:
             return jsonify({'error': 'Invalid device token'}), 401
 
-        # Map incoming list of {data_type, data_val} to our schema
-        # Accepts names as per device agent (human names) using csv_parser mapping
-        from csv_parser import OBDCSVParser
-        parser = OBDCSVParser()
-        name_to_db = parser.all_field_mapping
-
+        now = datetime.now(timezone.utc)
         entries = []
-        from datetime import datetime
-        now_iso = datetime.utcnow().isoformat()
-        row = {'timestamp': now_iso}
-        for item in data_items:
-            key = item.get('data_type')
-            val = item.get('data_val')
-            if key in name_to_db:
-                dbk = name_to_db[key]
+        skipped = 0
+        if isinstance(samples, list):
+            latest_allowed = now + timedelta(seconds=LIVE_MAX_CLOCK_SKEW)
+            for sample in samples:
                 try:
-                    v = float(val)
+                    timestamp = parse_sample_timestamp(sample.get('timestamp'))
+                    if timestamp > latest_allowed or not isinstance(sample.get('data'), list):
+                        raise ValueError('Invalid sample')
+                    entry = live_sample_to_entry(sample['data'], timestamp)
                 except Exception:
-                    continue
-                row[dbk] = v
-        if len(row) > 1:
-            entries.append(row)
+                    entry = None
+                if entry:
+                    entries.append(entry)
+                else:
+                    skipped += 1
+        else:
+            entry = live_sample_to_entry(data_items, now)
+            if entry:
+                entries.append(entry)
 
         if not entries:
             return jsonify({'error': 'No supported fields found'}), 400
 
-        ok = datastore.insert_obd_data(user_id, entries)
-        if not ok:
-            return jsonify({'error': 'Failed to insert data'}), 500
-        return jsonify({'message': 'Live data accepted', 'rows': len(entries)}), 201
+        # Rows are committed by the background writer in group transactions
+        if not live_writer.submit(user_id, [obd_row_from_entry(entry) for entry in entries]):
+            response = jsonify({'error': 'Live ingest queue is full, retry shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        # Push to any open /data/stream connections of this user
+        if live_broker.has_subscribers(user_id):
+            live_broker.publish(user_id, entries)
+        return jsonify({'message': 'Live data accepted', 'rows': len(entries), 'skipped': skipped}), 202
     except Exception as e:
         return jsonify({'error': 'Live ingest error'}), 500
 
+@app.route("/data/stream", methods=['GET'])
+@require_auth
+def stream_live_data():
+    """Server-Sent Events stream of rows accepted by /data/live for the authenticated user"""
+    user_id = request.user_id
+    subscriber = live_broker.subscribe(user_id)
+    
+    def events():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    rows = subscriber.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                for row in rows:
+                    yield f'event: row\ndata: {json.dumps(row)}\n\n'
+        finally:
+            # Runs when the client disconnects and the response is closed
+            live_broker.unsubscribe(user_id, subscriber)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Disable proxy buffering so events are delivered immediately
+    })
+
 @app.route("/data/upload/preview", methods=['POST'])
 @require_auth
 def preview_upload():
@@ -516,38 +1002,29 @@ def preview_upload():
         if not file or not allowed_file(file.filename):
             return jsonify({'error': 'Invalid file type. Only CSV files are allowed for preview.'}), 400
         
-        # Save file temporarily
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, f"preview_{filename}")
-        file.save(file_path)
         
         try:
-            # Analyze file
-            field_counts = csv_parser.get_supported_fields_in_file(file_path)
-            is_valid, validation_errors = csv_parser.validate_file_format(file_path)
-            
-            # Get sample data (first 5 rows)
-            sample_data, parse_errors, unsupported_fields = csv_parser.parse_csv_file(file_path)
-            sample_data = sample_data[:5] if sample_data else []
-            
-            # Clean up
-            os.remove(file_path)
+            # Bounded read: a prefix for validation and sample rows plus a few random windows
+            report = csv_parser.sample_csv_file(file.stream)
+            parse_errors = report['parse_errors']
             
             return jsonify({
                 'filename': filename,
-                'is_valid': is_valid,
-                'validation_errors': validation_errors,
-                'supported_fields_found': field_counts,
-                'unsupported_fields_found': list(set(unsupported_fields)),
-                'sample_data': sample_data,
+                'is_valid': report['is_valid'],
+                'validation_errors': report['validation_errors'],
+                'supported_fields_found': report['field_counts'],
+                'field_coverage': report['field_coverage'],
+                'unsupported_fields_found': list(report['unsupported_fields']),
+                'sample_data': report['sample_data'],
                 'parse_errors': parse_errors[:10] if parse_errors else [],  # Limit errors
-                'estimated_rows': len(sample_data) if sample_data else 0
+                'file_size': report['file_size'],
+                'lines_sampled': report['lines_sampled'],
+                'estimated_rows': report['estimated_rows'],
+                'rows_exact': report['rows_exact']
             }), 200
             
         except Exception as e:
-            # Clean up on error
-            if os.path.exists(file_path):
-                os.remove(file_path)
             return jsonify({'error': f'Preview error: {str(e)}'}), 500
     
     except Exception as e:
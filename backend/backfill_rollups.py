@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Rebuild the daily rollup table (obd_daily_rollups) from obd_data
+
+Usage:
+    python backfill_rollups.py            # all users
+    python backfill_rollups.py <user_id>  # a single user
+"""
+
+import sys
+import time
+
+from datastore import datastore
+
+def main():
+    user_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    started = time.perf_counter()
+    rollup_rows = datastore.rebuild_rollups(user_id)
+    target = f"user {user_id}" if user_id is not None else "all users"
+    print(f"Rebuilt {rollup_rows} rollup rows for {target} in {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Block parser for the key=value OBD log format
+Reads a file in large blocks, groups lines that share a field layout and converts
+each field's values for the whole group at once with NumPy
+"""
+
+import io
+import os
+import re
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from csv_parser import CSVSource, OBDCSVParser, VALIDATION_LINES, open_text_source, timestamp_to_epoch_ms
+
+try:
+    import numpy as np
+except ImportError:
+    # Fallback to the line parser in csv_parser
+    np = None
+
+PARSER_ENGINES = ('numpy', 'python')
+# 'numpy' uses the block parser when NumPy is installed; 'python' always parses line by line
+CSV_PARSER_ENGINE = os.environ.get('CSV_PARSER_ENGINE', 'numpy')
+# Characters of the file read (and parsed) per block
+BLOCK_CHARS = 1024 * 1024
+
+# Replaces each "=value" so lines with the same fields in the same order share a layout
+_VALUE_RE = re.compile(r'=[^,]*')
+# Values made only of these characters convert with float() exactly when the line parser accepts them
+_NOT_DECIMAL_RE = re.compile(r'[^0-9.+\-,]')
+
+# Fixed-width ISO 8601 timestamps converted without datetime: '0' is a digit, '+' the offset sign
+_TIMESTAMP_LAYOUTS = {len(layout): layout for layout in ('0000-00-00T00:00:00', '0000-00-00T00:00:00+00:00')}
+
+def block_engine_available(engine: str = CSV_PARSER_ENGINE) -> bool:
+    return engine == 'numpy' and np is not None
+
+def _timestamps_to_ms(timestamps: Sequence[str]) -> Optional['np.ndarray']:
+    """
+    timestamp_to_epoch_ms for a group of timestamps at once
+
+    Returns None unless every timestamp has one of the _TIMESTAMP_LAYOUTS and is a
+    valid date and time, in which case the group takes the general path instead.
+    """
+    layout = _TIMESTAMP_LAYOUTS.get(len(timestamps[0]))
+    if layout is None:
+        return None
+    try:
+        raw = ''.join(timestamps).encode('ascii')
+    except UnicodeEncodeError:
+        return None
+    if len(raw) != len(layout) * len(timestamps):
+        return None
+    chars = np.frombuffer(raw, dtype=np.uint8).reshape(-1, len(layout))
+
+    # Digits wrap around to large values when subtracting from a smaller character
+    digits = chars - ord('0')
+    for position, expected in enumerate(layout):
+        column = chars[:, position]
+        if expected == '0':
+            if (digits[:, position] > 9).any():
+                return None
+        elif expected == '+':
+            if not np.isin(column, (ord('+'), ord('-'))).all():
+                return None
+        elif (column != ord(expected)).any():
+            return None
+
+    def number(start, width):
+        value = np.zeros(len(chars), dtype=np.int64)
+        for position in range(start, start + width):
+            value = value * 10 + digits[:, position]
+        return value
+
+    hours, minutes, seconds = number(11, 2), number(14, 2), number(17, 2)
+    if number(0, 4).min() < 1 or hours.max() > 23 or minutes.max() > 59 or seconds.max() > 59:
+        return None
+    try:
+        # NumPy rejects out of range months and days
+        days = chars[:, :10].copy().view('S10').ravel().astype('datetime64[D]').astype(np.int64)
+    except ValueError:
+        return None
+    epoch_seconds = days * 86400 + hours * 3600 + minutes * 60 + seconds
+
+    if len(layout) > 19:
+        offset_hours, offset_minutes = number(20, 2), number(23, 2)
+        if offset_hours.max() > 23 or offset_minutes.max() > 59:
+            return None
+        sign = np.where(chars[:, 19] == ord('-'), -1, 1)
+        epoch_seconds -= sign * (offset_hours * 3600 + offset_minutes * 60)
+    return epoch_seconds * 1000
+
+def _convert_value(value: str) -> float:
+    """The line parser's value conversion, with NaN for values it skips"""
+    value = value.strip()
+    try:
+        return float(value) if '.' in value else float(int(value))
+    except (ValueError, OverflowError):
+        return np.nan
+
+def _convert_values(tokens: List[str]) -> 'np.ndarray':
+    if not _NOT_DECIMAL_RE.search(','.join(tokens)):
+        try:
+            return np.array(tokens, dtype=np.float64)
+        except ValueError:
+            pass  # e.g. an empty value
+    return np.array([_convert_value(token) for token in tokens], dtype=np.float64)
+
+def _to_list(values: 'np.ndarray') -> List[Optional[float]]:
+    """Column values as a list for executemany, with None for missing values"""
+    missing = np.isnan(values)
+    if not missing.any():
+        return values.tolist()
+    values = values.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+def _split_layout(rests: List[str], layout: str) -> Optional[List[List[str]]]:
+    """
+    Split the data fields of lines into per-field columns of values
+
+    Returns None unless every line has the given layout. Commas only separate parts,
+    so a part starts with its field name wherever ',' + name + '=' occurs.
+    """
+    fields = layout.split(',')
+    if {rest.count(',') for rest in rests} != {len(fields) - 1}:
+        return None
+    tokens = ','.join(rests).split(',')
+    columns = []
+    for position, field in enumerate(fields):
+        column = tokens[position::len(fields)]
+        if '=' in field:
+            joined = ',' + ','.join(column)
+            if joined.count(',' + field) != len(rests):
+                return None
+            start = len(field)
+            column = [token[start:] for token in column]
+        elif column.count(field) != len(rests):
+            return None
+        columns.append(column)
+    return columns
+
+def _group_by_layout(split_lines: List[Tuple[str, str, str]],
+                     indexes: List[int]) -> List[Tuple[str, List[int], List[List[str]]]]:
+    """
+    Group lines by layout
+
+    Logs normally keep one layout, so the first line's layout is checked against the
+    whole block before working out the layout of each line.
+
+    Returns:
+        List of (layout, line indexes, value columns)
+    """
+    if not indexes:
+        return []
+    rests = [split_lines[i][2] for i in indexes]
+    layout = _VALUE_RE.sub('=', rests[0])
+    value_columns = _split_layout(rests, layout)
+    if value_columns is not None:
+        return [(layout, indexes, value_columns)]
+
+    groups = {}
+    for index, rest in zip(indexes, rests):
+        groups.setdefault(_VALUE_RE.sub('=', rest), []).append(index)
+    return [(layout, group, _split_layout([split_lines[i][2] for i in group], layout))
+            for layout, group in groups.items()]
+
+def parse_block(field_mapping: Dict[str, str], lines: List[str], first_line_num: int,
+                report: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parse a block of lines into columns
+
+    Gives the rows, parse errors, field counts and unsupported fields the line parser
+    would for the same lines outside the validated prefix. The report is updated
+    except for rows_parsed.
+
+    Returns:
+        Dict with count and, for each column found, a list of count values
+        (None where a row lacks the field), in file order
+    """
+    errors = []  # (line index, message)
+    split_lines = [line.strip().partition(',') for line in lines]
+    indexes = []
+    for index, (timestamp, comma, _) in enumerate(split_lines):
+        if comma:
+            indexes.append(index)
+        elif timestamp:
+            errors.append((index, "Invalid line format - must have timestamp and at least one data field"))
+
+    parsed = []
+    for layout, indexes, value_columns in _group_by_layout(split_lines, indexes):
+        timestamps = [split_lines[i][0].strip() for i in indexes]
+        valid = np.ones(len(indexes), dtype=bool)
+        timestamp_ms = _timestamps_to_ms(timestamps)
+        if timestamp_ms is None:
+            timestamp_ms = np.zeros(len(indexes), dtype=np.int64)
+            for position, (index, timestamp) in enumerate(zip(indexes, timestamps)):
+                try:
+                    timestamp_ms[position] = timestamp_to_epoch_ms(timestamp)
+                except ValueError:
+                    errors.append((index, f"Invalid timestamp format: {timestamp}"))
+                    valid[position] = False
+                except Exception as e:
+                    errors.append((index, str(e)))
+                    valid[position] = False
+        valid_count = int(valid.sum())
+
+        columns = {}
+        unsupported = []
+        for field, tokens in zip(layout.split(','), value_columns):
+            if '=' not in field:
+                continue  # Skip malformed parts
+            field_name = field[:-1].strip()
+            db_column = field_mapping.get(field_name)
+            if not db_column:
+                unsupported.append(field_name)
+                continue
+            if valid_count:
+                report['field_counts'][field_name] = report['field_counts'].get(field_name, 0) + valid_count
+            values = _convert_values(tokens)
+            if db_column in columns:
+                # A repeated field overrides earlier values unless it fails to convert
+                values = np.where(np.isnan(values), columns[db_column], values)
+            columns[db_column] = values
+
+        keep = np.zeros(len(indexes), dtype=bool)
+        for values in columns.values():
+            keep |= ~np.isnan(values)
+        keep &= valid
+        if not keep.any():
+            continue
+        report['unsupported_fields'].update(unsupported)
+        parsed.append({
+            'index': np.array(indexes)[keep],
+            'timestamp': np.array(timestamps, dtype=object)[keep],
+            'timestamp_ms': timestamp_ms[keep],
+            'columns': {column: values[keep] for column, values in columns.items()}
+        })
+
+    report['parse_errors'].extend(f"Line {first_line_num + index}: {message}" for index, message in sorted(errors))
+    if not parsed:
+        return {'count': 0}
+
+    # Put rows from different layouts back in file order
+    order = np.argsort(np.concatenate([group['index'] for group in parsed]), kind='stable')
+    count = len(order)
+    block = {
+        'count': count,
+        'timestamp': np.concatenate([group['timestamp'] for group in parsed])[order].tolist(),
+        'timestamp_ms': np.concatenate([group['timestamp_ms'] for group in parsed])[order].tolist()
+    }
+    for column in {column for group in parsed for column in group['columns']}:
+        values = np.concatenate([group['columns'].get(column, np.full(len(group['index']), np.nan))
+                                 for group in parsed])
+        block[column] = _to_list(values[order])
+    return block
+
+def iter_csv_rows(parser: OBDCSVParser, file_path: CSVSource, columns: Sequence[str],
+                  report: Optional[Dict[str, Any]] = None, validate: bool = True, stop_if_invalid: bool = True,
+                  engine: str = CSV_PARSER_ENGINE, block_chars: int = BLOCK_CHARS,
+                  first_line_num: int = 1) -> Iterator[Tuple]:
+    """
+    Stream a file's parsed rows as tuples ordered as columns, filling report as analyze_csv_file does
+
+    The validated prefix is read by the line parser; with the numpy engine the rest
+    of the file is parsed a block at a time by parse_block.
+    """
+    if report is None:
+        report = parser.new_analysis_report()
+    if not block_engine_available(engine):
+        for batch in parser.analyze_csv_file(file_path, report=report, validate=validate,
+                                             stop_if_invalid=stop_if_invalid, first_line_num=first_line_num):
+            for entry in batch:
+                yield tuple(map(entry.get, columns))
+        return
+
+    with open_text_source(file_path) as file:
+        line_num = first_line_num
+        if validate:
+            try:
+                prefix = list(islice(file, VALIDATION_LINES))
+            except Exception as e:
+                report['parse_errors'].append(f"File error: {str(e)}")
+                report['is_valid'] = False
+                report['validation_errors'].append(f"File read error: {str(e)}")
+                return
+            for batch in parser.analyze_csv_file(io.StringIO(''.join(prefix)), report=report,
+                                                 stop_if_invalid=stop_if_invalid, first_line_num=line_num):
+                for entry in batch:
+                    yield tuple(map(entry.get, columns))
+            if not report['is_valid'] and stop_if_invalid:
+                return
+            line_num += len(prefix)
+
+        try:
+            while True:
+                lines = file.readlines(block_chars)
+                if not lines:
+                    break
+                block = parse_block(parser.all_field_mapping, lines, line_num, report)
+                line_num += len(lines)
+                count = block['count']
+                if count:
+                    report['rows_parsed'] += count
+                    missing = [None] * count
+                    yield from zip(*(block.get(column, missing) for column in columns))
+        except Exception as e:
+            report['parse_errors'].append(f"File error: {str(e)}")
@@ -0,0 +1,114 @@
+"""
+Response compression for bulk data endpoints
+Picks gzip or brotli from Accept-Encoding and compresses whole or streamed bodies
+"""
+
+import os
+import zlib
+from typing import Iterable, Iterator, Optional
+
+try:
+    import brotli
+except ImportError:
+    # Only gzip is offered without the brotli package
+    brotli = None
+
+# Buffered bodies smaller than this are sent as is; compression would not pay for itself
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# zlib level 1-9
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+# Brotli quality 0-11; the higher settings are too slow for per-request use
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+
+def supported_encodings():
+    """Encodings this process can produce, in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def negotiate_encoding(accept_encodings) -> Optional[str]:
+    """Pick the preferred supported encoding the client accepts (werkzeug Accept object), or None"""
+    best, best_quality = None, 0
+    for encoding in supported_encodings():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Compressor:
+    """Incremental compressor with a common compress/flush/finish interface"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            # wbits 31 selects the gzip container
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        else:
+            raise ValueError(f'Unsupported encoding: {encoding}')
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything compressed so far so the client can decode it now"""
+        if self.encoding == 'br':
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """Compress a complete body"""
+    compressor = _Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+def compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    """
+    Compress a streamed body (str or bytes chunks) chunk by chunk
+
+    Each input chunk is flushed on its own, so streamed rows reach the client as soon
+    as they are produced rather than when the compressor's window fills. The source
+    iterable is closed when the stream ends or the client goes away.
+    """
+    compressor = _Compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush()
+        yield compressor.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def compress_response(response, accept_encodings):
+    """
+    Compress a Flask response in place according to the request's Accept-Encoding
+
+    Streamed bodies are always compressed; buffered bodies only from COMPRESSION_MIN_SIZE
+    bytes. Responses that are already encoded, or have no body, are left alone.
+    """
+    response.vary.add('Accept-Encoding')
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress_bytes(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,44 @@
+"""
+Shared pytest fixtures for the backend tests
+"""
+
+import os
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Importing datastore (directly or through api) opens the global DataStore at DATABASE_PATH.
+# Conftest is loaded before any test module, so that import never reaches the real database;
+# tests that read or write data use the per-test store fixture instead of the global.
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'test_obd_dashboard.db'))
+
+@pytest.fixture(autouse=True)
+def backend_dir(monkeypatch):
+    """Run each test from backend/ so the sample CSV files resolve"""
+    monkeypatch.chdir(BACKEND_DIR)
+
+@pytest.fixture
+def store(tmp_path):
+    """A DataStore on its own empty database"""
+    from datastore import DataStore
+    data_store = DataStore(str(tmp_path / 'obd_dashboard.db'))
+    yield data_store
+    data_store.close()
+
+@pytest.fixture
+def client(store, monkeypatch):
+    """A Flask test client whose API, live writer and upload jobs all use the store fixture"""
+    import api
+    monkeypatch.setattr(api, 'datastore', store)
+    monkeypatch.setattr(api.live_writer, 'store', store)
+    monkeypatch.setattr(api.upload_job_queue, 'store', store)
+    return api.app.test_client()
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization header for a newly registered user"""
+    client.post('/register', json={'email': 'test@example.com', 'password': 'password123'})
+    token = client.post('/login', json={'email': 'test@example.com', 'password': 'password123'}).json['session_token']
+    return {'Authorization': f'Bearer {token}'}
@@ -4,11 +4,114 @@ Handles flexible field ordering and naming conventions
 """
 
 import csv
+import io
+import random
 import re
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, List, Optional, Tuple, Any, Iterator, Set, TextIO, Union
 import os
 
+# Parsed rows handed to the caller per batch by the streaming API
+PARSE_BATCH_SIZE = 1000
+
+# Leading lines checked by format validation
+VALIDATION_LINES = 5
+
+# Compiled line layouts kept by a parser before its cache is cleared
+MAX_LINE_LAYOUTS = 64
+
+# Preview reads a bounded prefix plus a few random windows instead of the whole file
+PREVIEW_PREFIX_BYTES = 32 * 1024
+PREVIEW_SAMPLES = 16
+PREVIEW_SAMPLE_BYTES = 4 * 1024
+PREVIEW_SAMPLE_ROWS = 5
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MS = timedelta(milliseconds=1)
+
+def datetime_to_epoch_ms(dt: datetime) -> int:
+    """Convert a datetime to integer epoch milliseconds (naive values are taken as UTC)"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _ONE_MS
+
+def timestamp_to_epoch_ms(timestamp: str) -> int:
+    """Convert an ISO 8601 timestamp string to integer epoch milliseconds"""
+    return datetime_to_epoch_ms(datetime.fromisoformat(timestamp))
+
+# A file path, or an open text stream such as io.TextIOWrapper over an upload or ZIP member
+CSVSource = Union[str, TextIO]
+
+@contextmanager
+def open_text_source(source: CSVSource) -> Iterator[TextIO]:
+    """Yield a text stream for a CSV source; streams passed in are read as is and left open"""
+    if hasattr(source, 'read'):
+        yield source
+    else:
+        with open(source, 'r', encoding='utf-8') as file:
+            yield file
+
+def line_layout_key(line: str) -> Tuple[str, ...]:
+    """The data parts of a line with their values removed ("Vehicle Speed=", ...)"""
+    return tuple(part[:part.index('=') + 1] if '=' in part else part for part in line.split(',')[1:])
+
+class LineLayout:
+    """
+    A field sequence compiled into one regular expression
+    
+    The device logger writes the same fields in the same order on every line, so a
+    line that matches the expression gives its timestamp and supported values by
+    position, without splitting it or looking field names up.
+    
+    Used by analyze_csv_file only; the numpy engine's block parser groups lines by
+    layout itself (block_parser._group_by_layout).
+    """
+    
+    def __init__(self, key: Tuple[str, ...], field_mapping: Dict[str, str]):
+        pattern = ['([^,]*)']
+        self.columns = []  # Database column of each captured value
+        self.supported_fields = []
+        self.unsupported_fields = []
+        for prefix in key:
+            if not prefix.endswith('='):
+                pattern.append(',' + re.escape(prefix))  # Malformed part, skipped by the parser
+                continue
+            field_name = prefix[:-1].strip()
+            db_column = field_mapping.get(field_name)
+            if db_column:
+                pattern.append(',' + re.escape(prefix) + '([^,]*)')
+                self.columns.append(db_column)
+                self.supported_fields.append(field_name)
+            else:
+                pattern.append(',' + re.escape(prefix) + '[^,]*')
+                self.unsupported_fields.append(field_name)
+        self.match = re.compile(''.join(pattern)).fullmatch
+    
+    def parse(self, match: re.Match) -> Optional[Dict[str, Any]]:
+        """Build the row _parse_line would for a line this layout matched"""
+        timestamp, *values = match.groups()
+        timestamp = timestamp.strip()
+        try:
+            timestamp_ms = timestamp_to_epoch_ms(timestamp)
+        except ValueError:
+            raise ValueError(f"Invalid timestamp format: {timestamp}")
+        
+        row = {'timestamp': timestamp, 'timestamp_ms': timestamp_ms}
+        for db_column, value in zip(self.columns, values):
+            try:
+                # int() and float() ignore the surrounding whitespace _parse_line strips
+                row[db_column] = float(value) if '.' in value else int(value)
+            except ValueError:
+                continue
+        return row if len(row) > 2 else None
+    
+    def count_fields(self, field_counts: Dict[str, int], lines: int):
+        """Tally the supported fields of lines parsed with this layout"""
+        if lines:
+            for field_name in self.supported_fields:
+                field_counts[field_name] = field_counts.get(field_name, 0) + lines
+
 class OBDCSVParser:
     def __init__(self):
         # Mapping from exact CSV field names to our database column names
@@ -41,8 +144,11 @@ class OBDCSVParser:
         
         # Combine both mappings
         self.all_field_mapping = {**self.field_mapping, **self.optional_field_mapping}
+        
+        # line_layout_key -> LineLayout, shared by every file this parser reads
+        self._line_layouts = {}
     
-    def parse_csv_file(self, file_path: str) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+    def parse_csv_file(self, file_path: CSVSource) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
         """
         Parse a single CSV file and return structured data
         
@@ -53,35 +159,258 @@ class OBDCSVParser:
         errors = []
         unsupported_fields = set()
         
+        for batch in self.iter_csv_file(file_path, errors=errors, unsupported_fields=unsupported_fields):
+            parsed_data.extend(batch)
+        
+        if errors and errors[-1].startswith('File error'):
+            return [], errors, []
+        return parsed_data, errors, list(unsupported_fields)
+    
+    def iter_csv_file(self, file_path: CSVSource, batch_size: int = PARSE_BATCH_SIZE,
+                      errors: Optional[List[str]] = None,
+                      unsupported_fields: Optional[Set[str]] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream a CSV file as batches of parsed rows
+        
+        Only one batch is held in memory at a time. Line errors and unsupported
+        field names are appended to the optional errors list / unsupported_fields
+        set as the file is read, so they are complete once the generator is exhausted.
+        
+        Yields:
+            Lists of at most batch_size parsed rows
+        """
+        report = self.new_analysis_report()
+        if errors is not None:
+            report['parse_errors'] = errors
+        if unsupported_fields is not None:
+            report['unsupported_fields'] = unsupported_fields
+        return self.analyze_csv_file(file_path, batch_size, report=report, validate=False)
+    
+    def new_analysis_report(self) -> Dict[str, Any]:
+        """Create an empty report for analyze_csv_file"""
+        return {
+            'is_valid': True,
+            'validation_errors': [],
+            'field_counts': {},
+            'unsupported_fields': set(),
+            'parse_errors': [],
+            'rows_parsed': 0
+        }
+    
+    def merge_analysis_report(self, report: Dict[str, Any], part: Dict[str, Any]):
+        """Add the report for a later part of the same file into report"""
+        report['is_valid'] = report['is_valid'] and part['is_valid']
+        report['validation_errors'].extend(part['validation_errors'])
+        for field, count in part['field_counts'].items():
+            report['field_counts'][field] = report['field_counts'].get(field, 0) + count
+        report['unsupported_fields'].update(part['unsupported_fields'])
+        report['parse_errors'].extend(part['parse_errors'])
+        report['rows_parsed'] += part['rows_parsed']
+    
+    def analyze_csv_file(self, file_path: CSVSource, batch_size: int = PARSE_BATCH_SIZE,
+                         report: Optional[Dict[str, Any]] = None, validate: bool = True,
+                         stop_if_invalid: bool = True, first_line_num: int = 1) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Validate, count fields and parse a file in a single read
+        
+        file_path may also be an open text stream, which is read from its current position;
+        first_line_num is the file line number of its first line, as used in error messages.
+        The first VALIDATION_LINES lines are checked as validate_file_format does;
+        no batch is yielded until they pass, and with stop_if_invalid an invalid
+        file yields nothing. The report dict (see new_analysis_report) is filled
+        as lines are read: is_valid, validation_errors, field_counts (supported CSV
+        field name -> occurrences), unsupported_fields, parse_errors and rows_parsed.
+        
+        Once two lines in a row share a field layout, following lines are parsed with
+        its LineLayout and fall back to _parse_line when they do not match it.
+        
+        Yields:
+            Lists of at most batch_size parsed rows
+        """
+        if report is None:
+            report = self.new_analysis_report()
+        validation_errors = report['validation_errors']
+        field_counts = report['field_counts']
+        unsupported_fields = report['unsupported_fields']
+        parse_errors = report['parse_errors']
+        validating = validate
+        batch = []
+        layout = None
+        layout_lines = 0  # Lines parsed with layout, not yet added to field_counts
+        missed_key = None
+        
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open_text_source(file_path) as file:
                 # Read the file line by line since it's not standard CSV format
-                for line_num, line in enumerate(file, 1):
+                for line_num, line in enumerate(file, first_line_num):
+                    if validating and line_num - first_line_num >= VALIDATION_LINES:
+                        validating = False
+                        if validation_errors:
+                            report['is_valid'] = False
+                            if stop_if_invalid:
+                                return
+                    
                     line = line.strip()
                     if not line:
                         continue
                     
                     try:
-                        parsed_row, row_unsupported = self._parse_line(line)
-                        if parsed_row:
-                            parsed_data.append(parsed_row)
-                            unsupported_fields.update(row_unsupported)
+                        match = layout.match(line) if layout is not None else None
+                        if match:
+                            parsed_row = layout.parse(match)
+                            row_unsupported = layout.unsupported_fields
+                            layout_lines += 1
+                        else:
+                            parsed_row, row_unsupported = self._parse_line(line, field_counts)
+                            key = line_layout_key(line)
+                            next_layout = self._line_layouts.get(key)
+                            if next_layout is None and key == missed_key:
+                                next_layout = self._compile_line_layout(key)
+                            missed_key = key
+                            if next_layout is not None:
+                                if layout is not None:
+                                    layout.count_fields(field_counts, layout_lines)
+                                layout, layout_lines = next_layout, 0
                     except Exception as e:
-                        errors.append(f"Line {line_num}: {str(e)}")
+                        parse_errors.append(f"Line {line_num}: {str(e)}")
+                        if validating:
+                            if ',' not in line:
+                                validation_errors.append(f"Line {line_num}: Missing comma separator")
+                            else:
+                                validation_errors.append(f"Line {line_num}: {str(e)}")
                         continue
-            
-            return parsed_data, errors, list(unsupported_fields)
-            
+                    
+                    if parsed_row:
+                        batch.append(parsed_row)
+                        unsupported_fields.update(row_unsupported)
+                    elif validating:
+                        validation_errors.append(f"Line {line_num}: No supported OBD fields found")
+                    
+                    if not validating and len(batch) >= batch_size:
+                        report['rows_parsed'] += len(batch)
+                        yield batch
+                        batch = []
         except Exception as e:
-            errors.append(f"File error: {str(e)}")
-            return [], errors, []
+            parse_errors.append(f"File error: {str(e)}")
+            if validating:
+                report['is_valid'] = False
+                validation_errors.append(f"File read error: {str(e)}")
+            return
+        finally:
+            if layout is not None:
+                layout.count_fields(field_counts, layout_lines)
+        
+        if validating and validation_errors:
+            # File ended within the validated lines
+            report['is_valid'] = False
+            if stop_if_invalid:
+                return
+        
+        if batch:
+            report['rows_parsed'] += len(batch)
+            yield batch
     
-    def _parse_line(self, line: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    def sample_csv_file(self, stream: BinaryIO, prefix_bytes: int = PREVIEW_PREFIX_BYTES,
+                        samples: int = PREVIEW_SAMPLES, sample_bytes: int = PREVIEW_SAMPLE_BYTES) -> Dict[str, Any]:
+        """
+        Preview a seekable binary stream by reading a bounded prefix and a few random windows
+        
+        The prefix is validated and parsed as analyze_csv_file does and supplies the sample rows.
+        The windows, spread over the rest of the file without overlapping, add to field coverage
+        and the average line length from which the total row count is estimated. Files no larger than the
+        prefix are read whole and counted exactly. Work is bounded by the byte budget, not the
+        file size.
+        
+        Returns:
+            analyze_csv_file report plus sample_data, field_coverage (CSV field name -> share
+            of sampled rows containing it), lines_sampled, file_size, estimated_rows and
+            rows_exact
+        """
+        file_size = stream.seek(0, io.SEEK_END)
+        stream.seek(0)
+        prefix = stream.read(prefix_bytes)
+        complete = len(prefix) >= file_size
+        if not complete:
+            # Only whole lines are analysed; the cut-off last line is left to the windows
+            prefix = prefix[:prefix.rfind(b'\n') + 1]
+        
+        report = self.new_analysis_report()
+        sample_data = []
+        text = prefix.decode('utf-8', errors='replace')
+        for batch in self.analyze_csv_file(io.StringIO(text), report=report, stop_if_invalid=False):
+            if len(sample_data) < PREVIEW_SAMPLE_ROWS:
+                sample_data.extend(batch[:PREVIEW_SAMPLE_ROWS - len(sample_data)])
+        lines_sampled = report['rows_parsed']
+        sampled_bytes = len(prefix)
+        sampled_lines = prefix.count(b'\n') + (0 if prefix.endswith(b'\n') or not prefix else 1)
+        
+        if not complete and samples > 0:
+            rng = random.Random(file_size)
+            start = len(prefix)
+            stratum = (file_size - start) / samples
+            covered = start  # Lines before this offset have been counted; it is always a line start
+            for i in range(samples):
+                offset = max(start + int(stratum * i + rng.random() * stratum), covered)
+                if offset >= file_size:
+                    break
+                stream.seek(offset)
+                window = stream.read(sample_bytes)
+                # Drop the partial lines at both ends of the window
+                first_newline = -1 if offset == covered else window.find(b'\n')
+                last_newline = window.rfind(b'\n')
+                if last_newline <= first_newline:
+                    continue
+                lines = window[first_newline + 1:last_newline + 1]
+                covered = offset + last_newline + 1
+                sampled_bytes += len(lines)
+                for line in lines.split(b'\n')[:-1]:
+                    sampled_lines += 1
+                    line = line.decode('utf-8', errors='replace').strip()
+                    if not line:
+                        continue
+                    try:
+                        parsed_row, row_unsupported = self._parse_line(line, report['field_counts'])
+                    except Exception as e:
+                        report['parse_errors'].append(f"Near byte {offset}: {str(e)}")
+                        continue
+                    if parsed_row:
+                        lines_sampled += 1
+                        report['unsupported_fields'].update(row_unsupported)
+        
+        if complete:
+            estimated_rows = report['rows_parsed']
+        elif sampled_lines:
+            # Rows in the sampled lines, scaled by how many lines of that average length fit the file
+            rows_per_line = lines_sampled / sampled_lines
+            estimated_rows = round(file_size / (sampled_bytes / sampled_lines) * rows_per_line)
+        else:
+            estimated_rows = 0
+        
+        report.update({
+            'sample_data': sample_data,
+            'field_coverage': {field: round(min(count / lines_sampled, 1.0), 4)
+                               for field, count in report['field_counts'].items()} if lines_sampled else {},
+            'lines_sampled': lines_sampled,
+            'file_size': file_size,
+            'estimated_rows': estimated_rows,
+            'rows_exact': complete
+        })
+        return report
+    
+    def _compile_line_layout(self, key: Tuple[str, ...]) -> LineLayout:
+        if len(self._line_layouts) >= MAX_LINE_LAYOUTS:
+            self._line_layouts.clear()
+        layout = self._line_layouts[key] = LineLayout(key, self.all_field_mapping)
+        return layout
+    
+    def _parse_line(self, line: str, field_counts: Optional[Dict[str, int]] = None) -> Tuple[Optional[Dict[str, Any]], List[str]]:
         """
         Parse a single line of OBD data
         
         Format: timestamp,field1=value1,field2=value2,...
         
+        If field_counts is given, occurrences of supported field names are tallied into it.
+        
         Returns:
             Tuple of (parsed_data, unsupported_fields)
         """
@@ -92,10 +421,9 @@ class OBDCSVParser:
         # Extract timestamp (first part)
         timestamp = parts[0].strip()
         
-        # Validate timestamp format
+        # Validate timestamp format and normalise it to epoch milliseconds
         try:
-            # Try to parse the timestamp to validate it
-            datetime.fromisoformat(timestamp.replace('+', '+').replace('-', '-'))
+            timestamp_ms = timestamp_to_epoch_ms(timestamp)
         except ValueError:
             raise ValueError(f"Invalid timestamp format: {timestamp}")
         
@@ -114,6 +442,8 @@ class OBDCSVParser:
             # Map field name to our database column
             db_column = self.all_field_mapping.get(field_name)
             if db_column:
+                if field_counts is not None:
+                    field_counts[field_name] = field_counts.get(field_name, 0) + 1
                 try:
                     # Convert value to appropriate type
                     if '.' in value:
@@ -129,13 +459,13 @@ class OBDCSVParser:
         
         # Only return if we have at least timestamp and some data
         if data_fields:
-            result = {'timestamp': timestamp}
+            result = {'timestamp': timestamp, 'timestamp_ms': timestamp_ms}
             result.update(data_fields)
             return result, unsupported_fields
         
         return None, unsupported_fields
     
-    def get_supported_fields_in_file(self, file_path: str) -> Dict[str, int]:
+    def get_supported_fields_in_file(self, file_path: CSVSource) -> Dict[str, int]:
         """
         Analyze a file to see which supported fields are present
         
@@ -145,7 +475,7 @@ class OBDCSVParser:
         field_counts = {}
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open_text_source(file_path) as file:
                 for line_num, line in enumerate(file, 1):
                     if line_num > 100:  # Only check first 100 lines for efficiency
                         break
@@ -166,7 +496,7 @@ class OBDCSVParser:
         except Exception:
             return {}
     
-    def validate_file_format(self, file_path: str) -> Tuple[bool, List[str]]:
+    def validate_file_format(self, file_path: CSVSource) -> Tuple[bool, List[str]]:
         """
         Validate that a file has the expected format
         
@@ -176,7 +506,7 @@ class OBDCSVParser:
         errors = []
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
+            with open_text_source(file_path) as file:
                 # Check first few lines
                 for line_num, line in enumerate(file, 1):
                     if line_num > 5:  # Only check first 5 lines
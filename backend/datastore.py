@@ -1,9 +1,29 @@
 import sqlite3
+import base64
 import hashlib
+import json
+import logging
 import secrets
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Sequence, Tuple
 import os
+import atexit
+import threading
+
+from cache import TTLCache
+from process_local import ProcessLocal, start_daemon_thread
+from csv_parser import timestamp_to_epoch_ms, datetime_to_epoch_ms
+from obd_schema import OBD_DATA_COLUMNS, OBD_VALUE_COLUMNS, obd_row_from_entry
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    # get_obd_columns falls back to Python lists
+    np = None
 
 # Import SUPPORTED_DATA from api.py
 try:
@@ -13,18 +33,142 @@ except ImportError:
     SUPPORTED_DATA = [
         "rpm", "speed", "cool_temp", "throttle_pos", "intake_mani_pres",
         "intake_air_temp", "maf_air_flow_rate", "run_time", "baro_pressure",
-        "catalyst_temp", "control_module_voltage"
+        "catalyst_temp", "control_module_voltage", "engine_load", "fuel_level",
+        "fuel_pressure", "ambient_air_temp", "timing_advance"
     ]
 
 DATABASE_PATH = os.environ.get('DATABASE_PATH', 'obd_dashboard.db')
 
+# Connection tuning, applied once per pooled connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16384))  # 16MB page cache
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))  # 128MB
+
+# Session lookups are cached in-process until the session expires, but for at most
+# SESSION_CACHE_MAX_TTL seconds so a logout handled by another worker still takes effect
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+SESSION_CACHE_MAX_TTL = int(os.environ.get('SESSION_CACHE_MAX_TTL', 60))
+
+# Device token -> user lookups are cached for DEVICE_CACHE_TTL seconds; last_seen updates are
+# buffered in memory and written in one transaction every LAST_SEEN_FLUSH_INTERVAL seconds
+DEVICE_CACHE_SIZE = int(os.environ.get('DEVICE_CACHE_SIZE', 10000))
+DEVICE_CACHE_TTL = int(os.environ.get('DEVICE_CACHE_TTL', 300))
+LAST_SEEN_FLUSH_INTERVAL = float(os.environ.get('LAST_SEEN_FLUSH_INTERVAL', 30))
+
+# A row for a user and instant that is already stored is skipped (see idx_obd_data_user_timestamp_ms)
+INSERT_OBD_DATA_SQL = (
+    f"INSERT OR IGNORE INTO obd_data (user_id, {', '.join(OBD_DATA_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(OBD_DATA_COLUMNS) + 1))})"
+)
+
+# Folds the aggregates of obd_data rows selected by `{where}` into the daily rollups, one statement per PID.
+# Rows whose timestamp could not be converted to timestamp_ms have no day and are left out.
+UPSERT_ROLLUP_SQL = {
+    col: f'''
+        INSERT INTO obd_daily_rollups (user_id, day, pid, count, sum, min, max, sum_sq)
+        SELECT user_id, date(timestamp_ms / 1000, 'unixepoch'), '{col}',
+               COUNT({col}), SUM({col}), MIN({col}), MAX({col}), SUM({col} * {col})
+        FROM obd_data
+        WHERE {{where}} AND timestamp_ms IS NOT NULL AND {col} IS NOT NULL
+        GROUP BY user_id, 2
+        ON CONFLICT (user_id, day, pid) DO UPDATE SET
+            count = count + excluded.count,
+            sum = sum + excluded.sum,
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            sum_sq = sum_sq + excluded.sum_sq
+    '''
+    for col in OBD_VALUE_COLUMNS
+}
+
+# SQL expressions mapping a rollup day onto the start of its stats period
+STATS_PERIODS = {
+    'day': 'day',
+    'week': "date(day, '-6 days', 'weekday 1')",  # Monday on or before the day
+    'month': "date(day, 'start of month')"
+}
+
+# Rows per write transaction; keeps the writer lock short during large uploads
+BULK_INSERT_CHUNK_SIZE = int(os.environ.get('BULK_INSERT_CHUNK_SIZE', 5000))
+
+DAY_MS = 24 * 60 * 60 * 1000
+UPLOAD_JOB_RETENTION_DAYS = int(os.environ.get('UPLOAD_JOB_RETENTION_DAYS', 7))  # Finished upload jobs kept for status queries
+# A queued or running job not updated for this long belongs to a process that died and is marked failed
+UPLOAD_JOB_STALE_SECONDS = int(os.environ.get('UPLOAD_JOB_STALE_SECONDS', 300))
+UPLOAD_JOB_COLUMNS = ('status', 'files_total', 'files_processed', 'rows_parsed', 'rows_inserted', 'result')
+EXPORT_FETCH_SIZE = int(os.environ.get('EXPORT_FETCH_SIZE', 1000))  # Rows per fetchmany() when streaming /data
+SERIES_FETCH_SIZE = 10000  # Rows per fetchmany() converted to arrays by get_obd_columns
+
+def date_to_range_ms(date_str: str) -> Optional[Tuple[int, int]]:
+    """Convert a dd-mm-YYYY date into a [start, end) epoch-millisecond range for that UTC day"""
+    try:
+        date_obj = datetime.strptime(date_str, '%d-%m-%Y')
+    except ValueError:
+        return None
+    start_ms = datetime_to_epoch_ms(date_obj)
+    return start_ms, start_ms + DAY_MS
+
+def encode_page_cursor(timestamp_ms: int, row_id: int) -> str:
+    """Encode the (timestamp_ms, id) position of the last row on a page as an opaque cursor"""
+    return base64.urlsafe_b64encode(f'{timestamp_ms}:{row_id}'.encode()).decode().rstrip('=')
+
+def decode_page_cursor(cursor: str) -> Tuple[int, int]:
+    """Decode a cursor from encode_page_cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp_ms, row_id = raw.split(':')
+        return int(timestamp_ms), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
 class DataStore:
-    def __init__(self):
+    def __init__(self, database_path: Optional[str] = None):
+        self.database_path = database_path or DATABASE_PATH
+        # One long-lived connection per thread (sqlite3 connections are not thread-safe)
+        self._local = threading.local()
+        self.session_cache = TTLCache(SESSION_CACHE_SIZE)
+        self.device_cache = TTLCache(DEVICE_CACHE_SIZE)
+        # Set by init_database while obd_data may hold duplicates and re-uploads are not skipped
+        self.duplicates_pending = False
+        self._pending_last_seen = {}  # device_token -> last seen (UTC, CURRENT_TIMESTAMP format)
+        self._last_seen_lock = threading.Lock()
+        self._last_seen_flusher = ProcessLocal(lambda: start_daemon_thread(self._last_seen_flush_loop, 'last-seen-flusher'))
         self.init_database()
+        atexit.register(self.flush_last_seen)
+    
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new connection and apply the connection-level pragmas"""
+        conn = sqlite3.connect(self.database_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        # WAL lets readers proceed while a writer holds the lock
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def _get_connection(self) -> sqlite3.Connection:
+        """Return this thread's persistent connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited across fork (e.g. gunicorn preload) must not be reused
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._open_connection()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def close(self):
+        """Close the calling thread's connection, if any"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
     
     def init_database(self):
         """Initialize the SQLite database with required tables"""
-        conn = sqlite3.connect(DATABASE_PATH)
+        # Schema setup uses a throwaway connection so no handle outlives a pre-fork import
+        conn = self._open_connection()
         cursor = conn.cursor()
         
         # Create users table
@@ -68,6 +212,7 @@ class DataStore:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 timestamp TEXT NOT NULL,
+                timestamp_ms INTEGER,
                 rpm REAL,
                 speed REAL,
                 cool_temp REAL,
@@ -90,7 +235,6 @@ class DataStore:
         ''')
         
         # Create indexes for better performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_obd_data_user_timestamp ON obd_data(user_id, timestamp)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_token ON sessions(session_token)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_devices_token ON devices(device_token)')
@@ -108,9 +252,102 @@ class DataStore:
             if col not in existing_cols:
                 cursor.execute(f'ALTER TABLE obd_data ADD COLUMN {col} {col_type}')
         
+        # Migration: normalised epoch-millisecond timestamps replace the ISO text as sort/range key
+        if 'timestamp_ms' not in existing_cols:
+            cursor.execute('ALTER TABLE obd_data ADD COLUMN timestamp_ms INTEGER')
+            self._backfill_timestamp_ms(conn)
+        cursor.execute('DROP INDEX IF EXISTS idx_obd_data_user_timestamp')
+        # Latest-row lookups (ETag) and since_id delta fetches are single seeks on (user_id, id)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_obd_data_user_id ON obd_data(user_id, id)')
+        
+        # Migration: bumped whenever a user's stored rows are deleted, so cached /data responses are invalidated
+        user_cols = [row[1] for row in cursor.execute('PRAGMA table_info(users)').fetchall()]
+        if 'data_version' not in user_cols:
+            cursor.execute('ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0')
+        
+        # At most one row per user and instant, so re-uploaded files are not stored twice. Databases
+        # holding duplicates from before the index was unique keep a plain index until
+        # dedup_obd_data.py is run; import never rewrites stored rows.
+        obd_indexes = {row[1]: row[2] for row in cursor.execute('PRAGMA index_list(obd_data)').fetchall()}
+        if 'idx_obd_data_user_timestamp_ms' not in obd_indexes:
+            try:
+                cursor.execute('CREATE UNIQUE INDEX idx_obd_data_user_timestamp_ms ON obd_data(user_id, timestamp_ms)')
+                obd_indexes['idx_obd_data_user_timestamp_ms'] = 1
+            except sqlite3.IntegrityError:
+                cursor.execute('CREATE INDEX idx_obd_data_user_timestamp_ms ON obd_data(user_id, timestamp_ms)')
+                obd_indexes['idx_obd_data_user_timestamp_ms'] = 0
+        self.duplicates_pending = not obd_indexes['idx_obd_data_user_timestamp_ms']
+        if self.duplicates_pending:
+            logger.warning("obd_data in %s may hold duplicate rows, so re-uploads are not skipped; "
+                           "run dedup_obd_data.py", self.database_path)
+        
+        # Background upload jobs and their progress (shared by all worker processes)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                files_total INTEGER NOT NULL,
+                files_processed INTEGER NOT NULL DEFAULT 0,
+                rows_parsed INTEGER NOT NULL DEFAULT 0,
+                rows_inserted INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Per user, UTC day and PID aggregates, maintained on insert/delete so summaries never scan obd_data
+        has_rollups = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'obd_daily_rollups'"
+        ).fetchone()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS obd_daily_rollups (
+                user_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                pid TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                min REAL,
+                max REAL,
+                sum_sq REAL NOT NULL,
+                PRIMARY KEY (user_id, day, pid)
+            ) WITHOUT ROWID
+        ''')
+        if not has_rollups:
+            # Migration: seed rollups for data stored before the table existed
+            self._rebuild_rollups(conn)
+        
         conn.commit()
         conn.close()
     
+    def _backfill_timestamp_ms(self, conn: sqlite3.Connection):
+        """
+        Fill in timestamp_ms for rows stored without it (caller owns the transaction)
+        
+        Converted with timestamp_to_epoch_ms, as on insert, so backfilled and new rows agree
+        to the millisecond. Timestamps that do not parse are left NULL.
+        """
+        last_id, unparsed = 0, 0
+        while True:
+            rows = conn.execute(
+                'SELECT id, timestamp FROM obd_data WHERE timestamp_ms IS NULL AND id > ? ORDER BY id LIMIT ?',
+                (last_id, BULK_INSERT_CHUNK_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            updates = []
+            for row_id, timestamp in rows:
+                try:
+                    updates.append((timestamp_to_epoch_ms(timestamp), row_id))
+                except (ValueError, TypeError):
+                    unparsed += 1
+            conn.executemany('UPDATE obd_data SET timestamp_ms = ? WHERE id = ?', updates)
+        if unparsed:
+            print(f"Left timestamp_ms empty for {unparsed} OBD rows with unparseable timestamps")
+    
     def hash_password(self, password: str) -> str:
         """Hash password using SHA-256 with salt"""
         salt = secrets.token_hex(16)
@@ -128,28 +365,24 @@ class DataStore:
     def create_user(self, email: str, password: str) -> bool:
         """Create a new user"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
+            conn = self._get_connection()
             password_hash = self.hash_password(password)
-            cursor.execute(
-                'INSERT INTO users (email, password_hash) VALUES (?, ?)',
-                (email, password_hash)
-            )
-            conn.commit()
-            conn.close()
+            with conn:
+                conn.execute(
+                    'INSERT INTO users (email, password_hash) VALUES (?, ?)',
+                    (email, password_hash)
+                )
             return True
         except sqlite3.IntegrityError:
             return False  # Email already exists
     
     def authenticate_user(self, email: str, password: str) -> Optional[int]:
         """Authenticate user and return user_id if successful"""
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT id, password_hash FROM users WHERE email = ?', (email,))
         result = cursor.fetchone()
-        conn.close()
         
         if result and self.verify_password(password, result[1]):
             return result[0]
@@ -157,127 +390,263 @@ class DataStore:
     
     def create_session(self, user_id: int) -> str:
         """Create a new session for user"""
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Clean up expired sessions (compare using unix epoch seconds)
-        cursor.execute("DELETE FROM sessions WHERE expires_at < strftime('%s','now')")
+        conn = self._get_connection()
         
         # Create new session
         session_token = secrets.token_urlsafe(32)
         # Store expires_at as unix epoch seconds (int)
         expires_at = int(datetime.now().timestamp()) + (7 * 24 * 60 * 60)  # 7 days
         
-        cursor.execute(
-            'INSERT INTO sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)',
-            (user_id, session_token, expires_at)
-        )
-        conn.commit()
-        conn.close()
+        with conn:
+            # Clean up expired sessions (compare using unix epoch seconds)
+            conn.execute("DELETE FROM sessions WHERE expires_at < strftime('%s','now')")
+            conn.execute(
+                'INSERT INTO sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)',
+                (user_id, session_token, expires_at)
+            )
         
         return session_token
     
     def validate_session(self, session_token: str) -> Optional[int]:
         """Validate session token and return user_id if valid"""
-        conn = sqlite3.connect(DATABASE_PATH)
+        user_id = self.session_cache.get(session_token)
+        if user_id is not None:
+            return user_id
+        
+        conn = self._get_connection()
         cursor = conn.cursor()
         
         # Compare expires_at against current unix epoch seconds
         cursor.execute(
-            "SELECT user_id FROM sessions WHERE session_token = ? AND expires_at > strftime('%s','now')",
+            "SELECT user_id, expires_at FROM sessions WHERE session_token = ? AND expires_at > strftime('%s','now')",
             (session_token,)
         )
         result = cursor.fetchone()
-        conn.close()
+        if not result:
+            return None
         
-        return result[0] if result else None
+        user_id, expires_at = result
+        self.session_cache.put(session_token, user_id, min(int(expires_at), time.time() + SESSION_CACHE_MAX_TTL))
+        return user_id
     
     def logout_user(self, session_token: str) -> bool:
         """Logout user by removing session"""
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        self.session_cache.invalidate(session_token)
+        conn = self._get_connection()
         
-        cursor.execute('DELETE FROM sessions WHERE session_token = ?', (session_token,))
+        with conn:
+            cursor = conn.execute('DELETE FROM sessions WHERE session_token = ?', (session_token,))
         affected_rows = cursor.rowcount
-        conn.commit()
-        conn.close()
         
         return affected_rows > 0
     
     def insert_obd_data(self, user_id: int, data_entries: List[Dict[str, Any]]) -> bool:
         """Insert OBD data entries for a user"""
         try:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            
-            for entry in data_entries:
-                cursor.execute('''
-                    INSERT INTO obd_data (
-                        user_id, timestamp, rpm, speed, cool_temp, throttle_pos,
-                        intake_mani_pres, intake_air_temp, maf_air_flow_rate,
-                        run_time, baro_pressure, catalyst_temp, control_module_voltage,
-                        engine_load, fuel_level, fuel_pressure, ambient_air_temp, timing_advance
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    user_id,
-                    entry.get('timestamp'),
-                    entry.get('rpm'),
-                    entry.get('speed'),
-                    entry.get('cool_temp'),
-                    entry.get('throttle_pos'),
-                    entry.get('intake_mani_pres'),
-                    entry.get('intake_air_temp'),
-                    entry.get('maf_air_flow_rate'),
-                    entry.get('run_time'),
-                    entry.get('baro_pressure'),
-                    entry.get('catalyst_temp'),
-                    entry.get('control_module_voltage'),
-                    entry.get('engine_load'),
-                    entry.get('fuel_level'),
-                    entry.get('fuel_pressure'),
-                    entry.get('ambient_air_temp'),
-                    entry.get('timing_advance')
-                ))
-            
-            conn.commit()
-            conn.close()
+            self.insert_obd_rows(user_id, map(obd_row_from_entry, data_entries))
             return True
         except Exception as e:
             print(f"Error inserting OBD data: {e}")
             return False
+    
+    def insert_obd_rows(self, user_id: int, rows: Iterable[Sequence[Any]], chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Bulk insert row tuples (ordered as OBD_DATA_COLUMNS) for a user
+        
+        Rows are written with executemany in transactions of at most chunk_size rows,
+        so the write lock is released between chunks. Rows whose timestamp is already
+        stored for the user are skipped. Raises on database errors; chunks committed
+        before the failure are kept.
+        
+        Returns:
+            Dict with rows_inserted, duplicates_skipped, elapsed_seconds and rows_per_second
+        """
+        chunk_size = chunk_size or BULK_INSERT_CHUNK_SIZE
+        conn = self._get_connection()
+        rows_iter = iter(rows)
+        rows_inserted = 0
+        duplicates_skipped = 0
+        started = time.perf_counter()
+        
+        while True:
+            chunk = [(user_id, *row) for row in islice(rows_iter, chunk_size)]
+            if not chunk:
+                break
+            with conn:
+                inserted = self._insert_chunk(conn, chunk)
+            rows_inserted += inserted
+            duplicates_skipped += len(chunk) - inserted
+        
+        elapsed = time.perf_counter() - started
+        return {
+            'rows_inserted': rows_inserted,
+            'duplicates_skipped': duplicates_skipped,
+            'elapsed_seconds': round(elapsed, 4),
+            'rows_per_second': round(rows_inserted / elapsed) if elapsed > 0 else rows_inserted
+        }
+    
+    def insert_obd_rows_for_users(self, user_rows: List[Tuple[int, Sequence[Any]]]) -> int:
+        """
+        Insert (user_id, row tuple) pairs from any number of users in one transaction
+        
+        Returns:
+            Rows inserted; the rest were duplicates of stored rows
+        """
+        chunk = [(user_id, *row) for user_id, row in user_rows]
+        if not chunk:
+            return 0
+        conn = self._get_connection()
+        with conn:
+            return self._insert_chunk(conn, chunk)
+    
+    def _insert_chunk(self, conn: sqlite3.Connection, chunk: List[Sequence[Any]]) -> int:
+        """
+        Insert full obd_data tuples (user_id first) and fold them into the rollups (caller owns the transaction)
+        
+        Returns:
+            Rows inserted, excluding those skipped as duplicates
+        """
+        if not conn.in_transaction:
+            # Take the write lock first so no other writer's rows land above last_id
+            conn.execute('BEGIN IMMEDIATE')
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM obd_data').fetchone()[0]
+        inserted = conn.executemany(INSERT_OBD_DATA_SQL, chunk).rowcount
+        if inserted > 0:
+            # Skipped rows leave gaps in the new ids, so select them by range rather than count
+            self._update_rollups(conn, 'id > ?', (last_id,))
+        return inserted
 
     def create_device(self, user_id: int, name: Optional[str] = None) -> str:
         token = secrets.token_urlsafe(24)
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO devices (user_id, device_token, name) VALUES (?, ?, ?)', (user_id, token, name))
-        conn.commit()
-        conn.close()
+        conn = self._get_connection()
+        with conn:
+            conn.execute('INSERT INTO devices (user_id, device_token, name) VALUES (?, ?, ?)', (user_id, token, name))
         return token
 
     def validate_device(self, device_token: str) -> Optional[int]:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('SELECT user_id FROM devices WHERE device_token = ?', (device_token,))
-        row = cursor.fetchone()
-        if row:
-            cursor.execute('UPDATE devices SET last_seen = CURRENT_TIMESTAMP WHERE device_token = ?', (device_token,))
-            conn.commit()
-            conn.close()
-            return row[0]
-        conn.close()
-        return None
+        user_id = self.device_cache.get(device_token)
+        if user_id is None:
+            cursor = self._get_connection().cursor()
+            cursor.execute('SELECT user_id FROM devices WHERE device_token = ?', (device_token,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            user_id = row[0]
+            self.device_cache.put(device_token, user_id, time.time() + DEVICE_CACHE_TTL)
+        self._record_last_seen(device_token)
+        return user_id
     
-    def get_obd_data(self, user_id: int, date: Optional[str] = None, data_types: Optional[List[str]] = None, limit: int = 1000) -> List[Dict[str, Any]]:
-        """Retrieve OBD data for a user, optionally filtered by date and data types"""
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
+    def _record_last_seen(self, device_token: str):
+        """Buffer a last_seen update; the background flusher writes it out"""
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        with self._last_seen_lock:
+            self._pending_last_seen[device_token] = now
+        self._last_seen_flusher.get()
+    
+    def _last_seen_flush_loop(self):
+        while True:
+            time.sleep(LAST_SEEN_FLUSH_INTERVAL)
+            self.flush_last_seen()
+    
+    def flush_last_seen(self) -> int:
+        """Write buffered device last_seen times in a single transaction. Returns devices updated."""
+        with self._last_seen_lock:
+            pending, self._pending_last_seen = self._pending_last_seen, {}
+        if not pending:
+            return 0
+        try:
+            conn = self._get_connection()
+            with conn:
+                conn.executemany(
+                    'UPDATE devices SET last_seen = ? WHERE device_token = ?',
+                    [(seen, token) for token, seen in pending.items()]
+                )
+            return len(pending)
+        except Exception as e:
+            print(f"Error flushing device last_seen: {e}")
+            # Keep the updates for the next flush unless newer ones arrived meanwhile
+            with self._last_seen_lock:
+                for token, seen in pending.items():
+                    self._pending_last_seen.setdefault(token, seen)
+            return 0
+    
+    def create_upload_job(self, user_id: int, files_total: int) -> str:
+        """Record a queued upload job and return its id; finished jobs past retention are pruned"""
+        job_id = secrets.token_urlsafe(12)
+        conn = self._get_connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM upload_jobs WHERE status IN ('completed', 'failed') AND updated_at < datetime('now', ?)",
+                (f'-{UPLOAD_JOB_RETENTION_DAYS} days',)
+            )
+            conn.execute('INSERT INTO upload_jobs (id, user_id, status, files_total) VALUES (?, ?, ?, ?)',
+                         (job_id, user_id, 'queued', files_total))
+        return job_id
+    
+    def update_upload_job(self, job_id: str, **fields):
+        """Update job progress columns (see UPLOAD_JOB_COLUMNS); result is stored as JSON"""
+        fields = {col: value for col, value in fields.items() if col in UPLOAD_JOB_COLUMNS}
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        assignments = ', '.join(f'{col} = ?' for col in fields)
+        conn = self._get_connection()
+        with conn:
+            conn.execute(f'UPDATE upload_jobs SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                         (*fields.values(), job_id))
+    
+    def touch_upload_jobs(self, job_ids: Sequence[str]):
+        """Mark jobs as still alive (the owning process calls this periodically)"""
+        conn = self._get_connection()
+        with conn:
+            conn.executemany('UPDATE upload_jobs SET updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                             [(job_id,) for job_id in job_ids])
+    
+    def get_upload_job(self, user_id: int, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch one of the user's upload jobs, or None
+        
+        A queued or running job whose process stopped updating it for UPLOAD_JOB_STALE_SECONDS
+        is marked failed first, so clients polling it stop waiting.
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute(
+                """
+                UPDATE upload_jobs
+                SET status = 'failed',
+                    result = json_set(COALESCE(result, '{}'), '$.error', ?),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND status IN ('queued', 'running') AND updated_at < datetime('now', ?)
+                """,
+                ('Upload was interrupted before it finished; please upload the files again',
+                 job_id, f'-{UPLOAD_JOB_STALE_SECONDS} seconds')
+            )
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        row = cursor.execute('SELECT * FROM upload_jobs WHERE id = ? AND user_id = ?', (job_id, user_id)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+    
+    def build_obd_data_query(self, user_id: int, date: Optional[str] = None, data_types: Optional[List[str]] = None,
+                             limit: Optional[int] = 1000, start_ms: Optional[int] = None,
+                             end_ms: Optional[int] = None,
+                             after: Optional[Tuple[int, int]] = None,
+                             since_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """
+        Build the SELECT for get_obd_data
         
+        Time filters are plain range predicates on timestamp_ms, and paging continues
+        strictly after the (timestamp_ms, id) position in `after`, so every page is an
+        index seek rather than an OFFSET scan. `since_id` restricts to rows stored after
+        that row id (delta fetch).
+        """
         # Build query - only select needed columns for better performance
         if data_types:
             # Only select requested columns + required fields
-            columns = ['id', 'timestamp'] + [col for col in data_types if col in SUPPORTED_DATA]
+            columns = ['id', 'timestamp', 'timestamp_ms'] + [col for col in data_types if col in SUPPORTED_DATA]
             select_clause = ', '.join(columns)
         else:
             select_clause = '*'
@@ -286,60 +655,391 @@ class DataStore:
         params = [user_id]
         
         if date:
-            # Convert dd-mm-yyyy to yyyy-mm-dd for SQLite
-            try:
-                date_obj = datetime.strptime(date, '%d-%m-%Y')
-                formatted_date = date_obj.strftime('%Y-%m-%d')
-                query += ' AND DATE(timestamp) = ?'
-                params.append(formatted_date)
-            except ValueError:
-                pass  # Invalid date format, ignore filter
+            # A dd-mm-yyyy date narrows the range to that (UTC) day
+            day_range = date_to_range_ms(date)
+            if day_range:
+                start_ms = day_range[0] if start_ms is None else max(start_ms, day_range[0])
+                end_ms = day_range[1] if end_ms is None else min(end_ms, day_range[1])
+            # Invalid date format, ignore filter
         
-        query += f' ORDER BY timestamp DESC LIMIT {limit}'
+        if start_ms is not None:
+            query += ' AND timestamp_ms >= ?'
+            params.append(start_ms)
+        if end_ms is not None:
+            query += ' AND timestamp_ms < ?'
+            params.append(end_ms)
+        if after is not None:
+            query += ' AND (timestamp_ms, id) < (?, ?)'
+            params.extend(after)
+        if since_id is not None:
+            query += ' AND id > ?'
+            params.append(since_id)
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        conn.close()
+        query += ' ORDER BY timestamp_ms DESC, id DESC'
+        if limit is not None:
+            query += f' LIMIT {int(limit)}'
+        return query, params
+    
+    def get_data_version(self, user_id: int) -> Tuple[Optional[int], int]:
+        """
+        Cheap change marker for a user's stored data
+        
+        Returns:
+            Tuple of (latest row id or None, deletion counter). Inserts move the
+            first, deletes the second; both are single index/primary key lookups.
+        """
+        row = self._get_connection().execute(
+            'SELECT (SELECT MAX(id) FROM obd_data WHERE user_id = ?), data_version FROM users WHERE id = ?',
+            (user_id, user_id)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+    
+    def get_obd_data(self, user_id: int, date: Optional[str] = None, data_types: Optional[List[str]] = None,
+                     limit: int = 1000, start_ms: Optional[int] = None,
+                     end_ms: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Retrieve OBD data for a user, optionally filtered by date or [start_ms, end_ms) range and data types"""
+        data, _ = self.get_obd_data_page(user_id, date, data_types, limit, start_ms, end_ms)
+        return data
+    
+    def get_obd_data_page(self, user_id: int, date: Optional[str] = None, data_types: Optional[List[str]] = None,
+                          limit: int = 1000, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                          cursor: Optional[str] = None, since_id: Optional[int] = None,
+                          columnar: bool = False) -> Tuple[Any, Optional[str]]:
+        """
+        Retrieve one page of OBD data, newest first
         
+        With columnar=True the page is a dict of parallel lists (ids, timestamps in epoch
+        milliseconds and one list per data type, None where a value is missing) built
+        straight from the cursor tuples instead of one dict per row.
+        
+        Returns:
+            Tuple of (data, next_cursor); next_cursor is None on the last page.
+            Raises ValueError for a malformed cursor.
+        """
+        after = decode_page_cursor(cursor) if cursor else None
+        conn = self._get_connection()
+        
+        if columnar:
+            columns = [col for col in (data_types or OBD_VALUE_COLUMNS) if col in SUPPORTED_DATA]
+            query, params = self.build_obd_data_query(user_id, date, columns, limit + 1, start_ms, end_ms, after,
+                                                      since_id)
+            # Rows are (id, timestamp, timestamp_ms, *columns)
+            rows = conn.execute(query, params).fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_page_cursor(rows[-1][2], rows[-1][0])
+            transposed = list(zip(*rows)) if rows else [()] * (len(columns) + 3)
+            data = {'ids': list(transposed[0]), 'timestamps': list(transposed[2])}
+            for col, values in zip(columns, transposed[3:]):
+                data[col] = list(values)
+            return data, next_cursor
+        
+        db_cursor = conn.cursor()
+        # Row factory is set per cursor so the shared connection keeps returning tuples elsewhere
+        db_cursor.row_factory = sqlite3.Row
+        # Fetch one extra row to learn whether another page follows
+        query, params = self.build_obd_data_query(user_id, date, data_types, limit + 1, start_ms, end_ms, after,
+                                                  since_id)
+        
+        db_cursor.execute(query, params)
+        rows = db_cursor.fetchall()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_page_cursor(rows[-1]['timestamp_ms'], rows[-1]['id'])
+        
+        return self._rows_to_entries(rows, data_types), next_cursor
+    
+    def _rows_to_entries(self, rows: Sequence[sqlite3.Row], data_types: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Convert sqlite3.Row results to /data entries"""
         # Optimized conversion to list of dictionaries
         if data_types:
             # Build entries including only requested columns when present
+            selected = [col for col in data_types if col in SUPPORTED_DATA]
             data = []
             for row in rows:
                 entry = {'id': row['id'], 'timestamp': row['timestamp']}
-                row_keys = row.keys()
-                for data_type in data_types:
-                    if data_type in row_keys:
-                        value = row[data_type]
-                        if value is not None:
-                            entry[data_type] = value
+                for data_type in selected:
+                    value = row[data_type]
+                    if value is not None:
+                        entry[data_type] = value
                 data.append(entry)
-        else:
-            # Use list comprehension for better performance
-            data = [dict(row) for row in rows]
+            return data
+        # Use list comprehension for better performance
+        return [dict(row) for row in rows]
+    
+    def iter_obd_data(self, user_id: int, date: Optional[str] = None, data_types: Optional[List[str]] = None,
+                      limit: Optional[int] = None, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                      cursor: Optional[str] = None, since_id: Optional[int] = None,
+                      batch_size: int = EXPORT_FETCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Stream OBD data newest first, in batches of at most batch_size entries
         
-        return data
+        Rows are pulled from the cursor with fetchmany, so memory stays bounded by the
+        batch size however many rows match. Raises ValueError for a malformed cursor
+        (before the first batch is produced).
+        """
+        after = decode_page_cursor(cursor) if cursor else None
+        query, params = self.build_obd_data_query(user_id, date, data_types, limit, start_ms, end_ms, after,
+                                                  since_id)
+        db_cursor = self._get_connection().cursor()
+        db_cursor.row_factory = sqlite3.Row
+        db_cursor.execute(query, params)
+        
+        def batches():
+            try:
+                while True:
+                    rows = db_cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield self._rows_to_entries(rows, data_types)
+            finally:
+                db_cursor.close()
+        return batches()
+
+    def count_obd_rows(self, user_id: int, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+                       limit: Optional[int] = None) -> int:
+        """Count a user's rows in [start_ms, end_ms) from the (user_id, timestamp_ms) index, stopping at limit"""
+        query = 'SELECT 1 FROM obd_data WHERE user_id = ?'
+        params = [user_id]
+        if start_ms is not None:
+            query += ' AND timestamp_ms >= ?'
+            params.append(start_ms)
+        if end_ms is not None:
+            query += ' AND timestamp_ms < ?'
+            params.append(end_ms)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return self._get_connection().execute(f'SELECT COUNT(*) FROM ({query})', params).fetchone()[0]
+    
+    def get_obd_columns(self, user_id: int, columns: List[str], start_ms: Optional[int] = None,
+                        end_ms: Optional[int] = None) -> Tuple[Sequence[int], Dict[str, Sequence[Any]]]:
+        """
+        Fetch timestamp_ms and the given data columns in ascending time order, column-wise
+        
+        With NumPy the rows are read in batches of SERIES_FETCH_SIZE into arrays, so no Python
+        object is kept per value; callers bound the window (see count_obd_rows).
+        
+        Returns:
+            Tuple of (timestamps, {column: values}): an int64 array and float64 arrays with NaN
+            for missing values, or without NumPy lists with None for missing values
+        """
+        columns = [col for col in columns if col in OBD_VALUE_COLUMNS]
+        query = f"SELECT {', '.join(['timestamp_ms'] + columns)} FROM obd_data WHERE user_id = ?"
+        params = [user_id]
+        if start_ms is not None:
+            query += ' AND timestamp_ms >= ?'
+            params.append(start_ms)
+        if end_ms is not None:
+            query += ' AND timestamp_ms < ?'
+            params.append(end_ms)
+        query += ' ORDER BY timestamp_ms, id'
+        
+        cursor = self._get_connection().execute(query, params)
+        if np is None:
+            rows = cursor.fetchall()
+            if not rows:
+                return [], {col: [] for col in columns}
+            transposed = list(zip(*rows))
+            return list(transposed[0]), {col: list(values) for col, values in zip(columns, transposed[1:])}
+        
+        # Epoch milliseconds are exact in float64, so each batch converts as one matrix
+        blocks = []
+        while True:
+            rows = cursor.fetchmany(SERIES_FETCH_SIZE)
+            if not rows:
+                break
+            blocks.append(np.array(rows, dtype=np.float64))
+        data = np.concatenate(blocks) if blocks else np.empty((0, len(columns) + 1))
+        return data[:, 0].astype(np.int64), {col: data[:, i] for i, col in enumerate(columns, 1)}
+    
+    def get_obd_daily_rollups(self, user_id: int, columns: List[str], start_day: Optional[str] = None,
+                              end_day: Optional[str] = None) -> Dict[str, Dict[str, List[Any]]]:
+        """
+        Fetch the daily rollups of the given data columns, oldest day first
+        
+        start_day/end_day are inclusive YYYY-MM-DD bounds on the UTC days included.
+        
+        Returns:
+            {column: {'timestamps' (start of each UTC day, epoch ms), 'count', 'sum', 'min', 'max'}}
+        """
+        pids = [col for col in columns if col in OBD_VALUE_COLUMNS]
+        result = {pid: {'timestamps': [], 'count': [], 'sum': [], 'min': [], 'max': []} for pid in pids}
+        if not pids:
+            return result
+        query = f"""
+            SELECT pid, CAST(strftime('%s', day) AS INTEGER) * 1000, count, sum, min, max
+            FROM obd_daily_rollups
+            WHERE user_id = ? AND pid IN ({', '.join('?' * len(pids))})
+        """
+        params = [user_id, *pids]
+        if start_day:
+            query += ' AND day >= ?'
+            params.append(start_day)
+        if end_day:
+            query += ' AND day <= ?'
+            params.append(end_day)
+        query += ' ORDER BY pid, day'
+        for pid, day_ms, count, total, min_val, max_val in self._get_connection().execute(query, params):
+            rollups = result[pid]
+            rollups['timestamps'].append(day_ms)
+            rollups['count'].append(count)
+            rollups['sum'].append(total)
+            rollups['min'].append(min_val)
+            rollups['max'].append(max_val)
+        return result
 
     def delete_obd_data_for_date(self, user_id: int, date_str: str) -> int:
         """Delete all OBD data rows for a user on a given date (dd-mm-YYYY). Returns number of rows deleted."""
         try:
-            # Convert dd-mm-YYYY to YYYY-mm-dd for SQLite DATE()
-            try:
-                date_obj = datetime.strptime(date_str, '%d-%m-%Y')
-                formatted_date = date_obj.strftime('%Y-%m-%d')
-            except ValueError:
+            day_range = date_to_range_ms(date_str)
+            if not day_range:
                 return 0
 
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM obd_data WHERE user_id = ? AND DATE(timestamp) = ?', (user_id, formatted_date))
+            conn = self._get_connection()
+            with conn:
+                cursor = conn.execute(
+                    'DELETE FROM obd_data WHERE user_id = ? AND timestamp_ms >= ? AND timestamp_ms < ?',
+                    (user_id, *day_range)
+                )
+                self._rebuild_rollups(conn, user_id, *day_range)
+                if cursor.rowcount:
+                    conn.execute('UPDATE users SET data_version = data_version + 1 WHERE id = ?', (user_id,))
             affected = cursor.rowcount
-            conn.commit()
-            conn.close()
             return affected if affected is not None else 0
         except Exception as e:
             print(f"Error deleting OBD data: {e}")
             return 0
 
+    def _update_rollups(self, conn: sqlite3.Connection, where: str, params: Sequence[Any]):
+        """Fold the obd_data rows matching `where` into the daily rollups (caller owns the transaction)"""
+        for sql in UPSERT_ROLLUP_SQL.values():
+            conn.execute(sql.format(where=where), params)
+    
+    def _rebuild_rollups(self, conn: sqlite3.Connection, user_id: Optional[int] = None,
+                         start_ms: Optional[int] = None, end_ms: Optional[int] = None):
+        """
+        Recompute rollups from obd_data for whole UTC days (caller owns the transaction)
+        
+        All days touched by [start_ms, end_ms) are rebuilt, optionally for a single user;
+        without bounds every day is rebuilt.
+        """
+        where, params = [], []
+        if user_id is not None:
+            where.append('user_id = ?')
+            params.append(user_id)
+        if start_ms is not None:
+            start_ms -= start_ms % DAY_MS
+            where.append('timestamp_ms >= ?')
+            params.append(start_ms)
+        if end_ms is not None:
+            end_ms += -end_ms % DAY_MS
+            where.append('timestamp_ms < ?')
+            params.append(end_ms)
+        
+        rollup_where, rollup_params = [], []
+        if user_id is not None:
+            rollup_where.append('user_id = ?')
+            rollup_params.append(user_id)
+        if start_ms is not None:
+            rollup_where.append('day >= ?')
+            rollup_params.append(datetime.utcfromtimestamp(start_ms / 1000).strftime('%Y-%m-%d'))
+        if end_ms is not None:
+            rollup_where.append('day < ?')
+            rollup_params.append(datetime.utcfromtimestamp(end_ms / 1000).strftime('%Y-%m-%d'))
+        
+        conn.execute(
+            'DELETE FROM obd_daily_rollups' + (' WHERE ' + ' AND '.join(rollup_where) if rollup_where else ''),
+            rollup_params
+        )
+        self._update_rollups(conn, ' AND '.join(where) or '1', params)
+    
+    def rebuild_rollups(self, user_id: Optional[int] = None) -> int:
+        """Backfill the daily rollups from obd_data, for one user or everyone. Returns rollup rows written."""
+        conn = self._get_connection()
+        with conn:
+            self._rebuild_rollups(conn, user_id)
+        query = 'SELECT COUNT(*) FROM obd_daily_rollups'
+        if user_id is not None:
+            return conn.execute(query + ' WHERE user_id = ?', (user_id,)).fetchone()[0]
+        return conn.execute(query).fetchone()[0]
+    
+    def deduplicate_obd_data(self) -> int:
+        """
+        Remove rows stored more than once for a user and instant, keeping the first copy,
+        and make idx_obd_data_user_timestamp_ms unique so later duplicates are skipped on insert
+        
+        The affected users' rollups are rebuilt and their data_version bumped. Safe to run again.
+        
+        Returns:
+            Rows removed
+        """
+        conn = self._get_connection()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            user_ids = [row[0] for row in conn.execute('''
+                SELECT DISTINCT user_id FROM obd_data WHERE timestamp_ms IS NOT NULL
+                GROUP BY user_id, timestamp_ms HAVING COUNT(*) > 1
+            ''').fetchall()]
+            removed = conn.execute('''
+                DELETE FROM obd_data
+                WHERE timestamp_ms IS NOT NULL AND id NOT IN (
+                    SELECT MIN(id) FROM obd_data WHERE timestamp_ms IS NOT NULL GROUP BY user_id, timestamp_ms
+                )
+            ''').rowcount
+            conn.execute('DROP INDEX IF EXISTS idx_obd_data_user_timestamp_ms')
+            conn.execute('CREATE UNIQUE INDEX idx_obd_data_user_timestamp_ms ON obd_data(user_id, timestamp_ms)')
+            for user_id in user_ids:
+                self._rebuild_rollups(conn, user_id)
+                conn.execute('UPDATE users SET data_version = data_version + 1 WHERE id = ?', (user_id,))
+        self.duplicates_pending = False
+        return removed
+    
+    def get_obd_stats(self, user_id: int, period: str = 'day', start_day: Optional[str] = None,
+                      end_day: Optional[str] = None, data_types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Summarise data per day, week or month from the daily rollups
+        
+        start_day/end_day are inclusive YYYY-MM-DD bounds on the UTC days included.
+        
+        Returns:
+            List of {'period_start', 'stats': {pid: {count, min, max, avg, stddev}}}, oldest first
+        """
+        period_expr = STATS_PERIODS[period]
+        query = f'''
+            SELECT {period_expr} AS period_start, pid,
+                   SUM(count), SUM(sum), MIN(min), MAX(max), SUM(sum_sq)
+            FROM obd_daily_rollups
+            WHERE user_id = ?
+        '''
+        params = [user_id]
+        if start_day:
+            query += ' AND day >= ?'
+            params.append(start_day)
+        if end_day:
+            query += ' AND day <= ?'
+            params.append(end_day)
+        if data_types:
+            pids = [pid for pid in data_types if pid in OBD_VALUE_COLUMNS]
+            query += f" AND pid IN ({', '.join('?' * len(pids))})"
+            params.extend(pids)
+        query += ' GROUP BY period_start, pid ORDER BY period_start, pid'
+        
+        periods = {}
+        for period_start, pid, count, total, min_val, max_val, sum_sq in self._get_connection().execute(query, params):
+            avg = total / count
+            variance = max(sum_sq / count - avg * avg, 0.0)
+            periods.setdefault(period_start, {})[pid] = {
+                'count': count,
+                'min': min_val,
+                'max': max_val,
+                'avg': avg,
+                'stddev': variance ** 0.5
+            }
+        return [{'period_start': period_start, 'stats': stats} for period_start, stats in periods.items()]
+
 # Global datastore instance
 datastore = DataStore()
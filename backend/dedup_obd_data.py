@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""
+Remove duplicate obd_data rows (same user and timestamp) stored before re-uploads were
+skipped, and make the (user_id, timestamp_ms) index unique
+
+Usage:
+    python dedup_obd_data.py
+"""
+
+import time
+
+from datastore import datastore
+
+def main():
+    started = time.perf_counter()
+    removed = datastore.deduplicate_obd_data()
+    print(f"Removed {removed} duplicate OBD rows in {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    main()
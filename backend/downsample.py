@@ -0,0 +1,170 @@
+"""
+Downsampling for OBD time series
+Reduces a series to roughly one point per chart pixel before it is sent to the browser
+"""
+
+from typing import Dict, List, Sequence, Tuple, Any
+
+try:
+    import numpy as np
+except ImportError:
+    # Fallback to the pure Python implementations below
+    np = None
+
+DOWNSAMPLE_METHODS = ('lttb', 'bucket')
+
+def _lttb_bucket_edges(n: int, threshold: int) -> List[int]:
+    """Start index of each LTTB bucket between the fixed first and last points, plus the final edge (n - 1)"""
+    every = (n - 2) / (threshold - 2)
+    return [int(i * every) + 1 for i in range(threshold - 1)]
+
+def present_values(timestamps: Sequence[int], values: Sequence[Any]) -> Tuple[Sequence[int], Sequence[float]]:
+    """
+    Drop the points where a PID was not reported
+
+    Takes the arrays (NaN for missing) or lists (None for missing) of DataStore.get_obd_columns.
+    """
+    if np is not None and isinstance(values, np.ndarray):
+        present = ~np.isnan(values)
+        return timestamps[present], values[present]
+    return [t for t, v in zip(timestamps, values) if v is not None], [v for v in values if v is not None]
+
+def lttb(timestamps: Sequence[int], values: Sequence[float], threshold: int) -> Tuple[List[int], List[float]]:
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the first and last points and, for each bucket in between, the point that
+    forms the largest triangle with the previously kept point and the average of the
+    next bucket. Series no longer than threshold are returned unchanged.
+
+    Returns:
+        Tuple of (timestamps, values)
+    """
+    n = len(timestamps)
+    if threshold >= n or threshold < 3:
+        if np is not None:
+            return np.asarray(timestamps).tolist(), np.asarray(values, dtype=np.float64).tolist()
+        return list(timestamps), list(values)
+
+    edges = _lttb_bucket_edges(n, threshold)
+    bucket_ranges = [(edges[i], edges[i + 1]) for i in range(threshold - 2)]
+    next_ranges = bucket_ranges[1:] + [(n - 1, n)]
+
+    if np is not None:
+        x = np.asarray(timestamps, dtype=np.float64)
+        y = np.asarray(values, dtype=np.float64)
+        keep = np.empty(threshold, dtype=np.int64)
+        keep[0] = a = 0
+        for i, ((start, end), (next_start, next_end)) in enumerate(zip(bucket_ranges, next_ranges), 1):
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+            area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+            keep[i] = a = start + int(area.argmax())
+        keep[-1] = n - 1
+        return np.asarray(timestamps)[keep].tolist(), y[keep].tolist()
+
+    keep = [0]
+    a = 0
+    for (start, end), (next_start, next_end) in zip(bucket_ranges, next_ranges):
+        span = next_end - next_start
+        avg_x = sum(timestamps[next_start:next_end]) / span
+        avg_y = sum(values[next_start:next_end]) / span
+        ax, ay = timestamps[a], values[a]
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - timestamps[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                a = j
+        keep.append(a)
+    keep.append(n - 1)
+    return [timestamps[i] for i in keep], [float(values[i]) for i in keep]
+
+def bucket_stats(timestamps: Sequence[int], values: Sequence[float], buckets: int,
+                 start_ms: int, end_ms: int) -> Dict[str, List[Any]]:
+    """
+    Min/max/avg bucketing over equal-width time buckets spanning [start_ms, end_ms)
+
+    Timestamps must be ascending. Empty buckets are omitted.
+
+    Returns:
+        Dict of parallel lists: timestamps (bucket start), min, max, avg, count
+    """
+    result = {'timestamps': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+    if len(timestamps) == 0 or buckets < 1:
+        return result
+    span = max(end_ms - start_ms, 1)
+
+    if np is not None:
+        t = np.asarray(timestamps, dtype=np.int64)
+        y = np.asarray(values, dtype=np.float64)
+        idx = np.clip((t - start_ms) * buckets // span, 0, buckets - 1)
+        bucket_ids, starts, counts = np.unique(idx, return_index=True, return_counts=True)
+        result['timestamps'] = (start_ms + bucket_ids * span // buckets).tolist()
+        result['min'] = np.minimum.reduceat(y, starts).tolist()
+        result['max'] = np.maximum.reduceat(y, starts).tolist()
+        result['avg'] = (np.add.reduceat(y, starts) / counts).tolist()
+        result['count'] = counts.tolist()
+        return result
+
+    current = None
+    for t, v in zip(timestamps, values):
+        bucket_id = min(max((t - start_ms) * buckets // span, 0), buckets - 1)
+        if bucket_id != current:
+            current = bucket_id
+            result['timestamps'].append(start_ms + bucket_id * span // buckets)
+            result['min'].append(v)
+            result['max'].append(v)
+            result['avg'].append(v)  # Running sum until the bucket is closed
+            result['count'].append(1)
+        else:
+            result['min'][-1] = min(result['min'][-1], v)
+            result['max'][-1] = max(result['max'][-1], v)
+            result['avg'][-1] += v
+            result['count'][-1] += 1
+    result['avg'] = [total / count for total, count in zip(result['avg'], result['count'])]
+    return result
+
+def bucket_rollups(timestamps: Sequence[int], counts: Sequence[int], sums: Sequence[float],
+                   mins: Sequence[float], maxs: Sequence[float], buckets: int,
+                   start_ms: int, end_ms: int) -> Dict[str, List[Any]]:
+    """
+    bucket_stats for pre-aggregated points (daily rollups), combining each bucket's aggregates
+
+    Returns:
+        Same layout as bucket_stats
+    """
+    result = {'timestamps': [], 'min': [], 'max': [], 'avg': [], 'count': []}
+    if len(timestamps) == 0 or buckets < 1:
+        return result
+    span = max(end_ms - start_ms, 1)
+
+    if np is not None:
+        t = np.asarray(timestamps, dtype=np.int64)
+        idx = np.clip((t - start_ms) * buckets // span, 0, buckets - 1)
+        bucket_ids, starts = np.unique(idx, return_index=True)
+        bucket_counts = np.add.reduceat(np.asarray(counts, dtype=np.int64), starts)
+        result['timestamps'] = (start_ms + bucket_ids * span // buckets).tolist()
+        result['min'] = np.minimum.reduceat(np.asarray(mins, dtype=np.float64), starts).tolist()
+        result['max'] = np.maximum.reduceat(np.asarray(maxs, dtype=np.float64), starts).tolist()
+        result['avg'] = (np.add.reduceat(np.asarray(sums, dtype=np.float64), starts) / bucket_counts).tolist()
+        result['count'] = bucket_counts.tolist()
+        return result
+
+    current = None
+    for t, count, total, low, high in zip(timestamps, counts, sums, mins, maxs):
+        bucket_id = min(max((t - start_ms) * buckets // span, 0), buckets - 1)
+        if bucket_id != current:
+            current = bucket_id
+            result['timestamps'].append(start_ms + bucket_id * span // buckets)
+            result['min'].append(low)
+            result['max'].append(high)
+            result['avg'].append(total)  # Running sum until the bucket is closed
+            result['count'].append(count)
+        else:
+            result['min'][-1] = min(result['min'][-1], low)
+            result['max'][-1] = max(result['max'][-1], high)
+            result['avg'][-1] += total
+            result['count'][-1] += count
+    result['avg'] = [total / count for total, count in zip(result['avg'], result['count'])]
+    return result
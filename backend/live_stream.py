@@ -0,0 +1,62 @@
+"""
+In-process pub/sub for live data
+/data/live publishes accepted rows; each /data/stream connection subscribes for its user
+"""
+
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List
+
+# Batches buffered per subscriber before further batches are dropped for that (slow) client
+STREAM_SUBSCRIBER_QUEUE_SIZE = int(os.environ.get('STREAM_SUBSCRIBER_QUEUE_SIZE', 256))
+
+class LiveBroker:
+    def __init__(self, queue_size: int = STREAM_SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)  # user_id -> set of queues
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+    
+    def subscribe(self, user_id: int) -> queue.Queue:
+        """Register a subscriber for a user's rows; pair with unsubscribe when the client goes away"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, user_id: int, subscriber: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+    
+    def has_subscribers(self, user_id: int) -> bool:
+        return user_id in self._subscribers
+    
+    def publish(self, user_id: int, rows: List[Dict[str, Any]]):
+        """Fan a batch of rows out to every subscriber of the user without blocking the publisher"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(rows)
+                self.published += 1
+            except queue.Full:
+                self.dropped += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'subscribers': sum(len(subs) for subs in self._subscribers.values()),
+                'published': self.published,
+                'dropped': self.dropped
+            }
+
+# Global live broker instance
+live_broker = LiveBroker()
@@ -0,0 +1,100 @@
+"""
+Background writer for live ingest
+/data/live requests enqueue rows; a writer thread commits them in group transactions
+"""
+
+import atexit
+import os
+import queue
+import time
+from typing import Any, Dict, List, Sequence
+
+from datastore import datastore
+from process_local import ProcessLocal, start_daemon_thread
+
+# Pending /data/live requests held in memory before clients are told to back off
+LIVE_QUEUE_SIZE = int(os.environ.get('LIVE_QUEUE_SIZE', 10000))
+# A group transaction is committed once it holds this many rows ...
+LIVE_BATCH_ROWS = int(os.environ.get('LIVE_BATCH_ROWS', 500))
+# ... or once its oldest row has waited this many seconds
+LIVE_BATCH_MAX_DELAY = float(os.environ.get('LIVE_BATCH_MAX_DELAY', 0.25))
+
+class LiveWriter:
+    def __init__(self, store, max_queue: int = LIVE_QUEUE_SIZE, batch_rows: int = LIVE_BATCH_ROWS,
+                 max_delay: float = LIVE_BATCH_MAX_DELAY):
+        self.store = store
+        self.batch_rows = batch_rows
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._writer = ProcessLocal(lambda: start_daemon_thread(self._run, 'live-writer'))
+        self.rows_written = 0
+        self.rows_duplicate = 0  # Skipped because a row for the same timestamp was already stored
+        self.rows_failed = 0
+        self.batches_written = 0
+        self.rejected_requests = 0
+        atexit.register(self.flush)
+    
+    def submit(self, user_id: int, rows: List[Sequence[Any]]) -> bool:
+        """Queue row tuples (ordered as OBD_DATA_COLUMNS) for a user. Returns False if the queue is full."""
+        self._writer.get()
+        try:
+            self._queue.put_nowait((user_id, rows))
+            return True
+        except queue.Full:
+            self.rejected_requests += 1
+            return False
+    
+    def _run(self):
+        while True:
+            # Block for the first request, then gather more until the batch is full or too old
+            batch = self._take(self._queue.get())
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self._take(self._queue.get(timeout=remaining)))
+                except queue.Empty:
+                    break
+            self._write(batch)
+    
+    def _take(self, item) -> List[tuple]:
+        user_id, rows = item
+        return [(user_id, row) for row in rows]
+    
+    def _write(self, batch: List[tuple]):
+        try:
+            inserted = self.store.insert_obd_rows_for_users(batch)
+            self.rows_written += inserted
+            self.rows_duplicate += len(batch) - inserted
+            self.batches_written += 1
+        except Exception as e:
+            self.rows_failed += len(batch)
+            print(f"Error writing live data batch of {len(batch)} rows: {e}")
+    
+    def flush(self) -> int:
+        """Synchronously write everything still queued (used at shutdown). Returns rows written."""
+        batch = []
+        while True:
+            try:
+                batch.extend(self._take(self._queue.get_nowait()))
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+        return len(batch)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued_requests': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'rows_written': self.rows_written,
+            'rows_duplicate': self.rows_duplicate,
+            'rows_failed': self.rows_failed,
+            'batches_written': self.batches_written,
+            'rejected_requests': self.rejected_requests
+        }
+
+# Global live writer instance
+live_writer = LiveWriter(datastore)
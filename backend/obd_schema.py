@@ -0,0 +1,25 @@
+"""
+obd_data row layout shared by the datastore, the API and the upload pool workers
+Kept free of database imports so parser worker processes can load it cheaply
+"""
+
+from typing import Any, Dict, Tuple
+
+from csv_parser import timestamp_to_epoch_ms
+
+# obd_data columns written by the ingest path, in row-tuple order (user_id is prepended on insert)
+OBD_DATA_COLUMNS = (
+    'timestamp', 'timestamp_ms', 'rpm', 'speed', 'cool_temp', 'throttle_pos',
+    'intake_mani_pres', 'intake_air_temp', 'maf_air_flow_rate',
+    'run_time', 'baro_pressure', 'catalyst_temp', 'control_module_voltage',
+    'engine_load', 'fuel_level', 'fuel_pressure', 'ambient_air_temp', 'timing_advance'
+)
+
+# Data (PID) columns, i.e. everything but the timestamps
+OBD_VALUE_COLUMNS = OBD_DATA_COLUMNS[2:]
+
+def obd_row_from_entry(entry: Dict[str, Any]) -> Tuple:
+    """Convert a parsed entry dict into a row tuple ordered as OBD_DATA_COLUMNS"""
+    if entry.get('timestamp_ms') is None and entry.get('timestamp'):
+        entry = {**entry, 'timestamp_ms': timestamp_to_epoch_ms(entry['timestamp'])}
+    return tuple(map(entry.get, OBD_DATA_COLUMNS))
@@ -0,0 +1,51 @@
+"""
+Per-process lazy start for background threads and pools
+Threads do not survive fork (gunicorn forks workers after import), so anything that
+runs in the background is started on first use in each process
+"""
+
+import os
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar('T')
+
+class ProcessLocal(Generic[T]):
+    """The result of start(), called once per process on first use"""
+
+    def __init__(self, start: Callable[[], T]):
+        self._start = start
+        self._value = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # A lock held by another thread at fork time would stay locked in the child
+        os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        """Start in this process if not yet done, and return the started value"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self._start()
+                    self._pid = os.getpid()
+        return self._value
+
+    def replace(self, stale: T) -> T:
+        """Start again in place of stale (e.g. a broken pool) unless another thread already has; returns the current value"""
+        with self._lock:
+            if self._value is stale or self._pid != os.getpid():
+                self._value = self._start()
+                self._pid = os.getpid()
+        return self._value
+
+    @property
+    def started(self) -> bool:
+        return self._pid == os.getpid()
+
+def start_daemon_thread(target: Callable[[], None], name: str) -> threading.Thread:
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test the TTL/LRU cache and the session cache in front of require_auth
+"""
+
+import sys
+import pytest
+import cache
+import datastore as datastore_module
+from cache import TTLCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable time.time() for cache expiry"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    return now
+
+def test_entries_expire(clock):
+    print("Testing TTL expiry")
+    entries = TTLCache()
+    entries.put('a', 1, clock[0] + 10)
+    assert entries.get('a') == 1
+    clock[0] += 10
+    assert entries.get('a') is None
+    assert entries.stats()['size'] == 0, "an expired entry is dropped when it is looked up"
+    assert (entries.hits, entries.misses) == (1, 1)
+
+def test_least_recently_used_is_evicted(clock):
+    print("Testing LRU eviction")
+    entries = TTLCache(max_size=2)
+    entries.put('a', 1, clock[0] + 60)
+    entries.put('b', 2, clock[0] + 60)
+    assert entries.get('a') == 1  # 'b' is now the least recently used
+    entries.put('c', 3, clock[0] + 60)
+    assert entries.get('b') is None
+    assert entries.get('a') == 1 and entries.get('c') == 3
+    assert entries.stats() == {'hits': 3, 'misses': 1, 'hit_rate': 0.75, 'size': 2, 'max_size': 2}
+
+    entries.invalidate('a')
+    assert entries.get('a') is None
+
+def test_session_cache(client, auth_headers, store, clock, monkeypatch):
+    print("Testing the session cache in require_auth")
+    monkeypatch.setattr(datastore_module, 'SESSION_CACHE_MAX_TTL', 60)
+    token = auth_headers['Authorization'].split(' ')[1]
+    assert client.get('/data', headers=auth_headers).status_code == 200
+    assert client.get('/data', headers=auth_headers).status_code == 200
+    assert store.session_cache.stats()['hits'] >= 1
+
+    # A logout handled by another process removes only the row; this process keeps its entry
+    # until SESSION_CACHE_MAX_TTL has passed
+    with store._get_connection() as conn:
+        conn.execute('DELETE FROM sessions WHERE session_token = ?', (token,))
+    assert client.get('/data', headers=auth_headers).status_code == 200
+    clock[0] += 61
+    assert client.get('/data', headers=auth_headers).status_code == 401
+
+def test_logout_invalidates_cached_session(client, auth_headers):
+    print("Testing logout in this process")
+    assert client.get('/data', headers=auth_headers).status_code == 200
+    assert client.post('/logout', headers=auth_headers).status_code == 200
+    assert client.get('/data', headers=auth_headers).status_code == 401
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test Accept-Encoding negotiation and that buffered and streamed bodies
+decompress back to the original
+"""
+
+import json
+import zlib
+from werkzeug.datastructures import Accept
+from werkzeug.wrappers import Response
+import compression
+
+def make_rows(n=2000):
+    return [json.dumps({'id': i, 'timestamp': '2025-10-21T23:20:20+10:00', 'speed': 0.0, 'rpm': 1200.0}) + '\n'
+            for i in range(n)]
+
+def test_negotiation():
+    print("Testing encoding negotiation")
+    assert compression.negotiate_encoding(Accept([('gzip', 1), ('deflate', 1)])) == 'gzip'
+    assert compression.negotiate_encoding(Accept([('*', 1)])) in compression.supported_encodings()
+    assert compression.negotiate_encoding(Accept([('gzip', 0)])) is None
+    assert compression.negotiate_encoding(Accept([('identity', 1)])) is None
+
+def test_buffered():
+    print("Testing buffered responses")
+    body = ''.join(make_rows()).encode()
+    response = compression.compress_response(Response(body), Accept([('gzip', 1)]))
+    compressed = response.get_data()
+    print(f"{len(body)} bytes -> {len(compressed)} bytes")
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert zlib.decompress(compressed, 31) == body
+    assert len(compressed) * 10 < len(body)
+
+    small = compression.compress_response(Response(b'{"count": 0}'), Accept([('gzip', 1)]))
+    assert 'Content-Encoding' not in small.headers and small.get_data() == b'{"count": 0}'
+    assert 'Accept-Encoding' in small.vary
+
+def test_streamed():
+    print("Testing streamed responses")
+    rows = make_rows()
+    closed = []
+
+    def generate():
+        try:
+            for i in range(0, len(rows), 100):
+                yield ''.join(rows[i:i + 100])
+        finally:
+            closed.append(True)
+
+    response = compression.compress_response(Response(generate()), Accept([('gzip', 1)]))
+    assert response.headers['Content-Encoding'] == 'gzip'
+    decompressor = zlib.decompressobj(31)
+    output = []
+    for chunk in response.response:
+        # Every chunk is flushed, so each one decodes to whole rows on arrival
+        output.append(decompressor.decompress(chunk))
+        assert not output[-1] or output[-1].endswith(b'\n')
+    assert b''.join(output) == ''.join(rows).encode()
+    assert closed
+
+if __name__ == "__main__":
+    test_negotiation()
+    test_buffered()
+    test_streamed()
+    print("Compression tests passed")
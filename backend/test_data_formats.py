@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test that the /data response formats carry the same rows as the default
+list of entries
+"""
+
+import json
+import sys
+from functools import partial
+import pytest
+from csv_parser import csv_parser
+from obd_schema import obd_row_from_entry
+
+@pytest.fixture
+def rows(store, auth_headers):
+    user_id = store._get_connection().execute('SELECT id FROM users WHERE email = ?', ('test@example.com',)).fetchone()[0]
+    parsed, errors, _ = csv_parser.parse_csv_file('21-October-2025.csv')
+    assert not errors
+    store.insert_obd_rows(user_id, [obd_row_from_entry(row) for row in parsed])
+    return len(parsed)
+
+@pytest.fixture
+def many_rows(store, rows):
+    """More rows than the 1000 row page limit: the sample file plus a day of one-second samples"""
+    user_id = store._get_connection().execute('SELECT id FROM users WHERE email = ?', ('test@example.com',)).fetchone()[0]
+    extra = [obd_row_from_entry({'timestamp': f'2025-10-20T00:{second // 60:02d}:{second % 60:02d}+00:00',
+                                 'speed': float(second % 120)}) for second in range(1000)]
+    store.insert_obd_rows(user_id, extra)
+    return rows + len(extra)
+
+def ndjson_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+def fetch_pages(client, auth_headers, **params):
+    """Every page of /data for params, following next_cursor"""
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        response = client.get('/data', headers=auth_headers, query_string=query)
+        assert response.status_code == 200, response.json
+        pages.append(response.json)
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            return pages
+
+def test_columnar_matches_rows(client, auth_headers, rows):
+    print("Testing format=columnar against the row format")
+    data_types = ['speed', 'rpm']
+    entries = [entry for page in fetch_pages(client, auth_headers, data_types=data_types, limit=100)
+               for entry in page['data']]
+    pages = fetch_pages(client, auth_headers, data_types=data_types, limit=100, format='columnar')
+    print(f"{rows} rows in {len(pages)} columnar pages")
+    assert all(page['format'] == 'columnar' and page['count'] == len(page['data']['ids']) for page in pages)
+
+    columns = {key: [value for page in pages for value in page['data'][key]]
+               for key in ('ids', 'timestamps', *data_types)}
+    assert set(pages[0]['data']) == set(columns)
+    assert len(entries) == len(columns['ids']) == rows
+    assert columns['ids'] == [entry['id'] for entry in entries]
+    assert columns['timestamps'] == sorted(columns['timestamps'], reverse=True)
+    for data_type in data_types:
+        # Missing values are None in their column and absent from row entries
+        assert columns[data_type] == [entry.get(data_type) for entry in entries]
+
+def test_columnar_all_types(client, auth_headers, rows):
+    print("Testing format=columnar without a data_types filter")
+    [page] = fetch_pages(client, auth_headers, limit=1000, format='columnar')
+    [row_page] = fetch_pages(client, auth_headers, limit=1000)
+    data = page['data']
+    assert page['count'] == rows
+    assert data['timestamps'] == [entry['timestamp_ms'] for entry in row_page['data']]
+    assert data['speed'] == [entry['speed'] for entry in row_page['data']]
+    assert 'timestamp' not in data and 'id' not in data
+
+def test_empty_and_invalid(client, auth_headers):
+    print("Testing an empty result and an unknown format")
+    [page] = fetch_pages(client, auth_headers, data_types=['speed'], format='columnar')
+    assert page['count'] == 0 and page['data'] == {'ids': [], 'timestamps': [], 'speed': []}
+    response = client.get('/data', headers=auth_headers, query_string={'format': 'csv'})
+    assert response.status_code == 400
+
+def test_ndjson_matches_rows(client, auth_headers, many_rows, store, monkeypatch):
+    print("Testing format=ndjson against the row format")
+    # Small fetch batches so the export is streamed as several chunks
+    monkeypatch.setattr(store, 'iter_obd_data', partial(store.iter_obd_data, batch_size=50))
+    response = client.get('/data', headers=auth_headers, query_string={'format': 'ndjson'}, buffered=False)
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed and response.headers['ETag']
+    chunks = list(response.response)
+    response.close()
+    body = b''.join(chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in chunks)
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    print(f"{len(lines)} lines in {len(chunks)} chunks")
+    assert len(chunks) == -(-many_rows // 50)
+
+    # Not capped at the 1000 row page limit, and in the same order as the paged rows
+    entries = [entry for page in fetch_pages(client, auth_headers, limit=1000) for entry in page['data']]
+    assert len(entries) == len(lines) == many_rows > 1000
+    assert lines == entries
+    # The stream holds rows only: it ends on the oldest row, with no trailing cursor line
+    assert 'next_cursor' not in lines[-1] and lines[-1]['timestamp'] == '2025-10-20T00:00:00+00:00'
+
+def test_ndjson_limit_and_cursor(client, auth_headers, many_rows):
+    print("Testing format=ndjson with a limit and a cursor from a page")
+    first_page = fetch_pages(client, auth_headers, limit=1000)[0]
+    assert first_page['next_cursor']
+    limited = ndjson_lines(client.get('/data', headers=auth_headers, query_string={'format': 'ndjson', 'limit': 1000}))
+    assert limited == first_page['data']
+
+    # An export can start where a page ended
+    rest = ndjson_lines(client.get('/data', headers=auth_headers,
+                                   query_string={'format': 'ndjson', 'cursor': first_page['next_cursor']}))
+    print(f"{len(limited)} rows, then {len(rest)} after the cursor")
+    assert len(rest) == many_rows - 1000
+    assert rest == fetch_pages(client, auth_headers, limit=1000, cursor=first_page['next_cursor'])[0]['data']
+
+def test_ndjson_filters(client, auth_headers, rows):
+    print("Testing format=ndjson with a limit, filters and a conditional request")
+    query = {'format': 'ndjson', 'limit': 10, 'data_types': 'speed'}
+    response = client.get('/data', headers=auth_headers, query_string=query)
+    lines = ndjson_lines(response)
+    page = fetch_pages(client, auth_headers, limit=10, data_types='speed')[0]
+    assert len(lines) == 10 and lines == page['data']
+    assert set(lines[0]) == {'id', 'timestamp', 'speed'}
+
+    unchanged = client.get('/data', headers={**auth_headers, 'If-None-Match': response.headers['ETag']},
+                           query_string=query)
+    assert unchanged.status_code == 304
+    invalid = client.get('/data', headers=auth_headers, query_string={'format': 'ndjson', 'cursor': 'junk'})
+    assert invalid.status_code == 400
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
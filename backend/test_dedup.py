@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test that re-ingested rows are skipped as duplicates, that rollups only count
+stored rows, and that dedup_obd_data removes duplicates from older databases
+"""
+
+import logging
+import sqlite3
+import sys
+import pytest
+import dedup_obd_data
+from csv_parser import csv_parser
+from datastore import DataStore
+from obd_schema import obd_row_from_entry
+
+def load_rows(name='21-October-2025.csv'):
+    rows, errors, _ = csv_parser.parse_csv_file(name)
+    assert not errors
+    return [obd_row_from_entry(row) for row in rows]
+
+def rollup_counts(store, user_id):
+    conn = store._get_connection()
+    return conn.execute(
+        # Sums are rounded as they depend on the order rows were added in
+        'SELECT day, pid, count, ROUND(sum, 6) FROM obd_daily_rollups WHERE user_id = ? ORDER BY day, pid', (user_id,)
+    ).fetchall()
+
+def create_user(store, email):
+    store.create_user(email, 'password')
+    return store._get_connection().execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()[0]
+
+def test_reupload_is_skipped(store):
+    print("Testing a re-upload and an overlapping upload")
+    user_id = create_user(store, 'dedup@example.com')
+    rows = load_rows()
+
+    first = store.insert_obd_rows(user_id, rows)
+    assert first['rows_inserted'] == len(rows) and first['duplicates_skipped'] == 0
+    expected_rollups = rollup_counts(store, user_id)
+
+    again = store.insert_obd_rows(user_id, rows, chunk_size=50)
+    print(f"Re-upload: {again['rows_inserted']} inserted, {again['duplicates_skipped']} skipped")
+    assert again['rows_inserted'] == 0 and again['duplicates_skipped'] == len(rows)
+
+    # Half old rows, half new ones interleaved, so the new ids are not contiguous
+    shifted = [(row[0], row[1] + 500, *row[2:]) for row in rows]
+    overlapping = [row for pair in zip(rows, shifted) for row in pair]
+    overlap = store.insert_obd_rows(user_id, overlapping, chunk_size=64)
+    print(f"Overlapping upload: {overlap['rows_inserted']} inserted, {overlap['duplicates_skipped']} skipped")
+    assert overlap['duplicates_skipped'] == len(rows)
+    assert overlap['rows_inserted'] == len({row[1] for row in shifted} - {row[1] for row in rows})
+
+    live_inserted = store.insert_obd_rows_for_users([(user_id, row) for row in rows[:10]])
+    assert live_inserted == 0
+
+    stored = store._get_connection().execute(
+        'SELECT COUNT(*) FROM obd_data WHERE user_id = ?', (user_id,)).fetchone()[0]
+    assert stored == first['rows_inserted'] + overlap['rows_inserted']
+
+    # Incrementally maintained rollups must equal a rebuild from the stored rows
+    incremental = rollup_counts(store, user_id)
+    store.rebuild_rollups(user_id)
+    assert incremental == rollup_counts(store, user_id)
+    assert incremental != expected_rollups
+
+def test_migration_removes_duplicates(tmp_path, caplog, monkeypatch):
+    print("Testing the duplicate-removal migration")
+    path = str(tmp_path / 'legacy.db')
+    store = DataStore(path)
+    user_id = create_user(store, 'legacy@example.com')
+    rows = load_rows()
+    store.insert_obd_rows(user_id, rows)
+    expected_rollups = rollup_counts(store, user_id)
+    store.close()
+
+    # Recreate the pre-migration schema: a non-unique index and every row stored twice
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('DROP INDEX idx_obd_data_user_timestamp_ms')
+        conn.execute('CREATE INDEX idx_obd_data_user_timestamp_ms ON obd_data(user_id, timestamp_ms)')
+        conn.execute('INSERT INTO obd_data (user_id, timestamp, timestamp_ms, speed) '
+                     'SELECT user_id, timestamp, timestamp_ms, speed FROM obd_data')
+        conn.execute('UPDATE obd_daily_rollups SET count = count * 2, sum = sum * 2')
+    conn.close()
+
+    # The server still starts on such a database, warning that re-uploads are not skipped
+    with caplog.at_level(logging.WARNING, logger='datastore'):
+        migrated = DataStore(path)
+    assert migrated.duplicates_pending
+    assert 'dedup_obd_data.py' in caplog.text
+    conn = migrated._get_connection()
+    unique = {row[1]: row[2] for row in conn.execute('PRAGMA index_list(obd_data)')}
+    assert unique['idx_obd_data_user_timestamp_ms'] == 0
+    # Opening the database leaves the rows alone; only the one-off command removes duplicates
+    stored = conn.execute('SELECT COUNT(*) FROM obd_data WHERE user_id = ?', (user_id,)).fetchone()[0]
+    assert stored == 2 * len(rows)
+
+    monkeypatch.setattr(dedup_obd_data, 'datastore', migrated)
+    dedup_obd_data.main()
+    stored = conn.execute('SELECT COUNT(*) FROM obd_data WHERE user_id = ?', (user_id,)).fetchone()[0]
+    unique = {row[1]: row[2] for row in conn.execute('PRAGMA index_list(obd_data)')}
+    print(f"{stored} rows left")
+    assert stored == len(rows)
+    assert unique['idx_obd_data_user_timestamp_ms'] == 1
+    assert not migrated.duplicates_pending
+    assert rollup_counts(migrated, user_id) == expected_rollups
+    # The first copy of each row, with all of its columns, is the one kept
+    assert conn.execute('SELECT COUNT(*) FROM obd_data WHERE cool_temp IS NULL').fetchone()[0] == 0
+    assert conn.execute('SELECT data_version FROM users WHERE id = ?', (user_id,)).fetchone()[0] == 1
+    assert migrated.deduplicate_obd_data() == 0
+    migrated.close()
+
+    # Once deduplicated, the database starts without the warning and re-uploads are skipped
+    caplog.clear()
+    reopened = DataStore(path)
+    assert not reopened.duplicates_pending and 'dedup_obd_data.py' not in caplog.text
+    assert reopened.insert_obd_rows(user_id, rows)['duplicates_skipped'] == len(rows)
+    reopened.close()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Test /data delta fetches (since_id and since) and that the ETag changes whenever
+the user's stored data does
+"""
+
+import sys
+import pytest
+from obd_schema import obd_row_from_entry
+
+def row(second, speed=50.0, minute=20):
+    return obd_row_from_entry({'timestamp': f'2025-10-21T23:{minute:02d}:{second:02d}+10:00', 'speed': speed})
+
+@pytest.fixture
+def user_id(store, auth_headers):
+    return store._get_connection().execute('SELECT id FROM users WHERE email = ?', ('test@example.com',)).fetchone()[0]
+
+def get_data(client, auth_headers, **params):
+    response = client.get('/data', headers=auth_headers, query_string=params)
+    assert response.status_code == 200, response.json
+    return response
+
+def test_since_id(client, auth_headers, store, user_id):
+    print("Testing since_id delta fetches")
+    store.insert_obd_rows(user_id, [row(second) for second in range(10)])
+    first = get_data(client, auth_headers).json
+    latest_id = first['latest_id']
+    assert first['count'] == 10 and latest_id == max(entry['id'] for entry in first['data'])
+
+    assert get_data(client, auth_headers, since_id=latest_id).json['count'] == 0
+
+    # Rows stored later are returned by id, even with an older device timestamp; a re-sent row is not
+    store.insert_obd_rows(user_id, [row(30), row(5, speed=1.0), row(0, minute=19)])
+    delta = get_data(client, auth_headers, since_id=latest_id).json
+    print(f"since_id={latest_id}: {[entry['timestamp'] for entry in delta['data']]}")
+    assert [entry['timestamp'] for entry in delta['data']] == ['2025-10-21T23:20:30+10:00', '2025-10-21T23:19:00+10:00']
+    assert delta['latest_id'] == max(entry['id'] for entry in delta['data'])
+    assert client.get('/data', headers=auth_headers, query_string={'since_id': 'abc'}).status_code == 400
+
+def test_since(client, auth_headers, store, user_id):
+    print("Testing since delta fetches")
+    store.insert_obd_rows(user_id, [row(second) for second in range(10)])
+    newest = get_data(client, auth_headers, limit=1).json['data'][0]
+    since = '2025-10-21T23:20:05+10:00'
+    delta = get_data(client, auth_headers, since=since).json
+    print(f"since={since}: {[entry['timestamp'] for entry in delta['data']]}")
+    # Strictly newer than since
+    assert [entry['timestamp'][17:19] for entry in delta['data']] == ['09', '08', '07', '06']
+    assert get_data(client, auth_headers, since=newest['timestamp_ms']).json['count'] == 0
+    # Combined with start, the later bound applies
+    assert get_data(client, auth_headers, since=since, start='2025-10-21T23:20:08+10:00').json['count'] == 2
+    assert client.get('/data', headers=auth_headers, query_string={'since': 'soon'}).status_code == 400
+
+def test_etag_follows_data(client, auth_headers, store, user_id):
+    print("Testing ETag invalidation")
+    store.insert_obd_rows(user_id, [row(second) for second in range(10)])
+    etag = get_data(client, auth_headers).headers['ETag']
+    revalidate = {**auth_headers, 'If-None-Match': etag}
+    assert client.get('/data', headers=revalidate).status_code == 304
+
+    # An insert moves MAX(id)
+    store.insert_obd_rows(user_id, [obd_row_from_entry({'timestamp': '2025-10-22T12:00:00+00:00', 'speed': 60.0})])
+    after_insert = client.get('/data', headers=revalidate)
+    assert after_insert.status_code == 200 and after_insert.headers['ETag'] != etag
+
+    # A delete bumps data_version, here without changing MAX(id); deleting nothing leaves the ETag alone
+    etag = after_insert.headers['ETag']
+    assert client.post('/data/delete', headers=auth_headers, json={'date': '01-01-2020'}).json['rows_deleted'] == 0
+    assert client.get('/data', headers={**auth_headers, 'If-None-Match': etag}).status_code == 304
+    assert client.post('/data/delete', headers=auth_headers, json={'date': '21-10-2025'}).json['rows_deleted'] == 10
+    after_delete = client.get('/data', headers={**auth_headers, 'If-None-Match': etag})
+    print(f"{etag} -> {after_delete.headers['ETag']}")
+    assert after_delete.status_code == 200 and after_delete.headers['ETag'] != etag
+    assert after_delete.json['count'] == 1 and after_delete.json['latest_id'] == after_insert.json['latest_id']
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
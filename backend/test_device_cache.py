@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test the device-token cache and the buffered last_seen writes used by live ingest
+"""
+
+import sys
+import pytest
+import cache
+import datastore as datastore_module
+
+LIVE_PAYLOAD = [{'data_type': 'Vehicle Speed', 'data_val': '42'}]
+
+def last_seen(store, device_token):
+    return store._get_connection().execute(
+        'SELECT last_seen FROM devices WHERE device_token = ?', (device_token,)).fetchone()[0]
+
+@pytest.fixture
+def device_token(client, auth_headers):
+    return client.post('/device/token', headers=auth_headers, json={}).json['device_token']
+
+def test_deleted_device_expires_from_cache(client, store, device_token, monkeypatch):
+    print("Testing that a removed device is rejected once its cache entry expires")
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+    user_id = store.validate_device(device_token)
+    assert user_id is not None
+
+    with store._get_connection() as conn:
+        conn.execute('DELETE FROM devices WHERE device_token = ?', (device_token,))
+    assert store.validate_device(device_token) == user_id, "cached until DEVICE_CACHE_TTL"
+    now[0] += datastore_module.DEVICE_CACHE_TTL
+    assert store.validate_device(device_token) is None
+    assert client.post('/data/live', json={'key': device_token, 'data': LIVE_PAYLOAD}).status_code == 401
+
+def test_last_seen_is_flushed_in_one_write(client, store, device_token):
+    print("Testing buffered last_seen updates")
+    for _ in range(5):
+        assert client.post('/data/live', json={'key': device_token, 'data': LIVE_PAYLOAD}).status_code == 202
+    assert last_seen(store, device_token) is None, "last_seen is only written by the flusher"
+    assert store.device_cache.stats()['hits'] >= 4
+
+    assert store.flush_last_seen() == 1  # Five requests, one device, one row updated
+    assert last_seen(store, device_token) is not None
+    assert store.flush_last_seen() == 0
+
+def test_failed_flush_is_retried(store, device_token, monkeypatch):
+    print("Testing that last_seen updates survive a failed flush")
+    def locked():
+        raise RuntimeError('database is locked')
+
+    store.validate_device(device_token)
+    with monkeypatch.context() as patch:
+        patch.setattr(store, '_get_connection', locked)
+        assert store.flush_last_seen() == 0
+    assert last_seen(store, device_token) is None
+    assert store.flush_last_seen() == 1
+    assert last_seen(store, device_token) is not None
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
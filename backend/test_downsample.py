@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test that /data/series downsampling keeps the shape of a series and that the
+NumPy and pure Python implementations agree
+"""
+
+import math
+import downsample
+
+def make_series(n=5000):
+    timestamps = [1761052820000 + i * 3000 for i in range(n)]
+    values = [50 + 40 * math.sin(i / 50) + (200 if i == 1234 else 0) for i in range(n)]
+    return timestamps, values
+
+def run_both(func, *args):
+    """Run func with NumPy (if installed) and with the pure Python fallback"""
+    vectorized = func(*args)
+    saved_np, downsample.np = downsample.np, None
+    try:
+        fallback = func(*args)
+    finally:
+        downsample.np = saved_np
+    return vectorized, fallback
+
+def test_lttb():
+    timestamps, values = make_series()
+    (ts, vals), (ts_py, vals_py) = run_both(downsample.lttb, timestamps, values, 200)
+    
+    print(f"LTTB: {len(timestamps)} -> {len(ts)} points")
+    assert len(ts) == 200
+    assert ts[0] == timestamps[0] and ts[-1] == timestamps[-1]
+    assert ts == sorted(ts)
+    assert max(vals) == max(values), "spike should survive downsampling"
+    assert ts == ts_py and vals == vals_py
+    
+    # Short series are returned unchanged
+    assert downsample.lttb(timestamps[:50], values[:50], 200) == (timestamps[:50], values[:50])
+
+def test_bucket_stats():
+    timestamps, values = make_series()
+    start_ms, end_ms = timestamps[0], timestamps[-1] + 1
+    stats, stats_py = run_both(downsample.bucket_stats, timestamps, values, 100, start_ms, end_ms)
+    
+    print(f"Buckets: {len(timestamps)} -> {len(stats['timestamps'])} buckets")
+    assert len(stats['timestamps']) == 100
+    assert sum(stats['count']) == len(timestamps)
+    assert min(stats['min']) == min(values) and max(stats['max']) == max(values)
+    assert stats['timestamps'] == stats_py['timestamps'] and stats['count'] == stats_py['count']
+    assert all(abs(a - b) < 1e-9 for a, b in zip(stats['avg'], stats_py['avg']))
+
+def test_bucket_rollups():
+    timestamps, values = make_series()
+    start_ms, end_ms = timestamps[0], timestamps[-1] + 1
+    # Each point as an aggregate of one value gives the same buckets as the raw series
+    expected = downsample.bucket_stats(timestamps, values, 100, start_ms, end_ms)
+    args = (timestamps, [1] * len(values), values, values, values, 100, start_ms, end_ms)
+    stats, stats_py = run_both(downsample.bucket_rollups, *args)
+    
+    print(f"Rollup buckets: {len(timestamps)} -> {len(stats['timestamps'])} buckets")
+    for result in (stats, stats_py):
+        assert result['timestamps'] == expected['timestamps'] and result['count'] == expected['count']
+        assert result['min'] == expected['min'] and result['max'] == expected['max']
+        assert all(abs(a - b) < 1e-9 for a, b in zip(result['avg'], expected['avg']))
+
+def test_present_values():
+    timestamps, values = [1, 2, 3, 4], [1.5, None, 3.5, None]
+    assert downsample.present_values(timestamps, values) == ([1, 3], [1.5, 3.5])
+    if downsample.np is not None:
+        np = downsample.np
+        ts, vals = downsample.present_values(np.array(timestamps), np.array(values, dtype=np.float64))
+        assert ts.tolist() == [1, 3] and vals.tolist() == [1.5, 3.5]
+        # Arrays downsample to plain lists, so the series serialise as JSON
+        assert downsample.lttb(ts, vals, 10) == ([1, 3], [1.5, 3.5])
+
+if __name__ == "__main__":
+    test_lttb()
+    test_bucket_stats()
+    test_bucket_rollups()
+    test_present_values()
+    print("Downsampling tests passed")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test that /data/live stores batches of device-timestamped samples and skips
+the samples it cannot use
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+import api
+from live_writer import LiveWriter
+
+SPEED = [{'data_type': 'Vehicle Speed', 'data_val': '42'}]
+
+@pytest.fixture
+def writer(store, monkeypatch):
+    writer = LiveWriter(store, max_delay=0)
+    monkeypatch.setattr(api, 'live_writer', writer)
+    return writer
+
+@pytest.fixture
+def device_token(client, auth_headers):
+    return client.post('/device/token', headers=auth_headers, json={'name': 'car'}).json['device_token']
+
+def stored_timestamps(store, writer, expected):
+    deadline = time.monotonic() + 5
+    while writer.stats()['rows_written'] < expected:
+        assert time.monotonic() < deadline, "timed out waiting for the live writer"
+        time.sleep(0.01)
+    return [row[0] for row in store._get_connection().execute('SELECT timestamp_ms FROM obd_data ORDER BY timestamp_ms')]
+
+def test_device_timestamps_are_kept(client, device_token, store, writer):
+    print("Testing a batch of samples")
+    samples = [
+        {'timestamp': '2025-10-21T23:20:20+10:00', 'data': SPEED},
+        {'timestamp': '2025-10-21T13:20:21', 'data': SPEED},  # No offset: UTC
+        {'timestamp': 1761052822000, 'data': [{'data_type': 'Engine RPM', 'data_val': 900}]},
+        # Go's RFC3339Nano, as sent by older device agents, and the agent's microsecond layout
+        {'timestamp': '2025-10-21T23:20:23.123456789+10:00', 'data': SPEED},
+        {'timestamp': '2025-10-21T13:20:24.987654Z', 'data': SPEED}
+    ]
+    response = client.post('/data/live', json={'key': device_token, 'samples': samples})
+    print(response.json)
+    assert response.status_code == 202
+    assert response.json['rows'] == 5 and response.json['skipped'] == 0
+    assert stored_timestamps(store, writer, 5) == [1761052820000, 1761052821000, 1761052822000,
+                                                   1761052823123, 1761052824987]
+
+def test_unusable_samples_are_skipped(client, device_token, store, writer):
+    print("Testing samples that cannot be stored")
+    future = (datetime.now(timezone.utc) + timedelta(seconds=api.LIVE_MAX_CLOCK_SKEW + 60)).isoformat()
+    samples = [
+        {'timestamp': '2025-10-21T23:20:20+10:00', 'data': SPEED},
+        {'timestamp': 'yesterday', 'data': SPEED},
+        {'timestamp': True, 'data': SPEED},
+        {'timestamp': future, 'data': SPEED},
+        {'timestamp': '2025-10-21T23:20:21+10:00', 'data': [{'data_type': 'Mystery PID', 'data_val': '1'}]},
+        {'timestamp': '2025-10-21T23:20:22+10:00', 'data': 'Vehicle Speed=42'},
+        'not a sample'
+    ]
+    response = client.post('/data/live', json={'key': device_token, 'samples': samples})
+    print(response.json)
+    assert response.status_code == 202
+    assert response.json['rows'] == 1 and response.json['skipped'] == 6
+    assert stored_timestamps(store, writer, 1) == [1761052820000]
+
+def test_rejected_requests(client, device_token, writer, monkeypatch):
+    print("Testing requests that are rejected outright")
+    sample = {'timestamp': '2025-10-21T23:20:20+10:00', 'data': SPEED}
+    monkeypatch.setattr(api, 'LIVE_MAX_SAMPLES', 3)
+    too_many = client.post('/data/live', json={'key': device_token, 'samples': [sample] * 4})
+    assert too_many.status_code == 413
+
+    unsupported = {'timestamp': '2025-10-21T23:20:20+10:00', 'data': [{'data_type': 'Mystery PID', 'data_val': '1'}]}
+    assert client.post('/data/live', json={'key': device_token, 'samples': [unsupported]}).status_code == 400
+    assert client.post('/data/live', json={'key': 'not-a-token', 'samples': [sample]}).status_code == 401
+    assert client.post('/data/live', json={'key': device_token}).status_code == 400
+    assert writer.stats()['rows_written'] == 0
+
+def test_single_sample_uses_server_time(client, device_token, store, writer):
+    print("Testing the single-sample payload")
+    before = int(time.time() * 1000)
+    response = client.post('/data/live', json={'key': device_token, 'data': SPEED})
+    assert response.status_code == 202 and response.json['rows'] == 1
+    [timestamp_ms] = stored_timestamps(store, writer, 1)
+    assert before <= timestamp_ms <= int(time.time() * 1000)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
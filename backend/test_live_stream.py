@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Test that /data/stream delivers rows accepted by /data/live as Server-Sent Events
+and that slow or departed subscribers do not hold up the publisher
+"""
+
+import json
+import sys
+import pytest
+import api
+from live_stream import LiveBroker
+from live_writer import LiveWriter
+
+@pytest.fixture
+def broker(store, monkeypatch):
+    broker = LiveBroker()
+    monkeypatch.setattr(api, 'live_broker', broker)
+    monkeypatch.setattr(api, 'live_writer', LiveWriter(store, max_delay=0))
+    return broker
+
+def text(chunk):
+    return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+def test_subscribe_publish_unsubscribe():
+    print("Testing the broker")
+    broker = LiveBroker(queue_size=2)
+    first, second = broker.subscribe(1), broker.subscribe(1)
+    other = broker.subscribe(2)
+    broker.publish(1, [{'speed': 1.0}])
+    assert first.get_nowait() == second.get_nowait() == [{'speed': 1.0}]
+    assert other.empty()
+
+    broker.unsubscribe(1, first)
+    broker.publish(1, [{'speed': 2.0}])
+    assert first.empty() and second.get_nowait() == [{'speed': 2.0}]
+    broker.unsubscribe(1, second)
+    broker.unsubscribe(2, other)
+    assert not broker.has_subscribers(1) and not broker.has_subscribers(2)
+    assert broker.stats() == {'users': 0, 'subscribers': 0, 'published': 3, 'dropped': 0}
+
+def test_slow_subscriber_drops_batches():
+    print("Testing a subscriber that stops reading")
+    broker = LiveBroker(queue_size=2)
+    slow, fast = broker.subscribe(1), broker.subscribe(1)
+    for speed in range(5):
+        broker.publish(1, [{'speed': float(speed)}])
+        fast.get_nowait()
+    stats = broker.stats()
+    print(stats)
+    # The full queue drops later batches for that subscriber only
+    assert stats['dropped'] == 3 and stats['published'] == 7
+    assert [slow.get_nowait(), slow.get_nowait()] == [[{'speed': 0.0}], [{'speed': 1.0}]]
+
+def test_stream_events(client, auth_headers, broker, monkeypatch):
+    print("Testing /data/stream")
+    monkeypatch.setattr(api, 'STREAM_HEARTBEAT_SECONDS', 0.05)
+    device_token = client.post('/device/token', headers=auth_headers, json={}).json['device_token']
+    response = client.get('/data/stream', headers=auth_headers, buffered=False)
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = iter(response.response)
+    assert text(next(events)) == 'retry: 3000\n\n'
+    assert broker.stats()['subscribers'] == 1
+
+    # Nothing published yet: an idle connection gets a comment to keep proxies from closing it
+    assert text(next(events)) == ': keep-alive\n\n'
+
+    samples = [{'timestamp': f'2025-10-21T23:20:{second:02d}+10:00',
+                'data': [{'data_type': 'Vehicle Speed', 'data_val': str(second)}]} for second in (20, 21)]
+    assert client.post('/data/live', json={'key': device_token, 'samples': samples}).status_code == 202
+    frames = [text(next(events)) for _ in samples]
+    print(frames)
+    for frame, second in zip(frames, (20, 21)):
+        event, data = frame.rstrip('\n').split('\n')
+        row = json.loads(data[len('data: '):])
+        assert event == 'event: row'
+        assert row['speed'] == second and row['timestamp'] == samples[second - 20]['timestamp']
+
+    # Closing the response, as happens when the client disconnects, removes the subscriber
+    response.close()
+    assert broker.stats()['subscribers'] == 0
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test that the live writer groups /data/live requests into batched transactions
+and that a full queue is answered with 503
+"""
+
+import sys
+import threading
+import time
+import pytest
+import api
+from obd_schema import obd_row_from_entry
+from live_writer import LiveWriter
+
+def live_row(second, speed=50.0):
+    return obd_row_from_entry({'timestamp': f'2025-10-21T23:20:{second:02d}+10:00', 'speed': speed})
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def user_id(store):
+    store.create_user('live@example.com', 'password')
+    return store._get_connection().execute('SELECT id FROM users').fetchone()[0]
+
+def record_batches(store, monkeypatch, gate=None):
+    """Record the size of each batch the writer commits, optionally holding it at gate"""
+    batches = []
+    writing = threading.Event()
+    insert = store.insert_obd_rows_for_users
+
+    def recording_insert(batch):
+        batches.append(len(batch))
+        writing.set()
+        if gate is not None:
+            gate.wait(5)
+        return insert(batch)
+
+    monkeypatch.setattr(store, 'insert_obd_rows_for_users', recording_insert)
+    return batches, writing
+
+def test_requests_are_batched(store, user_id, monkeypatch):
+    print("Testing group commits")
+    batches, _ = record_batches(store, monkeypatch)
+    writer = LiveWriter(store, batch_rows=4, max_delay=0.5)
+    for second in range(10):
+        assert writer.submit(user_id, [live_row(second)])
+    # A repeated sample is skipped as a duplicate rather than failing its batch
+    assert writer.submit(user_id, [live_row(0)])
+    wait_for(lambda: writer.stats()['rows_written'] + writer.stats()['rows_duplicate'] == 11)
+
+    stats = writer.stats()
+    print(f"Batches: {batches}, {stats}")
+    # Full batches are committed straight away; the remainder once max_delay has passed
+    assert batches == [4, 4, 3]
+    assert stats['rows_written'] == 10 and stats['rows_duplicate'] == 1 and stats['batches_written'] == 3
+    stored = store._get_connection().execute('SELECT COUNT(*) FROM obd_data WHERE user_id = ?', (user_id,)).fetchone()[0]
+    assert stored == 10
+
+def test_full_queue_returns_503(client, auth_headers, store, monkeypatch):
+    print("Testing backpressure on /data/live")
+    device_token = client.post('/device/token', headers=auth_headers, json={}).json['device_token']
+    gate = threading.Event()
+    batches, writing = record_batches(store, monkeypatch, gate)
+    writer = LiveWriter(store, max_queue=1, batch_rows=1, max_delay=0)
+    monkeypatch.setattr(api, 'live_writer', writer)
+
+    def post(second):
+        sample = {'timestamp': f'2025-10-21T23:20:{second:02d}+10:00',
+                  'data': [{'data_type': 'Vehicle Speed', 'data_val': '42'}]}
+        return client.post('/data/live', json={'key': device_token, 'samples': [sample]})
+
+    try:
+        assert post(0).status_code == 202
+        assert writing.wait(5), "the writer took the first request"
+        assert post(1).status_code == 202  # Waits in the queue behind the held write
+        rejected = post(2)
+        assert rejected.status_code == 503 and rejected.headers['Retry-After'] == '1'
+    finally:
+        gate.set()
+    wait_for(lambda: writer.stats()['rows_written'] == 2)
+    assert writer.stats()['rejected_requests'] == 1
+    assert client.get('/health').json['live_writer']['rejected_requests'] == 1
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
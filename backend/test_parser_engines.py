@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Test that the NumPy block parser gives the same rows and report as the line
+parser, and benchmark the two engines
+"""
+
+import io
+import sys
+import time
+import pytest
+import block_parser
+import upload_pool
+from csv_parser import csv_parser
+from obd_schema import OBD_DATA_COLUMNS
+
+SAMPLE_FILES = ['21-October-2025.csv', 'test_different_orders.csv', 'test_csv_with_extra_fields.csv']
+
+# Lines the block parser has to send down its general paths
+EDGE_CASE_LINES = [
+    '2025-10-21T23:20:20+10:00,Vehicle Speed=5,Engine RPM=800.5',
+    '',
+    '   ',
+    'no comma on this line',
+    '2025-10-21T23:20:21+10:00,',
+    'not a timestamp,Vehicle Speed=5',
+    '2025-13-01T00:00:00+10:00,Vehicle Speed=5',
+    '2025-10-21 23:20:22+10:00,Vehicle Speed=6',
+    '2025-10-21T23:20:23.250+10:00,Vehicle Speed=7',
+    '2025-10-21T23:20:24Z,Vehicle Speed=8',
+    '2025-10-21T23:20:25,Vehicle Speed=9',
+    '2025-10-21T23:20:26-03:30,Vehicle Speed=10',
+    '2025-10-21T23:20:27+10:00,Vehicle Speed=,Engine RPM=abc',
+    '2025-10-21T23:20:28+10:00,Vehicle Speed=1e3,Engine RPM=1.5e3',
+    '2025-10-21T23:20:29+10:00,Vehicle Speed= 12 ,Engine RPM=+900,Fuel Level=.5',
+    '2025-10-21T23:20:30+10:00,Vehicle Speed=13,junk,Mystery PID=4,=7',
+    '2025-10-21T23:20:31+10:00,Vehicle Speed=14,Vehicle Speed=15',
+    '2025-10-21T23:20:32+10:00,Vehicle Speed=16,Vehicle Speed=bad',
+    '2025-10-21T23:20:33+10:00,Vehicle Speed=a=b,RPM=1000',
+    '2025-10-21T23:20:34+10:00,Mystery PID=4',
+    ' 2025-10-21T23:20:35+10:00 ,Engine Speed=1100,Vehicle Speed=17',
+]
+
+def parse(content, engine, **kwargs):
+    report = csv_parser.new_analysis_report()
+    rows = list(block_parser.iter_csv_rows(csv_parser, io.StringIO(content), OBD_DATA_COLUMNS,
+                                           report=report, engine=engine, **kwargs))
+    return rows, report
+
+def baseline_rows(content):
+    """Rows from _parse_line applied to every line, without LineLayout or the block parser"""
+    rows = []
+    for line in content.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry, _ = csv_parser._parse_line(line)
+        except ValueError:
+            continue
+        if entry:
+            rows.append(tuple(map(entry.get, OBD_DATA_COLUMNS)))
+    return rows
+
+def assert_same(content, label, **kwargs):
+    expected = parse(content, 'python', **kwargs)
+    actual = parse(content, 'numpy', **kwargs)
+    print(f"{label}: {len(expected[0])} rows, {len(expected[1]['parse_errors'])} parse errors")
+    assert actual[0] == expected[0], f"{label}: rows differ"
+    assert actual[1] == expected[1], f"{label}: reports differ"
+
+def test_sample_files():
+    print("Testing the engines on the sample files")
+    for name in SAMPLE_FILES:
+        with open(name, encoding='utf-8') as f:
+            content = f.read()
+        assert_same(content, name)
+        assert_same(content, f"{name} without validation", validate=False)
+        # Both engines against the plain per-line parser
+        for engine in block_parser.PARSER_ENGINES:
+            assert parse(content, engine)[0] == baseline_rows(content), f"{name}: {engine} engine differs from _parse_line"
+
+def test_edge_cases():
+    print("Testing lines that need the general paths")
+    valid = '2025-10-21T23:20:19+10:00,Vehicle Speed=4\n' * 5
+    content = valid + '\n'.join(EDGE_CASE_LINES) + '\n'
+    assert_same(content, "edge cases")
+    assert_same(content, "edge cases in small blocks", block_chars=64)
+    assert_same('\n'.join(EDGE_CASE_LINES), "edge cases without validation", validate=False)
+    assert_same('\n'.join(EDGE_CASE_LINES), "invalid file", stop_if_invalid=False)
+
+def test_chunked_parse():
+    print("Testing files parsed in chunks as the upload pool does")
+    with open('21-October-2025.csv', 'rb') as f:
+        content = f.read()
+    lines = content.splitlines(keepends=True)
+    content = b''.join(lines[:150]) + b'not a timestamp,Vehicle Speed=5\n' + b''.join(lines[150:])
+    expected = parse(content.decode('utf-8'), block_parser.CSV_PARSER_ENGINE)
+    for chunk_bytes in (1000, 64 * 1024):
+        report = csv_parser.new_analysis_report()
+        rows = []
+        for first_line_num, chunk in upload_pool.iter_csv_chunks(io.BytesIO(content), chunk_bytes):
+            parsed = upload_pool.parse_csv_rows(chunk, first_line_num, validate=first_line_num == 1)
+            if first_line_num == 1:
+                report = parsed['report']
+            else:
+                csv_parser.merge_analysis_report(report, parsed['report'])
+            rows.extend(parsed['rows'])
+        print(f"{chunk_bytes} byte chunks: {len(rows)} rows, {report['parse_errors']}")
+        assert rows == expected[0]
+        assert report == expected[1]
+
+def test_benchmark():
+    print("Benchmarking the engines")
+    with open('21-October-2025.csv', encoding='utf-8') as f:
+        content = f.read() * 100
+    expected = baseline_rows(content)
+    timings = {}
+    for engine in block_parser.PARSER_ENGINES:
+        # Best of three runs, so one slow run on a busy machine does not decide the speed check
+        timings[engine] = float('inf')
+        for _ in range(3):
+            started = time.perf_counter()
+            rows, _ = parse(content, engine)
+            timings[engine] = min(timings[engine], time.perf_counter() - started)
+        print(f"{engine}: {len(rows)} rows in {timings[engine]:.2f} s ({len(rows) / timings[engine]:,.0f} rows/s)")
+        assert rows == expected, f"{engine} engine differs from _parse_line"
+    print(f"Block parser speedup: {timings['python'] / timings['numpy']:.1f}x")
+    if block_parser.block_engine_available('numpy'):
+        # Loose, so a busy machine does not fail it; a regression to per-line speed still does
+        assert timings['numpy'] < timings['python'] * 0.9, "the block parser is no faster than the line parser"
+
+if __name__ == "__main__":
+    # Run through pytest so conftest keeps the datastore import off the real database
+    sys.exit(pytest.main([__file__, '-s']))
@@ -3,7 +3,8 @@
 Test script to demonstrate that the CSV parser handles different field orders correctly
 """
 
-from csv_parser import csv_parser
+import io
+from csv_parser import csv_parser, line_layout_key
 
 def test_different_orders():
     """Test that the parser handles different field orders correctly"""
@@ -54,5 +55,50 @@ def test_different_orders():
     print("- ✅ Missing fields are handled gracefully")
     print("- ✅ Exact field name matching is required")
 
+def parse_lines(lines):
+    """Parse each line on its own with the general line parser"""
+    rows, field_counts, unsupported_fields = [], {}, set()
+    for line in lines:
+        parsed_data, unsupported = csv_parser._parse_line(line, field_counts)
+        if parsed_data:
+            rows.append(parsed_data)
+            unsupported_fields.update(unsupported)
+    return rows, field_counts, unsupported_fields
+
+def test_layout_fast_path():
+    """Test that lines parsed with a learned field layout match the general parser"""
+    
+    print("\n🧪 Testing the learned field layout against the general parser")
+    with open('test_different_orders.csv', encoding='utf-8') as f:
+        mixed_orders = f.read().splitlines()
+    logger_line = "2025-10-21T23:21:{:02d}+10:00,Vehicle Speed={},Engine RPM=850.5,Custom Field=1,junk,Fuel Level={}"
+    lines = mixed_orders + [
+        *(logger_line.format(i, i, 40 + i) for i in range(10)),
+        # Matches the layout but has values the parser skips
+        logger_line.format(10, '', 'abc'),
+        logger_line.format(11, '1e3', '.5'),
+        logger_line.format(12, ' 7 ', '+3'),
+        # A different order, then back to the learned one
+        *mixed_orders,
+        logger_line.format(13, 13, 53),
+        "2025-10-21T23:21:14+10:00,Vehicle Speed=14,Vehicle Speed=oops,Custom Field=1",
+        "2025-10-21T23:21:15+10:00,Vehicle Speed=15,Vehicle Speed=oops,Custom Field=1",
+        "2025-10-21T23:21:16+10:00,Vehicle Speed=16,Vehicle Speed=17,Custom Field=1",
+    ]
+    
+    expected_rows, expected_counts, expected_unsupported = parse_lines(lines)
+    report = csv_parser.new_analysis_report()
+    rows = [row for batch in csv_parser.analyze_csv_file(io.StringIO('\n'.join(lines)), report=report)
+            for row in batch]
+    
+    print(f"   📊 {len(rows)} rows, {len(report['field_counts'])} supported fields")
+    assert line_layout_key(logger_line.format(0, 0, 0)) in csv_parser._line_layouts
+    assert rows == expected_rows
+    assert report['field_counts'] == expected_counts
+    assert report['unsupported_fields'] == expected_unsupported
+    assert not report['parse_errors']
+    print("   ✅ Layout fast path matches the general parser")
+
 if __name__ == "__main__":
     test_different_orders()
+    test_layout_fast_path()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Test that the CSV parser gives the same result for a file path, an upload
+stream and a ZIP member stream
+"""
+
+import io
+import zipfile
+from csv_parser import csv_parser
+
+SAMPLE_FILES = ['21-October-2025.csv', 'test_different_orders.csv', 'test_csv_with_extra_fields.csv']
+
+def analyze(source):
+    report = csv_parser.new_analysis_report()
+    rows = [row for batch in csv_parser.analyze_csv_file(source, report=report) for row in batch]
+    return rows, report
+
+def test_stream_sources():
+    print("Testing path, upload stream and ZIP member sources")
+    for name in SAMPLE_FILES:
+        expected = analyze(name)
+        with open(name, 'rb') as f:
+            content = f.read()
+
+        upload = analyze(io.TextIOWrapper(io.BytesIO(content), encoding='utf-8'))
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr(name, content)
+        with zipfile.ZipFile(archive) as zip_file, zip_file.open(name) as member:
+            from_zip = analyze(io.TextIOWrapper(member, encoding='utf-8'))
+
+        print(f"{name}: {len(expected[0])} rows")
+        assert upload == expected, f"{name}: upload stream differs from file"
+        assert from_zip == expected, f"{name}: ZIP member stream differs from file"
+
+if __name__ == "__main__":
+    test_stream_sources()
+    print("Stream parsing tests passed")
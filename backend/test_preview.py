@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test that the sampling upload preview reads a bounded amount of a file and
+estimates its row count closely
+"""
+
+import io
+import time
+from csv_parser import csv_parser, PREVIEW_PREFIX_BYTES
+
+class CountingStream(io.BytesIO):
+    """BytesIO that records how many bytes were read"""
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+def test_small_file_is_exact():
+    print("Testing preview of a file smaller than the prefix")
+    with open('test_different_orders.csv', 'rb') as f:
+        content = f.read()
+    assert len(content) <= PREVIEW_PREFIX_BYTES
+    report = csv_parser.sample_csv_file(io.BytesIO(content))
+    rows, _, _ = csv_parser.parse_csv_file('test_different_orders.csv')
+    assert report['rows_exact'] and report['estimated_rows'] == len(rows)
+    assert report['is_valid'] and len(report['sample_data']) == min(5, len(rows))
+
+def test_large_file_is_sampled():
+    print("Testing preview of a large file")
+    with open('21-October-2025.csv', 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    content = b''.join(lines * 400)
+    actual_rows = len(lines) * 400
+    stream = CountingStream(content)
+
+    started = time.perf_counter()
+    report = csv_parser.sample_csv_file(stream)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(f"{len(content) / 1e6:.1f} MB, {actual_rows} rows: estimated {report['estimated_rows']} "
+          f"from {stream.bytes_read} bytes in {elapsed_ms:.1f} ms")
+
+    assert not report['rows_exact']
+    assert abs(report['estimated_rows'] - actual_rows) / actual_rows < 0.05
+    assert stream.bytes_read < 128 * 1024
+    assert report['is_valid'] and len(report['sample_data']) == 5
+    assert report['field_coverage']['Vehicle Speed'] == 1.0
+
+def test_windows_do_not_overlap():
+    print("Testing that each sampled line is counted once")
+    with open('21-October-2025.csv', 'rb') as f:
+        content = f.read()
+    actual_rows = content.count(b'\n')
+    # Windows larger than their strata, which would overlap if placed independently
+    report = csv_parser.sample_csv_file(io.BytesIO(content), samples=16, sample_bytes=8 * 1024)
+    print(f"{report['lines_sampled']} lines sampled of {actual_rows}")
+    assert not report['rows_exact']
+    assert report['lines_sampled'] <= actual_rows
+    assert report['field_counts']['Vehicle Speed'] == report['lines_sampled']
+
+if __name__ == "__main__":
+    test_small_file_is_exact()
+    test_large_file_is_sampled()
+    test_windows_do_not_overlap()
+    print("Preview tests passed")
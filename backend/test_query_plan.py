@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test that time-filtered /data queries are answered from the (user_id, timestamp_ms) index,
+and that timestamp_ms is backfilled for rows stored before the column existed
+"""
+
+import sqlite3
+import sys
+import pytest
+from csv_parser import timestamp_to_epoch_ms
+from datastore import DataStore
+
+INDEX_NAME = 'idx_obd_data_user_timestamp_ms'
+
+def explain(store, query, params):
+    """Return the EXPLAIN QUERY PLAN detail lines for a query"""
+    conn = store._get_connection()
+    return [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()]
+
+def test_query_plans(store):
+    print("Testing /data query plans")
+    print("=" * 50)
+    
+    cases = {
+        'date filter': dict(date='21-10-2025'),
+        'start/end range': dict(start_ms=1761052820000, end_ms=1761053816000),
+        'start only with data types': dict(start_ms=1761052820000, data_types=['speed', 'rpm']),
+        'no filter': dict(),
+        'next page': dict(date='21-10-2025', after=(1761053816000, 295)),
+    }
+    
+    for name, kwargs in cases.items():
+        query, params = store.build_obd_data_query(1, **kwargs)
+        plan = explain(store, query, params)
+        print(f"\n{name}: {plan}")
+        
+        assert any(INDEX_NAME in detail for detail in plan), f"{name} does not use {INDEX_NAME}"
+        # The ORDER BY must be satisfied by the index as well, not by a sort step
+        assert not any('TEMP B-TREE' in detail for detail in plan), f"{name} sorts outside the index"
+        if kwargs.get('date') or kwargs.get('start_ms') or kwargs.get('after'):
+            assert any('timestamp_ms>' in detail.replace(' ', '') for detail in plan), f"{name} is not a range scan"
+    
+    print("\n" + "=" * 50)
+    print("All time filters use the index range scan")
+
+def test_data_version_plan(store):
+    print("Testing the /data ETag lookup plan")
+    conn = store._get_connection()
+    plan = [row[3] for row in conn.execute(
+        'EXPLAIN QUERY PLAN SELECT MAX(id) FROM obd_data WHERE user_id = ?', (1,)
+    ).fetchall()]
+    print(plan)
+    # A single seek on (user_id, id), not a walk over the user's rows
+    assert any('idx_obd_data_user_id' in detail for detail in plan), "latest row lookup does not use idx_obd_data_user_id"
+    # The store is empty, so there is no latest row and nothing has been deleted
+    assert store.get_data_version(1) == (None, 0)
+
+def test_timestamp_ms_backfill(tmp_path):
+    print("Testing the timestamp_ms backfill")
+    path = str(tmp_path / 'legacy.db')
+    # obd_data as it was before timestamp_ms (and the later PID columns) were added
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('''
+            CREATE TABLE obd_data (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, timestamp TEXT NOT NULL,
+                rpm REAL, speed REAL, cool_temp REAL, throttle_pos REAL, intake_mani_pres REAL,
+                intake_air_temp REAL, maf_air_flow_rate REAL, run_time REAL, baro_pressure REAL,
+                catalyst_temp REAL, control_module_voltage REAL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Microsecond timestamps whose millisecond must be floored, as on insert, not rounded
+        timestamps = [f'2025-10-21T23:20:{second:02d}.{micros:06d}+10:00'
+                      for second in range(10) for micros in (999999, 500500, 123456, 1)]
+        timestamps.append('2025-10-21 23:21:00')
+        conn.executemany('INSERT INTO obd_data (user_id, timestamp, speed) VALUES (1, ?, 50)',
+                         [(timestamp,) for timestamp in timestamps])
+        conn.execute("INSERT INTO obd_data (user_id, timestamp, speed) VALUES (1, 'not a timestamp', 50)")
+    conn.close()
+
+    store = DataStore(path)
+    conn = store._get_connection()
+    backfilled = dict(conn.execute('SELECT timestamp, timestamp_ms FROM obd_data').fetchall())
+    assert backfilled.pop('not a timestamp') is None
+    assert backfilled == {timestamp: timestamp_to_epoch_ms(timestamp) for timestamp in timestamps}
+    # The unparseable row has no day, so it is left out of the rollups rather than failing the rebuild
+    rollups = conn.execute("SELECT day, count FROM obd_daily_rollups WHERE pid = 'speed'").fetchall()
+    assert rollups == [('2025-10-21', len(timestamps))]
+    store.close()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
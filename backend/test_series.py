@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test that /data/series reads a bounded window into arrays and answers larger
+windows from the daily rollups
+"""
+
+import sys
+import pytest
+import api
+from csv_parser import csv_parser
+from datastore import DAY_MS
+from obd_schema import obd_row_from_entry
+
+def store_days(store, days=3):
+    """Store the sample file once per day, starting on its own day; returns the rows per day"""
+    user_id = store._get_connection().execute('SELECT id FROM users').fetchone()[0]
+    entries, errors, _ = csv_parser.parse_csv_file('21-October-2025.csv')
+    assert not errors
+    rows = [obd_row_from_entry(entry) for entry in entries]
+    for day in range(days):
+        store.insert_obd_rows(user_id, [(row[0], row[1] + day * DAY_MS, *row[2:]) for row in rows])
+    return rows
+
+def get_series(client, headers, **params):
+    response = client.get('/data/series', headers=headers, query_string=params)
+    assert response.status_code == 200, response.json
+    return response.json
+
+def test_series_from_rows(client, auth_headers, store):
+    print("Testing a window read from obd_data")
+    rows = store_days(store, days=1)
+    start = rows[0][1]
+    series = get_series(client, auth_headers, start=start, data_types=['speed', 'rpm'], points=50)
+    print(f"{series['source_rows']} rows -> {len(series['series']['speed']['timestamps'])} points")
+    assert series['source'] == 'rows' and series['source_rows'] == len(rows)
+    assert len(series['series']['speed']['timestamps']) == 50
+    # The sample file has no rpm, so that series is empty rather than full of nulls
+    assert series['series']['rpm'] == {'timestamps': [], 'values': []}
+
+    buckets = get_series(client, auth_headers, start=start, data_types='speed', method='bucket', points=10)
+    assert sum(buckets['series']['speed']['count']) == len(rows)
+
+def test_series_from_rollups(client, auth_headers, store, monkeypatch):
+    print("Testing a window answered from the daily rollups")
+    rows = store_days(store)
+    # Whole UTC days, so each bucket holds one day of rows and one rollup day
+    start = rows[0][1] - rows[0][1] % DAY_MS
+    end = start + 3 * DAY_MS
+    expected = get_series(client, auth_headers, start=start, end=end, data_types='speed', method='bucket', points=3)
+    assert expected['source'] == 'rows'
+
+    monkeypatch.setattr(api, 'SERIES_MAX_ROWS', len(rows))
+    series = get_series(client, auth_headers, start=start, end=end, data_types='speed', method='bucket', points=3)
+    print(f"{series['source_rows']} rollup rows: {series['series']['speed']}")
+    assert series['source'] == 'daily_rollups' and series['source_rows'] == 3
+    speed = series['series']['speed']
+    assert speed['count'] == [len(rows)] * 3 == expected['series']['speed']['count']
+    assert speed['min'] == expected['series']['speed']['min']
+    assert speed['max'] == expected['series']['speed']['max']
+    assert speed['avg'] == pytest.approx(expected['series']['speed']['avg'])
+
+    averages = get_series(client, auth_headers, start=start, end=end, data_types='speed')
+    assert averages['source'] == 'daily_rollups'
+    assert averages['series']['speed']['values'] == pytest.approx(speed['avg'])
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
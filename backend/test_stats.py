@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test that /data/stats totals per day, week and month follow uploads, re-uploads
+and deletes through the daily rollups
+"""
+
+import io
+import sys
+import time
+from datetime import date, timedelta
+import pytest
+import api
+from upload_jobs import UploadJobQueue
+
+# Sunday 5 October ends the week starting Monday 29 September, which spans two months
+DAYS = [date(2025, 9, 29), date(2025, 9, 30), date(2025, 10, 1), date(2025, 10, 5), date(2025, 10, 6)]
+ROWS_PER_DAY = 20
+
+def day_rows(day):
+    """(timestamp, speed, rpm) samples through one UTC day, each day with its own values"""
+    return [(f'{day.isoformat()}T{hour:02d}:{minute:02d}:00+00:00', float(day.day * 100 + hour), 800.0 + minute)
+            for hour, minute in ((index, index * 2) for index in range(ROWS_PER_DAY))]
+
+def csv_content(days):
+    return ''.join(f'{timestamp},Vehicle Speed={speed},Engine RPM={rpm}\n'
+                   for day in days for timestamp, speed, rpm in day_rows(day)).encode()
+
+def expected_stats(days, period):
+    """What /data/stats should report for the given days' rows, computed directly"""
+    def period_start(day):
+        if period == 'week':
+            return day - timedelta(days=day.weekday())
+        if period == 'month':
+            return day.replace(day=1)
+        return day
+
+    values = {}
+    for day in days:
+        for _, speed, rpm in day_rows(day):
+            bucket = values.setdefault(period_start(day).isoformat(), {'speed': [], 'rpm': []})
+            bucket['speed'].append(speed)
+            bucket['rpm'].append(rpm)
+    return {start: {pid: (len(v), min(v), max(v), sum(v) / len(v)) for pid, v in pids.items()}
+            for start, pids in sorted(values.items())}
+
+def fetch_stats(client, auth_headers, period):
+    response = client.get('/data/stats', headers=auth_headers,
+                          query_string={'period': period, 'data_types': ['speed', 'rpm']})
+    assert response.status_code == 200, response.json
+    return {entry['period_start']: {pid: (s['count'], s['min'], s['max'], pytest.approx(s['avg']))
+                                    for pid, s in entry['stats'].items()}
+            for entry in response.json['stats']}
+
+def assert_stats(client, auth_headers, days):
+    for period in ('day', 'week', 'month'):
+        actual = fetch_stats(client, auth_headers, period)
+        print(f"{period}: {sorted(actual)}")
+        assert actual == expected_stats(days, period), period
+
+def upload(client, auth_headers, days):
+    files = {'files': (io.BytesIO(csv_content(days)), 'days.csv')}
+    response = client.post('/data/upload', headers=auth_headers, data=files, content_type='multipart/form-data')
+    assert response.status_code == 202
+    deadline = time.monotonic() + 30
+    while True:
+        job = client.get(response.json['status_url'], headers=auth_headers).json
+        if job['status'] in ('completed', 'failed'):
+            assert job['status'] == 'completed' and not job['errors'], job
+            return job
+        assert time.monotonic() < deadline, "upload did not finish"
+        time.sleep(0.05)
+
+@pytest.fixture
+def job_queue(store, monkeypatch):
+    job_queue = UploadJobQueue(store, api.run_upload_job)
+    monkeypatch.setattr(api, 'upload_job_queue', job_queue)
+    return job_queue
+
+def test_period_totals(client, auth_headers, job_queue):
+    print("Testing day, week and month totals after an upload")
+    job = upload(client, auth_headers, DAYS)
+    assert job['rows_inserted'] == len(DAYS) * ROWS_PER_DAY
+    assert_stats(client, auth_headers, DAYS)
+    weeks = fetch_stats(client, auth_headers, 'week')
+    assert list(weeks) == ['2025-09-29', '2025-10-06']
+    assert weeks['2025-09-29']['speed'][0] == 4 * ROWS_PER_DAY
+
+def test_reupload_keeps_totals(client, auth_headers, job_queue):
+    print("Testing totals after a duplicate and an overlapping re-upload")
+    upload(client, auth_headers, DAYS[:3])
+    again = upload(client, auth_headers, DAYS[:3])
+    assert again['rows_inserted'] == 0 and again['summary']['total_duplicates_skipped'] == 3 * ROWS_PER_DAY
+    assert_stats(client, auth_headers, DAYS[:3])
+
+    # Only the rows stored by this upload are added to the rollups
+    overlap = upload(client, auth_headers, DAYS)
+    assert overlap['rows_inserted'] == 2 * ROWS_PER_DAY
+    assert_stats(client, auth_headers, DAYS)
+
+def test_delete_rebuilds_totals(client, auth_headers, job_queue):
+    print("Testing totals after deleting days")
+    upload(client, auth_headers, DAYS)
+    response = client.post('/data/delete', headers=auth_headers, json={'date': '01-10-2025'})
+    assert response.json['rows_deleted'] == ROWS_PER_DAY
+    remaining = [day for day in DAYS if day != date(2025, 10, 1)]
+    assert_stats(client, auth_headers, remaining)
+
+    for day in remaining:
+        client.post('/data/delete', headers=auth_headers, json={'date': day.strftime('%d-%m-%Y')})
+    for period in ('day', 'week', 'month'):
+        assert fetch_stats(client, auth_headers, period) == {}
+
+def test_invalid_period(client, auth_headers):
+    response = client.get('/data/stats', headers=auth_headers, query_string={'period': 'year'})
+    assert response.status_code == 400 and response.json['supported_periods'] == ['day', 'week', 'month']
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
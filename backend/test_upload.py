@@ -7,11 +7,24 @@ This script demonstrates how to use the upload endpoints
 import requests
 import json
 import os
+import time
 from datetime import datetime
 
 # API base URL
 BASE_URL = "http://localhost:5000"
 
+def wait_for_upload(response, headers, timeout=120):
+    """Poll the background job of an accepted upload until it finishes; returns the final job status"""
+    status_url = response.json()['status_url']
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BASE_URL}{status_url}", headers=headers).json()
+        print(f"   - Job {job['job_id']}: {job['status']}, {job['rows_inserted']} rows inserted")
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(1)
+    raise TimeoutError(f"Upload job did not finish within {timeout}s")
+
 def test_upload_api():
     """Test the upload API endpoints"""
     
@@ -65,8 +78,8 @@ def test_upload_api():
                                    files=files, headers=headers)
         
         print(f"Status: {response.status_code}")
-        if response.status_code in [200, 207]:
-            upload_data = response.json()
+        if response.status_code == 202:
+            upload_data = wait_for_upload(response, headers)
             print(f"✅ Upload successful")
             print(f"   - Files processed: {upload_data['summary']['total_files_processed']}")
             print(f"   - Rows processed: {upload_data['summary']['total_rows_processed']}")
@@ -115,8 +128,8 @@ def test_upload_api():
             file_obj.close()
         
         print(f"Status: {response.status_code}")
-        if response.status_code in [200, 207]:
-            upload_data = response.json()
+        if response.status_code == 202:
+            upload_data = wait_for_upload(response, headers)
             print(f"✅ Multiple file upload successful")
             print(f"   - Files processed: {upload_data['summary']['total_files_processed']}")
             print(f"   - Rows processed: {upload_data['summary']['total_rows_processed']}")
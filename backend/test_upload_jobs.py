@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the background upload jobs: accepting an upload, polling its status until
+it finishes, and the queue's answers when jobs cannot run
+"""
+
+import io
+import sys
+import threading
+import time
+import pytest
+import api
+from upload_jobs import UploadJobQueue
+
+@pytest.fixture
+def job_queue(store, monkeypatch):
+    job_queue = UploadJobQueue(store, api.run_upload_job)
+    monkeypatch.setattr(api, 'upload_job_queue', job_queue)
+    return job_queue
+
+def user_id(store, email):
+    return store._get_connection().execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()[0]
+
+def upload(client, auth_headers, *names):
+    files = []
+    for name in names:
+        with open(name, 'rb') as f:
+            files.append((io.BytesIO(f.read()), name))
+    return client.post('/data/upload', headers=auth_headers, data={'files': files},
+                       content_type='multipart/form-data')
+
+def wait_for_job(client, auth_headers, status_url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get(status_url, headers=auth_headers)
+        assert response.status_code == 200
+        if response.json['status'] in ('completed', 'failed'):
+            return response.json
+        assert time.monotonic() < deadline, f"job still {response.json['status']}"
+        time.sleep(0.05)
+
+def test_upload_lifecycle(client, auth_headers, job_queue):
+    print("Testing an upload from acceptance to completion")
+    response = upload(client, auth_headers, '21-October-2025.csv', 'test_different_orders.csv')
+    print(response.json)
+    assert response.status_code == 202 and response.json['files'] == 2
+    job = wait_for_job(client, auth_headers, response.json['status_url'])
+    print(job['summary'])
+    assert job['status'] == 'completed' and job['job_id'] == response.json['job_id']
+    assert job['files_total'] == job['files_processed'] == 2
+    assert job['summary']['successful_files'] == 2 and job['summary']['failed_files'] == 0
+    assert job['rows_inserted'] == job['summary']['total_rows_processed'] > 0
+    assert not job['errors'] and job_queue.stats()['jobs_completed'] == 1
+
+    stored = client.get('/data', headers=auth_headers, query_string={'limit': 1000}).json['count']
+    assert stored == job['rows_inserted']
+
+    # The same file again is stored as duplicates, not new rows
+    again = wait_for_job(client, auth_headers,
+                         upload(client, auth_headers, '21-October-2025.csv').json['status_url'])
+    assert again['status'] == 'completed' and again['rows_inserted'] == 0
+    assert again['summary']['total_duplicates_skipped'] > 0
+
+def test_invalid_file_is_reported(client, auth_headers, job_queue):
+    print("Testing a job with a file that fails validation")
+    files = {'files': (io.BytesIO(b'not,an,obd,log\n' * 20), 'bad.csv')}
+    response = client.post('/data/upload', headers=auth_headers, data=files, content_type='multipart/form-data')
+    job = wait_for_job(client, auth_headers, response.json['status_url'])
+    assert job['status'] == 'completed' and job['rows_inserted'] == 0
+    assert job['summary']['failed_files'] == 1 and job['errors']
+
+def test_unknown_and_stale_jobs(client, auth_headers, store):
+    print("Testing unknown jobs and jobs left behind by a stopped process")
+    assert client.get('/data/upload/jobs/no-such-job', headers=auth_headers).status_code == 404
+
+    # Another user's job is not visible
+    store.create_user('other@example.com', 'password')
+    other_job_id = store.create_upload_job(user_id(store, 'other@example.com'), 1)
+    assert client.get(f'/data/upload/jobs/{other_job_id}', headers=auth_headers).status_code == 404
+
+    test_user_id = user_id(store, 'test@example.com')
+    stale_id = store.create_upload_job(test_user_id, 1)
+    conn = store._get_connection()
+    with conn:
+        conn.execute("UPDATE upload_jobs SET status = 'running', updated_at = datetime('now', '-1 hour') WHERE id = ?",
+                     (stale_id,))
+    job = client.get(f'/data/upload/jobs/{stale_id}', headers=auth_headers).json
+    print(job)
+    assert job['status'] == 'failed' and 'interrupted' in job['error']
+
+    fresh_id = store.create_upload_job(test_user_id, 1)
+    assert client.get(f'/data/upload/jobs/{fresh_id}', headers=auth_headers).json['status'] == 'queued'
+
+def test_full_queue_returns_503(client, auth_headers, store, monkeypatch):
+    print("Testing backpressure on /data/upload")
+    started = threading.Event()
+    release = threading.Event()
+
+    def held_job(job):
+        started.set()
+        release.wait(5)
+        return api.run_upload_job(job)
+
+    job_queue = UploadJobQueue(store, held_job, max_queue=1)
+    monkeypatch.setattr(api, 'upload_job_queue', job_queue)
+    try:
+        running = upload(client, auth_headers, 'test_different_orders.csv')
+        assert running.status_code == 202
+        assert started.wait(5), "the worker took the first job"
+        queued = upload(client, auth_headers, 'test_different_orders.csv')
+        assert queued.status_code == 202
+        assert client.get(queued.json['status_url'], headers=auth_headers).json['status'] == 'queued'
+        rejected = upload(client, auth_headers, 'test_different_orders.csv')
+        assert rejected.status_code == 503 and rejected.headers['Retry-After'] == '5'
+    finally:
+        release.set()
+    assert wait_for_job(client, auth_headers, running.json['status_url'])['status'] == 'completed'
+    assert wait_for_job(client, auth_headers, queued.json['status_url'])['status'] == 'completed'
+    assert job_queue.stats()['rejected_jobs'] == 1
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
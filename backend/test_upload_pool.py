@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test that CSV chunks parsed in the upload pool's worker processes match parsing
+in-process, and that the pool recovers when a worker dies
+"""
+
+import io
+import sys
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+import upload_pool
+from upload_pool import UploadPool
+
+def chunks(name='21-October-2025.csv', chunk_bytes=4096):
+    with open(name, 'rb') as f:
+        return list(upload_pool.iter_csv_chunks(io.BytesIO(f.read()), chunk_bytes))
+
+@pytest.fixture
+def pool():
+    pool = UploadPool(workers=1)
+    yield pool
+    if pool.stats()['started']:
+        pool._executor.get().shutdown(cancel_futures=True)
+
+def test_pool_parse(pool):
+    print(f"Testing chunks parsed by {upload_pool.UPLOAD_POOL_START_METHOD} workers")
+    executor = pool._executor.get()
+    assert executor._mp_context.get_start_method() == upload_pool.UPLOAD_POOL_START_METHOD != 'fork'
+    for first_line_num, chunk in chunks():
+        validate = first_line_num == 1
+        parsed = pool.submit(chunk, first_line_num, validate).result(timeout=60)
+        assert parsed == upload_pool.parse_csv_rows(chunk, first_line_num, validate)
+    print(pool.stats())
+    assert pool.stats()['chunks_submitted'] == len(chunks())
+
+def test_broken_pool_is_replaced(pool):
+    print("Testing a pool whose worker was killed")
+    [(_, chunk)] = chunks(chunk_bytes=1 << 20)
+    assert pool.submit(chunk).result(timeout=60)['rows']
+    broken = pool._executor.get()
+    [worker] = broken._processes.values()
+    worker.kill()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(upload_pool.parse_csv_rows, chunk).result(timeout=60)
+
+    # The next chunk goes to a fresh pool once the broken one is shut down
+    parsed = pool.submit(chunk).result(timeout=60)
+    assert parsed == upload_pool.parse_csv_rows(chunk)
+    assert pool._executor.get() is not broken
+    assert broken._shutdown_thread, "the broken pool was shut down"
+    assert not worker.is_alive()
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-s']))
@@ -0,0 +1,172 @@
+"""
+Background upload jobs
+/data/upload queues the uploaded files; a worker thread parses and ingests them
+while progress is recorded in the upload_jobs table
+"""
+
+import os
+import queue
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from process_local import ProcessLocal, start_daemon_thread
+
+# Uploads waiting for a worker thread before clients are told to retry (their files are held in temporary files)
+UPLOAD_JOB_QUEUE_SIZE = int(os.environ.get('UPLOAD_JOB_QUEUE_SIZE', 16))
+# Jobs processed concurrently per API process; each job still parses its files in the upload pool
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', 1))
+# Minimum seconds between progress writes for a running job
+UPLOAD_JOB_PROGRESS_INTERVAL = float(os.environ.get('UPLOAD_JOB_PROGRESS_INTERVAL', 1.0))
+# Seconds between updated_at refreshes of this process's queued and running jobs; must stay well
+# below UPLOAD_JOB_STALE_SECONDS, after which a job is taken to have died with its process
+UPLOAD_JOB_HEARTBEAT_INTERVAL = float(os.environ.get('UPLOAD_JOB_HEARTBEAT_INTERVAL', 30))
+# Rows counted between progress checks while a file streams into the datastore
+PROGRESS_ROWS = 1000
+
+class UploadJob:
+    """A queued upload (files spooled to temporary files) and its progress reporting"""
+
+    def __init__(self, store, job_id: str, user_id: int, files: List[Any]):
+        self.store = store
+        self.job_id = job_id
+        self.user_id = user_id
+        self.files = files
+        self.files_total = len(files)  # Becomes the number of CSVs once ZIPs are opened
+        self.rows_parsed = 0
+        self.results = {'success': [], 'errors': [], 'total_rows_processed': 0, 'total_duplicates_skipped': 0,
+                        'total_files_processed': 0}
+        self._saved_at = 0.0
+
+    def release_files(self):
+        """Close the uploaded files, deleting their temporary copies"""
+        for file in self.files:
+            file.close()
+        self.files = []
+
+    def count_rows(self, rows: Iterable) -> Iterator:
+        """Pass rows through to the writer, counting them as parsed"""
+        pending = 0
+        for row in rows:
+            yield row
+            pending += 1
+            if pending == PROGRESS_ROWS:
+                self.rows_parsed += pending
+                pending = 0
+                self.save()
+        self.rows_parsed += pending
+
+    def files_found(self, count: int):
+        """Set the number of file results to expect, counting each CSV inside a ZIP"""
+        self.files_total = count
+        self.save(force=True)
+
+    def file_finished(self, results: Dict[str, Any]):
+        """Record the running upload results after a file has been stored"""
+        self.results = results
+        self.save(force=True)
+
+    def save(self, force: bool = False, **fields):
+        """Write progress to the upload_jobs table, at most once per UPLOAD_JOB_PROGRESS_INTERVAL unless forced"""
+        now = time.monotonic()
+        if not force and now - self._saved_at < UPLOAD_JOB_PROGRESS_INTERVAL:
+            return
+        self._saved_at = now
+        progress = {
+            'files_total': self.files_total,
+            'files_processed': len(self.results['success']) + len(self.results['errors']),
+            'rows_parsed': self.rows_parsed,
+            'rows_inserted': self.results['total_rows_processed'],
+            'result': {'success': self.results['success'], 'errors': self.results['errors']}
+        }
+        progress.update(fields)
+        try:
+            self.store.update_upload_job(self.job_id, **progress)
+        except Exception as e:
+            print(f"Error saving upload job progress: {e}")
+
+class UploadJobQueue:
+    def __init__(self, store, handler: Callable[[UploadJob], Dict[str, Any]],
+                 max_queue: int = UPLOAD_JOB_QUEUE_SIZE, workers: int = UPLOAD_JOB_WORKERS):
+        self.store = store
+        self.handler = handler  # Processes a job and returns its final result
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._started = ProcessLocal(self._start_workers)
+        self._jobs = {}  # job_id -> UploadJob, queued or running in this process
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.rejected_jobs = 0
+
+    def submit(self, user_id: int, files: List[Any]) -> Optional[str]:
+        """
+        Create and queue a job for the files, which the queue then closes when done with them
+
+        Returns the job id, or None if the queue is full.
+        """
+        self._started.get()
+        if self._queue.full():
+            self.rejected_jobs += 1
+            for file in files:
+                file.close()
+            return None
+        job = UploadJob(self.store, self.store.create_upload_job(user_id, len(files)), user_id, files)
+        self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.rejected_jobs += 1
+            del self._jobs[job.job_id]
+            job.release_files()
+            job.save(force=True, status='failed', result={'error': 'Upload queue is full'})
+            return None
+        return job.job_id
+
+    def _start_workers(self) -> List[Any]:
+        # Jobs queued before a fork belong to the parent process
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._jobs = {}
+        threads = [start_daemon_thread(self._run, 'upload-jobs') for _ in range(self.workers)]
+        threads.append(start_daemon_thread(self._heartbeat, 'upload-jobs-heartbeat'))
+        return threads
+
+    def _heartbeat(self):
+        """Keep this process's jobs from being taken for jobs whose process died"""
+        while True:
+            time.sleep(UPLOAD_JOB_HEARTBEAT_INTERVAL)
+            job_ids = list(self._jobs)
+            if not job_ids:
+                continue
+            try:
+                self.store.touch_upload_jobs(job_ids)
+            except Exception as e:
+                print(f"Error refreshing upload jobs: {e}")
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            job.save(force=True, status='running')
+            try:
+                result = self.handler(job)
+                job.save(force=True, status='completed', result=result)
+                self.jobs_completed += 1
+            except Exception as e:
+                print(f"Error processing upload job {job.job_id}: {e}")
+                job.save(force=True, status='failed', result={
+                    'success': job.results['success'],
+                    'errors': job.results['errors'],
+                    'error': f'Upload processing error: {str(e)}'
+                })
+                self.jobs_failed += 1
+            finally:
+                self._jobs.pop(job.job_id, None)
+                job.release_files()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'workers': self.workers,
+            'jobs_completed': self.jobs_completed,
+            'jobs_failed': self.jobs_failed,
+            'rejected_jobs': self.rejected_jobs
+        }
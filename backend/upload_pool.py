@@ -0,0 +1,96 @@
+"""
+Process pool for parsing uploaded CSV files
+Each CSV (or ZIP member) is split into chunks of whole lines that are parsed in worker
+processes; the thread that submitted them is the only one writing their rows to the datastore
+"""
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, Iterator, Tuple
+
+from block_parser import iter_csv_rows
+from csv_parser import csv_parser
+from obd_schema import OBD_DATA_COLUMNS
+from process_local import ProcessLocal
+
+# Worker processes per API process; 0 parses on the request thread instead.
+# Defaults to one per core, or 0 on a single core where the pool only adds IPC overhead.
+_CPU_COUNT = os.cpu_count() or 1
+UPLOAD_PARSE_WORKERS = int(os.environ.get('UPLOAD_PARSE_WORKERS', _CPU_COUNT if _CPU_COUNT > 1 else 0))
+# Bytes of a file parsed per pool task (a chunk is extended to the end of its last line)
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', 4 * 1024 * 1024))
+# The pool is started from an upload job thread while other threads run; a forked child could
+# inherit locks those threads hold, so workers come from a fork server (or spawn where unavailable)
+UPLOAD_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+def iter_csv_chunks(stream: BinaryIO, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> Iterator[Tuple[int, bytes]]:
+    """
+    Read a binary stream in chunks that end on a line break
+
+    Yields:
+        (line number of the chunk's first line, chunk bytes); an empty stream gives one empty chunk
+    """
+    first_line_num = 1
+    content = stream.read(chunk_bytes)
+    while True:
+        if content and not content.endswith(b'\n'):
+            content += stream.readline()
+        yield first_line_num, content
+        first_line_num += content.count(b'\n')
+        content = stream.read(chunk_bytes)
+        if not content:
+            return
+
+def parse_csv_rows(content: bytes, first_line_num: int = 1, validate: bool = True) -> Dict[str, Any]:
+    """
+    Parse CSV bytes into row tuples (runs in a worker process)
+
+    The first chunk of a file is validated; later chunks pass validate=False and their
+    first_line_num, so parse errors carry file line numbers.
+
+    Returns:
+        Dict with rows (ordered as OBD_DATA_COLUMNS) and the analysis report
+    """
+    report = csv_parser.new_analysis_report()
+    rows = list(iter_csv_rows(csv_parser, io.TextIOWrapper(io.BytesIO(content), encoding='utf-8'),
+                              OBD_DATA_COLUMNS, report=report, validate=validate, first_line_num=first_line_num))
+    return {'rows': rows, 'report': report}
+
+class UploadPool:
+    def __init__(self, workers: int = UPLOAD_PARSE_WORKERS):
+        self.workers = workers
+        self._executor = ProcessLocal(self._start_executor)
+        self.chunks_submitted = 0
+
+    def _start_executor(self) -> ProcessPoolExecutor:
+        context = multiprocessing.get_context(UPLOAD_POOL_START_METHOD)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def submit(self, content: bytes, first_line_num: int = 1, validate: bool = True) -> Future:
+        """Queue a chunk of CSV bytes for parsing; the future resolves to parse_csv_rows' result"""
+        executor = self._executor.get()
+        try:
+            future = executor.submit(parse_csv_rows, content, first_line_num, validate)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); stop the broken pool's management thread and
+            # any surviving workers, then start a fresh pool
+            executor.shutdown(wait=False, cancel_futures=True)
+            future = self._executor.replace(executor).submit(parse_csv_rows, content, first_line_num, validate)
+        self.chunks_submitted += 1
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'started': self._executor.started,
+            'chunks_submitted': self.chunks_submitted
+        }
+
+upload_pool = UploadPool()
@@ -10,14 +10,31 @@ import (
 )
 // data/upload/live
 
+const (
+	// Samples are buffered and sent together, at least this often...
+	uploadFlushInterval = 2 * time.Second
+	// ...or as soon as this many are waiting
+	uploadMaxSamples = 50
+	// Unsent samples kept while the server is unreachable (oldest are dropped first)
+	uploadMaxPending = 1000
+	// RFC 3339 with microseconds: the server's ISO 8601 parser only takes more than six
+	// fractional digits from Python 3.11
+	sampleTimestampLayout = "2006-01-02T15:04:05.000000Z07:00"
+)
+
 type UploadData struct {
 	DataType string `json:"data_type"`
 	DataVal  string `json:"data_val"`
 }
 
+type UploadSample struct {
+	Timestamp string       `json:"timestamp"`
+	Data      []UploadData `json:"data"`
+}
+
 type JSONBody struct {
-	Key  string       `json:"key"`
-	Data []UploadData `json:"data"`
+	Key     string         `json:"key"`
+	Samples []UploadSample `json:"samples"`
 }
 
 func passPidListToJsonStr(list []protocals.PidResponse) []UploadData {
@@ -37,36 +54,76 @@ func AddToUploadQ(device_id string, ch <-chan []protocals.PidResponse) {
     // Live ingest endpoint (no browser CORS, device authenticates via body key)
     requestURL := "https://obd-data-dash.onrender.com/data/live"
 
-	for batch := range ch {
-		time.Sleep(300 * time.Millisecond)
-		jsonData := passPidListToJsonStr(batch)
+	ticker := time.NewTicker(uploadFlushInterval)
+	defer ticker.Stop()
 
-		body := JSONBody{
-			Key: device_id,
-			Data: jsonData,
+	var pending []UploadSample
+	for {
+		select {
+		case batch, ok := <-ch:
+			if !ok {
+				postSamples(requestURL, device_id, pending)
+				return
+			}
+			// Stamp the sample when it was read, not when it is uploaded
+			pending = append(pending, UploadSample{
+				Timestamp: time.Now().Format(sampleTimestampLayout),
+				Data:      passPidListToJsonStr(batch),
+			})
+			if len(pending) >= uploadMaxSamples {
+				pending = postSamples(requestURL, device_id, pending)
+			}
+		case <-ticker.C:
+			if len(pending) > 0 {
+				pending = postSamples(requestURL, device_id, pending)
+			}
 		}
+	}
+}
 
-		jsonBytes, err := json.Marshal(body)
-		if err != nil {
-			fmt.Println("Error encoding JSON:", err)
-			continue
-		}
+// postSamples sends the buffered samples in one request and returns the ones still to be sent.
+func postSamples(requestURL string, device_id string, samples []UploadSample) []UploadSample {
+	if len(samples) == 0 {
+		return nil
+	}
 
-		req, err := http.NewRequest("POST", requestURL, bytes.NewBuffer(jsonBytes))
-		if err != nil {
-			fmt.Println("Error creating request:", err)
-			continue
-		}
+	body := JSONBody{
+		Key:     device_id,
+		Samples: samples,
+	}
 
-		req.Header.Set("Content-Type", "application/json")
+	jsonBytes, err := json.Marshal(body)
+	if err != nil {
+		fmt.Println("Error encoding JSON:", err)
+		return nil
+	}
 
-		resp, err := http.DefaultClient.Do(req)
-		if err != nil {
-			fmt.Println("Error sending request:", err)
-			continue
-		}
-		defer resp.Body.Close()
+	req, err := http.NewRequest("POST", requestURL, bytes.NewBuffer(jsonBytes))
+	if err != nil {
+		fmt.Println("Error creating request:", err)
+		return keepPending(samples)
+	}
+
+	req.Header.Set("Content-Type", "application/json")
+
+	resp, err := http.DefaultClient.Do(req)
+	if err != nil {
+		fmt.Println("Error sending request:", err)
+		return keepPending(samples)
+	}
+	resp.Body.Close()
 
-		fmt.Println("Upload status:", resp.Status)
+	fmt.Println("Upload status:", resp.Status, "samples:", len(samples))
+	if resp.StatusCode == http.StatusServiceUnavailable || resp.StatusCode == http.StatusTooManyRequests {
+		// Server asked us to back off; retry with the next flush
+		return keepPending(samples)
 	}
-}
\ No newline at end of file
+	return nil
+}
+
+func keepPending(samples []UploadSample) []UploadSample {
+	if len(samples) > uploadMaxPending {
+		return samples[len(samples)-uploadMaxPending:]
+	}
+	return samples
+}
@@ -47,6 +47,7 @@ export default function DashboardPage() {
   const [deleteDay, setDeleteDay] = useState<Date | undefined>(undefined)
   const [deleting, setDeleting] = useState(false)
   const [refreshing, setRefreshing] = useState(false)
+  const [streamConnected, setStreamConnected] = useState(false)
 
   useEffect(() => {
     // Check if user is authenticated
@@ -59,14 +60,54 @@ export default function DashboardPage() {
     fetchData()
   }, [router])
 
+  // Polling is the fallback for when the live stream is not connected. While it is connected a slow poll
+  // remains, since the stream only carries rows ingested by the API process serving it
   useEffect(() => {
     if (!autoRefresh) return
 
     const interval = setInterval(() => {
       fetchData()
-    }, 5000) // Refresh every 5 seconds
+    }, streamConnected ? 30000 : 5000)
 
     return () => clearInterval(interval)
+  }, [autoRefresh, streamConnected])
+
+  // Push new rows from /data/stream into the live tiles and charts as the device sends them
+  useEffect(() => {
+    if (!autoRefresh) return
+
+    const controller = new AbortController()
+    let retryTimer: ReturnType<typeof setTimeout> | undefined
+
+    const connect = () => {
+      dataAPI
+        .streamLive((row: OBDDataRow) => {
+          if (typeof row.speed === "number") {
+            setLiveSpeed(row.speed)
+            setLiveActive(true)
+          }
+          if (typeof row.rpm === "number") {
+            setLiveRpm(row.rpm)
+            setLiveRpmActive(true)
+          }
+          setData((prev) => [row, ...prev].slice(0, 500))
+        }, controller.signal, () => setStreamConnected(true))
+        .catch((error) => {
+          if (!controller.signal.aborted) console.error("Live stream error:", error)
+        })
+        .finally(() => {
+          if (controller.signal.aborted) return
+          setStreamConnected(false)
+          retryTimer = setTimeout(connect, 3000)
+        })
+    }
+    connect()
+
+    return () => {
+      controller.abort()
+      if (retryTimer) clearTimeout(retryTimer)
+      setStreamConnected(false)
+    }
   }, [autoRefresh])
 
   // Live tiles reflect the most recent fetched data row (same source as charts)
@@ -234,7 +275,7 @@ export default function DashboardPage() {
               ) : (
                 <div className="text-sm text-muted-foreground">Awaiting live data…</div>
               )}
-              <p className="text-xs text-muted-foreground mt-1">Updates within ~10s when device is sending</p>
+              <p className="text-xs text-muted-foreground mt-1">Updates live when device is sending</p>
             </CardContent>
           </Card>
           {/* Live RPM */}
@@ -254,7 +295,7 @@ export default function DashboardPage() {
               ) : (
                 <div className="text-sm text-muted-foreground">Awaiting live data…</div>
               )}
-              <p className="text-xs text-muted-foreground mt-1">Updates within ~10s when device is sending</p>
+              <p className="text-xs text-muted-foreground mt-1">Updates live when device is sending</p>
             </CardContent>
           </Card>
         </div>
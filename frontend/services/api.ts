@@ -2,6 +2,10 @@
 
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "https://obd-data-dash.onrender.com"
 
+// Upload jobs are polled until they finish, or until they report no progress for UPLOAD_POLL_TIMEOUT_MS
+const UPLOAD_POLL_INTERVAL_MS = 1000
+const UPLOAD_POLL_TIMEOUT_MS = 10 * 60 * 1000
+
 function getAuthHeader() {
   if (typeof window === "undefined") return {}
   const token = localStorage.getItem("token")
@@ -57,9 +61,18 @@ export const authAPI = {
   },
 }
 
+async function fetchUploadJob(jobId: string) {
+  const res = await fetch(`${API_BASE_URL}/data/upload/jobs/${encodeURIComponent(jobId)}`, {
+    method: "GET",
+    headers: { ...getAuthHeader() },
+  })
+  return handleJSONResponse(res)
+}
+
 // Data APIs
 export const dataAPI = {
-  uploadCSV: async (files: File[]) => {
+  // Uploads are processed in the background; this polls the job and resolves with its final result
+  uploadCSV: async (files: File[], onProgress?: (job: any) => void) => {
     const formData = new FormData()
     files.forEach((f) => formData.append("files", f))
 
@@ -68,9 +81,30 @@ export const dataAPI = {
       headers: { ...getAuthHeader() },
       body: formData,
     })
-    return handleJSONResponse(res)
+    const accepted = await handleJSONResponse(res)
+
+    // The server fails jobs whose process died; this also gives up on a job that stops making progress
+    let lastProgress = ""
+    let progressAt = Date.now()
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS))
+      const job = await fetchUploadJob(accepted.job_id)
+      onProgress?.(job)
+      if (job.status === "completed") return job
+      if (job.status === "failed") throw new Error(job.error || "Upload failed")
+
+      const progress = `${job.status}:${job.files_processed}:${job.rows_parsed}`
+      if (progress !== lastProgress) {
+        lastProgress = progress
+        progressAt = Date.now()
+      } else if (Date.now() - progressAt > UPLOAD_POLL_TIMEOUT_MS) {
+        throw new Error("Upload is taking too long with no progress; check its status later")
+      }
+    }
   },
 
+  getUploadJob: (jobId: string) => fetchUploadJob(jobId),
+
   getData: async (params?: { date?: string; data_types?: string[]; limit?: number }) => {
     const query = new URLSearchParams()
     if (params?.date) query.append("date", params.date)
@@ -86,6 +120,65 @@ export const dataAPI = {
     return handleJSONResponse(res)
   },
 
+  getSeries: async (params: {
+    start?: number | string
+    end?: number | string
+    date?: string
+    data_types?: string[]
+    points?: number
+    method?: "lttb" | "bucket"
+  }) => {
+    const query = new URLSearchParams()
+    if (params.start !== undefined) query.append("start", String(params.start))
+    if (params.end !== undefined) query.append("end", String(params.end))
+    if (params.date) query.append("date", params.date)
+    if (params.points) query.append("points", String(params.points))
+    if (params.method) query.append("method", params.method)
+    if (params.data_types) params.data_types.forEach((t) => query.append("data_types", t))
+
+    const res = await fetch(`${API_BASE_URL}/data/series?${query.toString()}`, {
+      method: "GET",
+      headers: { ...getAuthHeader() },
+    })
+    return handleJSONResponse(res)
+  },
+
+  // Subscribe to rows accepted by /data/live (Server-Sent Events). Uses a streaming fetch rather than
+  // EventSource so the Authorization header can be sent. onOpen is called once the server has accepted
+  // the stream. Resolves when the stream ends.
+  streamLive: async (onRow: (row: any) => void, signal: AbortSignal, onOpen?: () => void) => {
+    const res = await fetch(`${API_BASE_URL}/data/stream`, {
+      method: "GET",
+      headers: { Accept: "text/event-stream", ...getAuthHeader() },
+      signal,
+    })
+    if (!res.ok || !res.body) {
+      await handleJSONResponse(res)
+      throw new Error(`Stream failed: ${res.status}`)
+    }
+    onOpen?.()
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ""
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      let sep
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const event = buffer.slice(0, sep)
+        buffer = buffer.slice(sep + 2)
+        const payload = event
+          .split("\n")
+          .filter((line) => line.startsWith("data: "))
+          .map((line) => line.slice(6))
+          .join("\n")
+        if (payload) onRow(JSON.parse(payload))
+      }
+    }
+  },
+
   deleteForDate: async (date: string) => {
     const res = await fetch(`${API_BASE_URL}/data/delete`, {
       method: "POST",